@@ -0,0 +1,497 @@
+# -*- coding: utf-8 -*-
+"""
+매칭 마이크로 벤치마크 (네트워크 없이 실행)
+  python bench.py [--iters 200] [--targets 3]
+  python bench.py --parity melon=page.html genie=top200.html bugs=chart.html
+  python bench.py --suite [--only fetch_] [--save-baseline | --baseline bench_baseline.json --tolerance 0.3]
+  python bench.py --record          # 실제 사이트에서 bench_fixtures/ 다시 받기
+  python bench.py --startup [--runs 5]
+
+100행(멜론/벅스/FLO/VIBE)·200행(지니) 합성 차트에서
+기존 방식(행마다 is_match, 매번 정규식 정규화)과 Matcher를 비교한다.
+먼저 실제로 걸리는 곡/빗나가는 곡을 섞은 대상으로 행마다 Matcher와 is_match 결과가 같은지 확인한다.
+--parity: 저장해 둔 차트 HTML로 bs4 / lxml 파서 결과가 같은지와 파싱 시간을 비교한다.
+--suite: bench_fixtures/의 사이트별 픽스처로 파싱·매칭·fetch_* 경로·normalize/is_match·build_text의
+  시간/처리량/최대 메모리를 재고, 기준선보다 tolerance 이상 느려지면 종료 코드 1.
+  (먼저 픽스처 기대값과 일간 차트 갱신 경계/캐시 만료를 확인)
+--startup: 새 프로세스에서 `import tweet` 시간을 재서 STARTUP_BUDGET_SEC를 넘거나
+  import만으로 Playwright/bs4/APScheduler 등(LAZY_MODULES)을 불러오면 종료 코드 1.
+"""
+import os, io, re, sys, json, time, random, argparse, pathlib, contextlib, subprocess, tracemalloc
+from datetime import datetime
+from typing import Callable, NamedTuple
+
+# tweet.py는 import 시 자격 증명을 요구하므로 오프라인 실행용 더미 값
+for _k in ("API_KEY", "API_KEY_SECRET", "ACCESS_TOKEN", "ACCESS_TOKEN_SECRET", "YOUTUBE_API_KEY", "YT_VIDEO_ID"):
+    os.environ.setdefault(_k, "bench")
+
+import tweet  # noqa: E402
+
+
+# ===================== 기존 구현 (비교 기준) =====================
+def legacy_normalize(s: str) -> str:
+    s = s.lower()
+    s = re.sub(r"\(feat\.?.*?\)|\(prod\.?.*?\)", "", s)
+    s = re.sub(r"feat\.?|featuring|prod\.?", "", s)
+    s = re.sub(r"[\[\]\(\)\-–—·~_:/.,!?']", " ", s)
+    s = re.sub(r"\s+", " ", s).strip()
+    return s
+
+
+def legacy_is_match(title, artist, target_title, target_artist) -> bool:
+    t1, a1 = legacy_normalize(title), legacy_normalize(artist)
+    t2, a2 = legacy_normalize(target_title), legacy_normalize(target_artist)
+    if t2 in t1 or t1 in t2:
+        return len(set(a1.split()) & set(a2.split())) > 0
+    return False
+
+
+def legacy_match(rows, targets):
+    return {t.key: next((r for r in rows if legacy_is_match(r.title, r.artist, t.title, t.artist)), None)
+            for t in targets}
+
+
+# ===================== 합성 차트 =====================
+def make_chart(n: int, seed: int) -> list[tweet.ChartRow]:
+    rnd = random.Random(seed)
+    words = ["Love", "Night", "Dream", "Summer", "Blue", "Heart", "Star", "Run", "Dance", "Rain"]
+    rows = []
+    for rank in range(1, n + 1):
+        title = " ".join(rnd.sample(words, 2))
+        if rnd.random() < 0.2:
+            title += f" (Feat. {rnd.choice(words)})"
+        artist = f"{rnd.choice(['NCT', 'IVE', 'aespa', 'NewJeans', 'BTS'])} {rnd.choice(['WISH', 'DREAM', '127', ''])}".strip()
+        rows.append(tweet.ChartRow(rank, title, artist, rnd.choice([None, 0, 1, -1])))
+    return rows
+
+
+def parity_targets(charts: list[list[tweet.ChartRow]], n_absent: int) -> list[tweet.Target]:
+    """Matcher 동등성 검사용 대상 곡: 차트에 없는 곡 + 실제로 걸리는 곡(정확/부분문자열/피처링)과 아슬아슬하게 빗나가는 곡"""
+    row = charts[0][10]
+    feat = next(r for c in charts for r in c if "(Feat." in r.title)
+    first_word = row.title.split()[0]
+    return [tweet.Target(f"Not Charting {i}", "NCT WISH") for i in range(n_absent)] + [
+        tweet.Target(row.title, row.artist),                           # 정확히 같은 행
+        tweet.Target(first_word, row.artist.split()[0]),               # 대상 제목 ⊂ 행 제목, 아티스트 토큰 하나
+        tweet.Target(f"{row.title} Forever", row.artist.split()[-1]),  # 행 제목 ⊂ 대상 제목
+        tweet.Target(feat.title.split(" (Feat.")[0], feat.artist),    # 피처링 표기 무시
+        tweet.Target(row.title, "Stray Kids"),                        # 제목만 같음 (아티스트 토큰 없음)
+        tweet.Target(f"{first_word}s", row.artist),                   # 한 글자 다른 제목
+        tweet.Target(" ".join(reversed(row.title.split())), "NCT"),  # 단어 순서만 다름
+    ]
+
+
+def check_matcher_parity(charts: list[list[tweet.ChartRow]], targets: list[tweet.Target]) -> bool:
+    """행 × 대상마다 Matcher.is_match == is_match, match() == 처음 매칭된 행 (적중과 불일치가 모두 있어야 통과)"""
+    matcher = tweet.Matcher(targets)
+    ok, hits = True, 0
+    for rows in charts:
+        for r in rows:
+            for t in targets:
+                want = tweet.is_match(r.title, r.artist, t.title, t.artist)
+                hits += want
+                if matcher.is_match(r.title, r.artist, t) != want:
+                    print(f"  [parity] {r.title} / {r.artist} vs {t.key}: Matcher={not want} is_match={want}")
+                    ok = False
+        expect = {t.key: next((r for r in rows if tweet.is_match(r.title, r.artist, t.title, t.artist)), None)
+                  for t in targets}
+        if matcher.match(rows) != expect or legacy_match(rows, targets) != expect:
+            print(f"  [parity] match() differs: {matcher.match(rows)} != {expect}")
+            ok = False
+    total = sum(len(rows) for rows in charts) * len(targets)
+    if not 0 < hits < total:
+        print(f"  [parity] 적중 {hits}/{total} — 양쪽 경로를 모두 검사하지 못함")
+        ok = False
+    return ok
+
+
+def timeit(fn, iters: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(iters):
+        fn()
+    return (time.perf_counter() - t0) / iters
+
+
+# ===================== 파서 동등성 =====================
+# 스펙 엔진(lxml) vs 기존 bs4 파서
+PARSER_PAIRS = {
+    family: (lambda h, s=spec: s.bs4_parser(h, 1), lambda h, s=spec: tweet.parse_chart_html(s, h, 1))
+    for family, spec in (("melon", tweet.CHART_SPECS_BY_KEY["melon_top100"]),
+                         ("genie", tweet.CHART_SPECS_BY_KEY["genie"]),
+                         ("bugs", tweet.CHART_SPECS_BY_KEY["bugs"]))
+}
+
+
+def check_parity(specs: list[str], iters: int) -> bool:
+    ok = True
+    for spec in specs:
+        family, _, path = spec.partition("=")
+        html = open(path, encoding="utf-8").read()
+        bs4_parse, lxml_parse = PARSER_PAIRS[family]
+        a, b = bs4_parse(html), lxml_parse(html)
+        same = a == b
+        ok &= same
+        t_bs4 = timeit(lambda: bs4_parse(html), iters)
+        t_lxml = timeit(lambda: lxml_parse(html), iters)
+        print(f"[{family}] rows={len(a)} identical={same} "
+              f"bs4={t_bs4 * 1e3:.2f}ms lxml={t_lxml * 1e3:.2f}ms x{t_bs4 / t_lxml:.1f}  ({path})")
+        if not same:
+            for x, y in zip(a, b):
+                if x != y:
+                    print(f"  first diff: bs4={x} lxml={y}")
+                    break
+    return ok
+
+
+# ===================== 픽스처 벤치마크 스위트 =====================
+# bench_fixtures/의 저장된 차트(HTML/JSON)로 네트워크 없이 파싱·매칭·fetch_* 경로·본문 생성을 측정하고
+# 저장된 기준선과 비교해 느려진 항목을 표시한다.
+FIXTURES = pathlib.Path(__file__).resolve().parent / "bench_fixtures"
+MANIFEST = FIXTURES / "manifest.json"
+BASELINE = pathlib.Path("bench_baseline.json")
+
+# fetch_* 함수별 픽스처 (키 = 벤치 이름)
+FETCH_CASES = {
+    "fetch_melon_top100": ("melon_top100", lambda m: tweet.fetch_melon_top100(m)),
+    "fetch_melon_hot100": ("melon_hot100", lambda m: tweet.fetch_melon_hot100(m)),
+    "fetch_genie_rank": ("genie", lambda m: tweet.fetch_genie_rank(m)),
+    "fetch_genie_rank[single]": ("genie", lambda m: tweet.fetch_genie_rank(m)),
+    "fetch_bugs_rank": ("bugs", lambda m: tweet.fetch_bugs_rank(m)),
+    "fetch_flo_rank": ("flo", lambda m: tweet.fetch_flo_rank(m)),
+    "fetch_vibe_rank": ("vibe", lambda m: tweet.fetch_vibe_rank(m)),
+}
+
+
+class Bench(NamedTuple):
+    name: str
+    iters: int
+    mean_ms: float
+    ops_per_sec: float
+    rows_per_sec: float | None
+    peak_kib: float
+
+
+def load_manifest() -> dict:
+    return json.loads(MANIFEST.read_text(encoding="utf-8"))
+
+
+def fixture_bodies(manifest: dict) -> dict[str, str]:
+    """URL → 픽스처 본문"""
+    return {tweet.rebase_url(url): (FIXTURES / name).read_text(encoding="utf-8")
+            for chart in manifest["charts"].values() for url, name in chart["files"].items()}
+
+
+@contextlib.contextmanager
+def offline(bodies: dict[str, str], single_page: bool = False):
+    """get_chart_html / fetch_chart_json을 픽스처로 대체하고 캐시·출력을 끈 상태"""
+    saved = (tweet.get_chart_html, tweet.fetch_chart_json, tweet.CHART_CACHE.enabled, set(tweet.SINGLE_PAGE_CHARTS))
+
+    def fake_html(site, url, *args, **kwargs):
+        return tweet.Fetched(bodies.get(url))
+
+    def fake_json(spec, validators=None):
+        return tweet.Fetched(bodies[spec.url])
+
+    tweet.get_chart_html, tweet.fetch_chart_json = fake_html, fake_json
+    tweet.CHART_CACHE.enabled = False
+    if single_page:
+        tweet.SINGLE_PAGE_CHARTS.add("genie")
+    else:
+        tweet.SINGLE_PAGE_CHARTS.discard("genie")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        tweet.get_chart_html, tweet.fetch_chart_json, tweet.CHART_CACHE.enabled, pages = saved
+        tweet.SINGLE_PAGE_CHARTS.clear()
+        tweet.SINGLE_PAGE_CHARTS.update(pages)
+
+
+def measure(name: str, fn, iters: int, rows: int | None = None, rounds: int = 5, min_round_sec: float = 0.05) -> Bench:
+    t0 = time.perf_counter()
+    fn()  # 워밍업 (XPath 컴파일, import 등)
+    once = time.perf_counter() - t0
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # 라운드마다 최소 min_round_sec는 돌도록 반복 수를 맞추고, 가장 빠른 라운드 기준
+    # (다른 프로세스/GC로 인한 튐을 줄여 기준선 비교를 안정적으로)
+    per_round = max(iters // rounds, int(min_round_sec / max(once, 1e-6)), 1)
+    mean = min(timeit(fn, per_round) for _ in range(rounds))
+    return Bench(name, per_round * rounds, mean * 1e3, 1 / mean, rows / mean if rows else None, peak / 1024)
+
+
+def parse_fixture(spec, body: str, page: int) -> list:
+    if isinstance(spec, tweet.JsonChartSpec):
+        return tweet.parse_chart_json(spec, json.loads(body))
+    return tweet.parse_chart_html(spec, body, page)
+
+
+def chart_pages(manifest: dict, key: str, bodies: dict[str, str]) -> list[tuple[int, str]]:
+    spec = tweet.CHART_SPECS_BY_KEY[key]
+    urls = list(spec.urls) if isinstance(spec, tweet.ChartSpec) else [spec.url]
+    return [(p, bodies[u]) for p, u in enumerate(urls, start=1) if u in bodies]
+
+
+def run_fetch_cases(manifest: dict, bodies: dict[str, str], matcher) -> dict[str, dict]:
+    out = {}
+    for name, (key, fn) in FETCH_CASES.items():
+        with offline(bodies, single_page=name.endswith("[single]")):
+            out[name] = {k: list(v) if v else v for k, v in (fn(matcher) or {}).items()}
+    return out
+
+
+def check_expectations(manifest: dict, bodies: dict[str, str], matcher) -> bool:
+    """픽스처 결과가 manifest의 기대값(행 수, 대상 곡 순위/변동)과 같은지 — 빠르지만 틀린 최적화 방지"""
+    ok = True
+    for key, chart in manifest["charts"].items():
+        spec = tweet.CHART_SPECS_BY_KEY[key]
+        n = sum(len(parse_fixture(spec, body, p)) for p, body in chart_pages(manifest, key, bodies))
+        if n != chart["rows"]:
+            print(f"  [expect] {key}: rows={n} (expected {chart['rows']})")
+            ok = False
+    got = run_fetch_cases(manifest, bodies, matcher)
+    for name, hits in got.items():
+        if hits != manifest["expect"][name]:
+            print(f"  [expect] {name}: {hits} (expected {manifest['expect'][name]})")
+            ok = False
+    return ok
+
+
+def check_schedules() -> bool:
+    """일간 차트의 갱신 경계·캐시 만료가 매시가 아니라 KST 자정(+게시 지연)에 떨어지는지"""
+    ok = True
+    now = datetime(2025, 8, 1, 14, 30, tzinfo=tweet.KST).timestamp()
+    midnight = datetime(2025, 8, 1, tzinfo=tweet.KST).timestamp()
+    for key in ("melon_day", "genie_day"):
+        spec = tweet.CHART_SPECS_BY_KEY[key]
+        nxt = midnight + 86400 + spec.publish_lag_sec
+        got = {"update_boundary": tweet.update_boundary(spec, now), "chart_boundary": tweet.chart_boundary(spec, now),
+               "expiry": tweet.cache_expiry(spec, None, now), "expiry[chart_ts]": tweet.cache_expiry(spec, midnight, now)}
+        want = {"update_boundary": midnight, "chart_boundary": midnight, "expiry": nxt, "expiry[chart_ts]": nxt}
+        for name, ts in got.items():
+            if ts != want[name]:
+                print(f"  [schedule] {key} {name}: {datetime.fromtimestamp(ts, tweet.KST)} "
+                      f"(expected {datetime.fromtimestamp(want[name], tweet.KST)})")
+                ok = False
+    return ok
+
+
+def update_expectations():
+    manifest = load_manifest()
+    bodies = fixture_bodies(manifest)
+    matcher = tweet.Matcher([tweet.Target(*t) for t in manifest["targets"]])
+    for key, chart in manifest["charts"].items():
+        spec = tweet.CHART_SPECS_BY_KEY[key]
+        chart["rows"] = sum(len(parse_fixture(spec, body, p)) for p, body in chart_pages(manifest, key, bodies))
+    manifest["expect"] = run_fetch_cases(manifest, bodies, matcher)
+    MANIFEST.write_text(json.dumps(manifest, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    print(f"updated {MANIFEST}")
+
+
+def record_fixtures():
+    """manifest의 URL을 실제로 받아 픽스처를 덮어씀 (HTTP 우선 + 브라우저 폴백 그대로 사용)"""
+    manifest = load_manifest()
+    with tweet.BrowserPool() as pool:
+        for key, chart in manifest["charts"].items():
+            spec = tweet.CHART_SPECS_BY_KEY[key]
+            for url, name in chart["files"].items():
+                if isinstance(spec, tweet.JsonChartSpec):
+                    got = tweet.fetch_chart_json(spec)
+                else:
+                    got = tweet.get_chart_html(key, tweet.rebase_url(url), spec.marker_re, spec.wait_selector,
+                                               timeout_ms=spec.timeout_ms, pool=pool)
+                if not got.body:
+                    print(f"  {key}: {url} 수집 실패 → 기존 픽스처 유지")
+                    continue
+                (FIXTURES / name).write_text(got.body, encoding="utf-8")
+                print(f"  {key}: {name} ({len(got.body):,} chars)")
+    update_expectations()
+
+
+def run_suite(iters: int, only: str | None = None) -> list[Bench]:
+    manifest = load_manifest()
+    bodies = fixture_bodies(manifest)
+    targets = [tweet.Target(*t) for t in manifest["targets"]]
+    matcher = tweet.Matcher(targets)
+    if not check_expectations(manifest, bodies, matcher):
+        sys.exit("fixture expectations changed — parser/matcher output differs (bench.py --update-expect로 갱신)")
+    if not check_schedules():
+        sys.exit("daily chart schedule differs — update_every_min/cache_expiry/update_boundary")
+
+    cases: list[tuple[str, Callable, int, int | None]] = []
+    parsed: dict[str, list] = {}
+    for key in manifest["charts"]:
+        spec = tweet.CHART_SPECS_BY_KEY[key]
+        pages = chart_pages(manifest, key, bodies)
+        parsed[key] = [r for p, body in pages for r in parse_fixture(spec, body, p)]
+        cases.append((f"parse:{key}", lambda s=spec, pg=pages: [parse_fixture(s, b, p) for p, b in pg],
+                      iters, len(parsed[key])))
+        cases.append((f"match:{key}", lambda rows=parsed[key]: matcher.match(rows), iters * 10, len(parsed[key])))
+
+    for name, (key, fn) in FETCH_CASES.items():
+        def run(fn=fn, single=name.endswith("[single]")):
+            with offline(bodies, single_page=single):
+                fn(matcher)
+        cases.append((name, run, iters, len(parsed[key])))
+
+    all_rows = [r for rows in parsed.values() for r in rows]
+    strings = [r.title for r in all_rows] + [r.artist for r in all_rows]
+
+    def normalize_cold():
+        tweet.normalize.cache_clear()
+        tweet.artist_tokens.cache_clear()
+        for s in strings:
+            tweet.normalize(s)
+
+    def is_match_all():
+        for r in all_rows:
+            for t in targets:
+                tweet.is_match(r.title, r.artist, t.title, t.artist)
+
+    cases.append(("normalize[cold]", normalize_cold, iters, len(strings)))
+    cases.append(("is_match", is_match_all, iters, len(all_rows)))
+
+    now = datetime(2025, 8, 1, 14, 0, tzinfo=tweet.KST)
+    site_keys = [key for _, key in tweet.SITES]
+    ranks = {t.key: {k: (i * 7 + j) % 120 or None for j, k in enumerate(site_keys)} for i, t in enumerate(targets)}
+    prev = {"songs": {t.key: {"ranks": {k: (r or 50) + 2 for k, r in ranks[t.key].items()}} for t in targets},
+            "youtube_views": 1_234_000}
+    changes = {t.key: {"bugs": -3, "flo": 2} for t in targets}
+    trends = {t.key: {k: {"24h": 10, "peak": 1} for k in site_keys} for t in targets}
+    cases.append(("build_text", lambda: tweet.build_text(now, ranks, 1_250_000, prev, changes, targets, trends),
+                  iters * 10, None))
+
+    results = []
+    for name, fn, n, rows in cases:
+        if only and only not in name:
+            continue
+        if name.startswith("fetch_"):
+            results.append(measure(name, fn, n, rows))
+        else:
+            with contextlib.redirect_stdout(io.StringIO()):
+                results.append(measure(name, fn, n, rows))
+    return results
+
+
+# ===================== 시작 시간 =====================
+STARTUP_PROBE = ("import json, time; t0 = time.perf_counter(); import tweet; "
+                 "print(json.dumps({'sec': time.perf_counter() - t0, 'lazy': tweet.loaded_lazy_modules()}))")
+
+
+def check_startup(runs: int) -> bool:
+    """새 인터프리터로 `import tweet`을 runs번 → 최솟값이 예산 안이고 게으른 모듈을 미리 불러오지 않으면 True"""
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", STARTUP_PROBE], cwd=pathlib.Path(__file__).resolve().parent,
+                             capture_output=True, text=True, check=True)
+        samples.append({**json.loads(out.stdout.strip().splitlines()[-1]), "wall": time.perf_counter() - t0})
+    best = min(samples, key=lambda s: s["sec"])
+    eager = sorted({m for s in samples for m in s["lazy"]})
+    print(f"import tweet: min {best['sec'] * 1e3:.0f} ms, median {sorted(s['sec'] for s in samples)[runs // 2] * 1e3:.0f} ms "
+          f"(프로세스 기동 포함 {min(s['wall'] for s in samples) * 1e3:.0f} ms), 예산 {tweet.STARTUP_BUDGET_SEC * 1e3:.0f} ms")
+    ok = best["sec"] <= tweet.STARTUP_BUDGET_SEC
+    if not ok:
+        print("  ← OVER BUDGET")
+    if eager:
+        print(f"  import만으로 불러온 모듈: {', '.join(eager)}  ← 필요한 경로에서 import할 것")
+    return ok and not eager
+
+
+def print_results(results: list[Bench], baseline: dict | None, tolerance: float) -> list[str]:
+    regressions = []
+    print(f"{'bench':<28}{'iters':>7}{'ms/op':>10}{'ops/s':>11}{'rows/s':>12}{'peak KiB':>10}  vs baseline")
+    for b in results:
+        note = ""
+        base = (baseline or {}).get(b.name)
+        if base:
+            ratio = b.mean_ms / base["mean_ms"]
+            note = f"x{ratio:.2f}"
+            if ratio > 1 + tolerance:
+                note += "  ← REGRESSION"
+                regressions.append(b.name)
+            elif base.get("peak_kib") and b.peak_kib > base["peak_kib"] * (1 + tolerance) + 64:
+                note += f"  ← MEMORY {base['peak_kib']:.0f}→{b.peak_kib:.0f} KiB"
+                regressions.append(b.name)
+        rows = f"{b.rows_per_sec:,.0f}" if b.rows_per_sec else "-"
+        print(f"{b.name:<28}{b.iters:>7}{b.mean_ms:>10.3f}{b.ops_per_sec:>11,.0f}{rows:>12}{b.peak_kib:>10.1f}  {note}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--iters", type=int, default=200)
+    ap.add_argument("--targets", type=int, default=3)
+    ap.add_argument("--parity", nargs="+", metavar="SITE=HTML", help="melon|genie|bugs=저장한 HTML 경로")
+    ap.add_argument("--suite", action="store_true", help="bench_fixtures 픽스처로 전체 스위트 실행")
+    ap.add_argument("--only", help="이름에 이 문자열이 들어간 벤치만 (--suite)")
+    ap.add_argument("--baseline", type=pathlib.Path, default=BASELINE, help="비교할 기준선 JSON")
+    ap.add_argument("--save-baseline", action="store_true", help="이번 결과를 기준선으로 저장")
+    ap.add_argument("--tolerance", type=float, default=0.3, help="기준선 대비 허용 비율 (기본 30%%)")
+    ap.add_argument("--record", action="store_true", help="실제 사이트에서 픽스처를 다시 받아 저장")
+    ap.add_argument("--update-expect", action="store_true", help="픽스처 기대값(manifest.json) 갱신")
+    ap.add_argument("--startup", action="store_true", help="새 프로세스의 import tweet 시간/게으른 모듈 검사")
+    ap.add_argument("--runs", type=int, default=5, help="--startup 반복 횟수")
+    args = ap.parse_args()
+
+    if args.parity:
+        sys.exit(0 if check_parity(args.parity, max(1, args.iters // 20)) else 1)
+    if args.startup:
+        sys.exit(0 if check_startup(max(1, args.runs)) else 1)
+    if args.record:
+        record_fixtures()
+        return
+    if args.update_expect:
+        update_expectations()
+        return
+    if args.suite:
+        results = run_suite(max(1, args.iters // 4), args.only)
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else None
+        regressions = print_results(results, None if args.save_baseline else baseline, args.tolerance)
+        if args.save_baseline:
+            args.baseline.write_text(json.dumps({b.name: b._asdict() for b in results}, indent=2), encoding="utf-8")
+            print(f"baseline saved → {args.baseline}")
+        elif regressions:
+            print(f"{len(regressions)} regression(s) over {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        return
+
+    # 한 run = 100행 차트 5개 + 200행 지니 1개
+    charts = [make_chart(100, s) for s in range(5)] + [make_chart(200, 99)]
+    # 대상 곡은 차트에 없는 곡 → 모든 행을 끝까지 훑는 최악의 경우
+    targets = [tweet.Target(f"Not Charting {i}", "NCT WISH") for i in range(args.targets)]
+
+    def legacy_run():
+        for rows in charts:
+            legacy_match(rows, targets)
+
+    def matcher_run():
+        tweet.normalize.cache_clear()
+        tweet.artist_tokens.cache_clear()
+        matcher = tweet.Matcher(targets)
+        for rows in charts:
+            matcher.match(rows)
+
+    warm = tweet.Matcher(targets)
+
+    def matcher_warm_run():
+        for rows in charts:
+            warm.match(rows)
+
+    if not check_matcher_parity(charts, parity_targets(charts, args.targets)):
+        sys.exit("Matcher 결과가 is_match와 다름")
+
+    n_rows = sum(len(c) for c in charts)
+    base = timeit(legacy_run, args.iters)
+    cold = timeit(matcher_run, args.iters)
+    hot = timeit(matcher_warm_run, args.iters)
+    print(f"rows/run={n_rows} targets={len(targets)} iters={args.iters}")
+    print(f"legacy is_match loop : {base * 1e3:8.3f} ms/run")
+    print(f"Matcher (cold cache) : {cold * 1e3:8.3f} ms/run  x{base / cold:.1f}")
+    print(f"Matcher (warm cache) : {hot * 1e3:8.3f} ms/run  x{base / hot:.1f}")
+
+
+if __name__ == "__main__":
+    main()
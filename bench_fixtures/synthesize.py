@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+오프라인 벤치마크용 차트 픽스처 생성 (결정적, 네트워크 없음)
+  python bench_fixtures/synthesize.py
+
+각 사이트의 실제 차트 표 마크업(클래스/속성/중첩)을 그대로 따른 합성 페이지.
+실제 응답으로 바꾸려면 `python bench.py --record` (manifest.json의 URL을 그대로 받아 덮어씀).
+- melon_hot100.html: 행 누락(98행) + 가수 링크가 빠진 행 1개
+- genie_p3.html: 행 누락(47행) + 순위 숫자가 빠진 행 1개
+- genie_top200.html: rows=200 단일 페이지
+"""
+import json, pathlib, random
+from html import escape
+
+HERE = pathlib.Path(__file__).resolve().parent
+rnd = random.Random(20250801)
+
+POOL = [
+    ("Surf", "NCT WISH"), ("Steady (Feat. Mark)", "NCT WISH"), ("WISH", "NCT WISH"), ("Supernova", "aespa"),
+    ("Whiplash", "aespa"), ("Ditto", "NewJeans"), ("How Sweet", "NewJeans"), ("APT.", "로제 (ROSÉ) & Bruno Mars"),
+    ("HAPPY", "DAY6 (데이식스)"), ("한 페이지가 될 수 있게", "DAY6 (데이식스)"), ("Magnetic", "ILLIT (아일릿)"),
+    ("소나기", "이클립스 (ECLIPSE)"), ("Love wins all", "아이유"), ("Drama", "aespa"), ("Spicy", "aespa"),
+    ("고민중독", "QWER"), ("내 이름 맑음", "QWER"), ("Small girl (feat. 도경수(D.O.))", "이영지"),
+    ("클락션 (Klaxon)", "(여자)아이들"), ("Sticky", "KISS OF LIFE"), ("SPOT! (feat. JENNIE)", "지코 (ZICO)"),
+    ("Armageddon", "aespa"), ("HOT", "LE SSERAFIM (르세라핌)"), ("Bubble Gum", "NewJeans"),
+]
+CHARTING = POOL + [(f"곡 {i} (Prod. {i % 9})", f"가수 {i % 41}") for i in range(260)]
+
+
+def chart_order(n: int, pins: dict[int, tuple[str, str]], seed: int) -> list[tuple[str, str]]:
+    r = random.Random(seed)
+    rest = [s for s in CHARTING if s not in pins.values()]
+    r.shuffle(rest)
+    it = iter(rest)
+    return [pins[i] if i in pins else next(it) for i in range(1, n + 1)]
+
+
+def page(title: str, head_scripts: int, table: str, body_filler: int) -> str:
+    # 실제 페이지처럼 표 앞뒤로 헤더/내비/스크립트가 붙음 (파서가 표 구간만 잘라내는지 확인용)
+    scripts = "".join(f"<script>window.__cfg{i}={{a:{i},b:'{'x' * 40}'}};</script>" for i in range(head_scripts))
+    nav = "".join(f"<li><a href=\"/menu/{i}\">메뉴 {i}</a></li>" for i in range(body_filler))
+    return (f"<!DOCTYPE html><html lang=\"ko\"><head><meta charset=\"utf-8\"><title>{title}</title>{scripts}</head>"
+            f"<body><div id=\"gnb\"><ul>{nav}</ul></div><div id=\"conts\">{table}</div>"
+            f"<div id=\"footer\"><ul>{nav}</ul></div></body></html>")
+
+
+def melon(seed: int, drop: set[int] = frozenset(), no_artist: set[int] = frozenset()) -> str:
+    songs = chart_order(100, {3: POOL[0], 41: POOL[1], 88: POOL[3]}, seed)
+    trs = []
+    for rank, (t, a) in enumerate(songs, start=1):
+        if rank in drop:
+            continue
+        kind = rnd.choice(["up", "down", "static", "static", "new"])
+        if kind == "up":
+            rw = f'<span class="rank_up"><span class="up">{rnd.randint(1, 12)}</span><span class="none">단계 상승</span></span>'
+        elif kind == "down":
+            rw = f'<span class="rank_down"><span class="down">{rnd.randint(1, 12)}</span><span class="none">단계 하락</span></span>'
+        elif kind == "static":
+            rw = '<span class="rank_static"><span class="none">순위 동일</span></span>'
+        else:
+            rw = '<span class="rank_new"><span class="none">순위 진입</span></span>'
+        artist = "" if rank in no_artist else (
+            f'<a href="javascript:melon.link.goArtistDetail(\'{rank}\');" title="{escape(a)} - 페이지 이동">{escape(a)}</a>'
+            f'<span class="checkEllipsis"><a href="#">{escape(a)}</a></span>')
+        cls = "lst50" if rank <= 50 else "lst100"
+        trs.append(
+            f'<tr class="{cls}" data-song-no="{37000000 + rank}">'
+            f'<td><div class="wrap"><input type="checkbox" class="input_check" title="{escape(t)} 곡 선택"></div></td>'
+            f'<td><div class="wrap t_center"><span class="rank ">{rank}</span><span class="none">위</span></div></td>'
+            f'<td><div class="wrap"><span title="" class="rank_wrap">{rw}</span></div></td>'
+            f'<td><div class="wrap"><a href="#" class="image_typeAll"><img width="60" height="60" src="/img.jpg" alt=""></a></div></td>'
+            f'<td><div class="wrap"><a href="#" class="btn button_icons type03 song_info"><span class="none">곡정보</span></a></div></td>'
+            f'<td><div class="wrap"><div class="wrap_song_info">'
+            f'<div class="ellipsis rank01"><span><a href="javascript:melon.play.playSong(\'1\',{rank});" title="{escape(t)} 재생">{escape(t)}</a></span></div><br>'
+            f'<div class="ellipsis rank02">{artist}</div></div></div></td>'
+            f'<td><div class="wrap"><div class="wrap_song_info"><div class="ellipsis rank03"><a href="#">앨범 {rank}</a></div></div></div></td>'
+            f'</tr>')
+    table = f'<form id="frm"><div class="service_list_song type02 d_song_list"><table><tbody>{"".join(trs)}</tbody></table></div></form>'
+    return page("Melon::음악이 필요한 순간, 멜론", 60, table, 80)
+
+
+def genie_rows(songs, first_rank: int, drop: set[int] = frozenset(), no_number: set[int] = frozenset()) -> str:
+    trs = []
+    for rank, (t, a) in enumerate(songs, start=first_rank):
+        if rank in drop:
+            continue
+        kind = rnd.choice(["up", "down", "none", "none", "new"])
+        ch = {
+            "up": f'<span class="rank"><span class="rank-up">{rnd.randint(1, 20)}<span class="hide">상승</span></span></span>',
+            "down": f'<span class="rank"><span class="rank-down">{rnd.randint(1, 20)}<span class="hide">하강</span></span></span>',
+            "none": '<span class="rank"><span class="rank-none"><span class="hide">유지</span></span></span>',
+            "new": '<span class="rank"><span class="rank-new"><span class="hide">new</span></span></span>',
+        }[kind]
+        number = "" if rank in no_number else str(rank)
+        trs.append(
+            f'<tr class="list" songid="{10000000 + rank}">'
+            f'<td class="check"><input type="checkbox" class="select-check" title="{escape(t)}"></td>'
+            f'<td class="number">{number}{ch}</td>'
+            f'<td><a href="#" class="cover"><span class="mask"></span><img src="/cover.jpg" alt="{escape(t)}"></a></td>'
+            f'<td class="link"><a href="#" class="btn-basic btn-info">곡 제목 정보 페이지</a></td>'
+            f'<td class="info"><a href="#" class="title ellipsis" title="재생">{escape(t)}</a>'
+            f'<a href="#" class="artist ellipsis">{escape(a)}</a><i class="bar">|</i>'
+            f'<a href="#" class="albumtitle ellipsis">앨범 {rank}</a></td>'
+            f'<td class="btns"><a href="#" class="btn-basic btn-listen">듣기</a></td>'
+            f'</tr>')
+    return "".join(trs)
+
+
+def genie_page(rows: str) -> str:
+    table = f'<div class="music-list-wrap"><table class="list-wrap"><tbody>{rows}</tbody></table></div>'
+    return page("지니차트 - genie", 45, table, 60)
+
+
+def bugs(seed: int) -> str:
+    songs = chart_order(100, {7: POOL[0], 64: POOL[6]}, seed)
+    trs = []
+    for rank, (t, a) in enumerate(songs, start=1):
+        kind = rnd.choice(["up", "down", "none", "none", "new"])
+        ch = {
+            "up": f'<p class="change up"><span class="arrow"></span><em>{rnd.randint(1, 9)}</em><span>계단 상승</span></p>',
+            "down": f'<p class="change down"><span class="arrow"></span><em>{rnd.randint(1, 9)}</em><span>계단 하락</span></p>',
+            "none": '<p class="change none"><span class="arrow"></span><em>0</em><span>변동없음</span></p>',
+            "new": '<p class="change new"><span class="arrow"></span><em>new</em></p>',
+        }[kind]
+        trs.append(
+            f'<tr rowtype="track" trackid="{6000000 + rank}" albumid="{20000 + rank}">'
+            f'<td class="check"><input type="checkbox" name="check" title="곡 선택"></td>'
+            f'<td><div class="ranking"><strong>{rank}</strong>{ch}</div></td>'
+            f'<td><a href="#" class="thumbnail"><img src="/a.jpg" alt="앨범 {rank}"></a></td>'
+            f'<td><a href="#" class="btn bugsMusicPlayer">듣기</a></td>'
+            f'<th scope="row"><p class="title" title="{escape(t)}"><a href="#" title="{escape(t)}">{escape(t)}</a></p></th>'
+            f'<td class="left"><p class="artist"><a href="#" title="{escape(a)}">{escape(a)}</a></p></td>'
+            f'<td class="left"><a href="#" class="album" title="앨범 {rank}">앨범 {rank}</a></td>'
+            f'</tr>')
+    table = (f'<table class="list trackList byChart"><caption>벅스 실시간 차트</caption><thead><tr><th>순위</th></tr></thead>'
+             f'<tbody>{"".join(trs)}</tbody></table>')
+    return page("벅스 - 실시간 차트", 50, table, 70)
+
+
+def flo(seed: int) -> dict:
+    songs = chart_order(100, {12: POOL[0], 5: POOL[5]}, seed)
+    tracks = [{
+        "id": 400000000 + rank, "name": t, "rank": {"rankBadge": rnd.choice([0, 0, 1, -2, 5, -1])},
+        "representationArtist": {"id": 80000 + rank, "name": a, "imgList": [{"size": 75, "url": "https://cdn/a.jpg"}]},
+        "album": {"id": 1000 + rank, "title": f"앨범 {rank}", "imgList": [{"size": 350, "url": "https://cdn/b.jpg"}]},
+        "playTime": "03:12", "adultAuthYn": "N", "svcStreamingYn": "Y",
+    } for rank, (t, a) in enumerate(songs, start=1)]
+    return {"code": "2000000", "message": "", "data": {"name": "FLO 차트", "basedOnUpdate": "2025.08.01 14:00",
+                                                      "trackList": tracks}}
+
+
+def vibe(seed: int, no_artist: set[int] = frozenset()) -> dict:
+    songs = chart_order(100, {21: POOL[0], 2: POOL[4]}, seed)
+    tracks = []
+    for rank, (t, a) in enumerate(songs, start=1):
+        tracks.append({
+            "trackId": 90000000 + rank, "trackTitle": t,
+            "artists": [] if rank in no_artist else [{"artistId": 3000 + rank, "artistName": a, "isGroup": True}],
+            "album": {"albumId": 700000 + rank, "albumTitle": f"앨범 {rank}"},
+            "rank": {"currentRank": rank, "rankVariation": rnd.choice([0, 0, 2, -3, 1])},
+            "hasLyric": "true", "isStreaming": True,
+        })
+    return {"response": {"result": {"chart": {"chartName": "국내 급상승", "items": {"tracks": tracks}}}}}
+
+
+def main():
+    # 지니 Top200: 같은 200곡 순서를 4페이지 / 단일 페이지 두 가지로
+    genie_songs = chart_order(200, {26: POOL[0], 150: POOL[5], 173: POOL[1]}, 3)
+    files = {
+        "melon_top100.html": melon(1),
+        "melon_hot100.html": melon(2, drop={17, 71}, no_artist={33}),
+        "bugs.html": bugs(4),
+        "genie_top200.html": genie_page(genie_rows(genie_songs, 1)),
+    }
+    for p in range(1, 5):
+        drop, no_number = ({131, 140, 149}, {137}) if p == 3 else (set(), set())
+        files[f"genie_p{p}.html"] = genie_page(genie_rows(genie_songs[(p - 1) * 50:p * 50], (p - 1) * 50 + 1,
+                                                          drop=drop, no_number=no_number))
+    for name, body in files.items():
+        (HERE / name).write_text(body, encoding="utf-8")
+    (HERE / "flo.json").write_text(json.dumps(flo(5), ensure_ascii=False), encoding="utf-8")
+    (HERE / "vibe.json").write_text(json.dumps(vibe(6, no_artist={58}), ensure_ascii=False), encoding="utf-8")
+    print("wrote", len(files) + 2, "fixtures to", HERE)
+
+
+if __name__ == "__main__":
+    main()
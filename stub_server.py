@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+로컬 스텁 서버 — 트위터 / YouTube / 멜론·지니·벅스 / FLO / VIBE를 흉내 내는 오프라인 대역
+  python stub_server.py [--port 8808] [--latency 50-300] [--error-rate 0.05] [--rate-limit-rate 0.02]
+  STUB_URL=http://127.0.0.1:8808 python tweet.py --once      # 다른 터미널에서 봇을 스텁으로
+
+  python stub_server.py --run-once 5 --fault genie:latency=4000 --fault flo:429=0.5
+    → 임시 작업 폴더에서 서버를 띄우고 run_once를 N번 돌린 뒤 실행별 계측(metrics.jsonl)과 요청 통계 요약
+
+응답 본문은 bench_fixtures/(manifest.json의 운영 URL → 파일)를 그대로 내려준다.
+장애 주입: 서비스별(--fault 서비스:종류=값) 또는 전체 기본값
+  latency=ms | min-max  응답 전 대기
+  error=비율            500/502/503 중 하나
+  429=비율              Retry-After와 x-rate-limit-* 헤더를 붙인 429
+  hang=비율             클라이언트 타임아웃보다 길게(기본 60초) 응답하지 않음
+서비스 이름: twitter, youtube, melon, genie, bugs, flo, vibe_api, vibe (tweet.BASE_URLS 키와 같음)
+"""
+import os, sys, json, time, random, argparse, hashlib, pathlib, tempfile, threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+from urllib.parse import urlsplit, parse_qs
+
+FIXTURES = pathlib.Path(__file__).resolve().parent / "bench_fixtures"
+VIBE_COOKIE = "NNB=STUBCOOKIE"
+
+
+class Fault(NamedTuple):
+    latency_ms: tuple[float, float] = (0.0, 0.0)
+    error: float = 0.0
+    rate_limit: float = 0.0
+    hang: float = 0.0
+
+
+def parse_latency(raw: str) -> tuple[float, float]:
+    lo, _, hi = raw.partition("-")
+    return float(lo), float(hi or lo)
+
+
+def parse_faults(items: list[str], default: Fault) -> dict[str, Fault]:
+    """["genie:latency=4000", "flo:429=0.5"] → {서비스: Fault}"""
+    faults: dict[str, Fault] = {}
+    for item in items:
+        svc, _, rest = item.partition(":")
+        kind, _, value = rest.partition("=")
+        f = faults.get(svc, default)
+        if kind == "latency":
+            f = f._replace(latency_ms=parse_latency(value))
+        elif kind == "error":
+            f = f._replace(error=float(value))
+        elif kind == "429":
+            f = f._replace(rate_limit=float(value))
+        elif kind == "hang":
+            f = f._replace(hang=float(value))
+        else:
+            raise SystemExit(f"unknown fault kind: {item}")
+        faults[svc] = f
+    return faults
+
+
+class StubState:
+    """라우팅 테이블, 장애 설정, 요청 통계 (핸들러 스레드 간 공유)"""
+
+    def __init__(self, default: Fault, faults: dict[str, Fault], tweet_limit: int, hang_sec: float, seed: int | None):
+        self.default = default
+        self.faults = faults
+        self.tweet_limit = tweet_limit
+        self.hang_sec = hang_sec
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats: Counter = Counter()
+        self.pages: dict[tuple[str, str], bytes] = {}
+        self.tweets: list[dict] = []
+        self.window_start = time.time()
+        self.started = time.time()
+
+    def load_fixtures(self, default_base_urls: dict[str, str]):
+        """manifest의 운영 URL을 (서비스, 경로?쿼리)로 풀어 픽스처 파일과 연결"""
+        manifest = json.loads((FIXTURES / "manifest.json").read_text(encoding="utf-8"))
+        for chart in manifest["charts"].values():
+            for url, name in chart["files"].items():
+                for svc, base in default_base_urls.items():
+                    if url.startswith(base + "/"):
+                        self.pages[(svc, url[len(base):])] = (FIXTURES / name).read_bytes()
+                        break
+
+    def fault_for(self, svc: str) -> Fault:
+        return self.faults.get(svc, self.default)
+
+    def chance(self, p: float) -> bool:
+        with self.lock:
+            return p > 0 and self.rnd.random() < p
+
+    def count(self, svc: str, status: int):
+        with self.lock:
+            self.stats[(svc, status)] += 1
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "twitbot-stub/1.0"
+    protocol_version = "HTTP/1.1"  # keep-alive (클라이언트 커넥션 재사용 측정용)
+    state: StubState  # serve()에서 주입
+
+    def log_message(self, fmt, *args):
+        pass
+
+    # ---------- 공통 ----------
+    def _send(self, svc: str, status: int, body: bytes = b"", ctype: str = "application/json; charset=utf-8",
+              headers: dict | None = None):
+        self.state.count(svc, status)
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _json(self, svc: str, status: int, obj, headers: dict | None = None):
+        self._send(svc, status, json.dumps(obj, ensure_ascii=False).encode("utf-8"), headers=headers)
+
+    def _inject(self, svc: str) -> bool:
+        """장애 주입. 응답을 이미 보냈으면 True"""
+        f = self.state.fault_for(svc)
+        lo, hi = f.latency_ms
+        if hi > 0:
+            time.sleep(self.state.rnd.uniform(lo, hi) / 1000)
+        if self.state.chance(f.hang):
+            time.sleep(self.state.hang_sec)
+        if self.state.chance(f.rate_limit):
+            reset = int(time.time()) + 60
+            self._json(svc, 429, {"title": "Too Many Requests", "status": 429},
+                       {"Retry-After": "60", "x-rate-limit-limit": str(self.state.tweet_limit),
+                        "x-rate-limit-remaining": "0", "x-rate-limit-reset": str(reset)})
+            return True
+        if self.state.chance(f.error):
+            status = self.state.rnd.choice([500, 502, 503])
+            self._send(svc, status, b"stub error", "text/plain; charset=utf-8")
+            return True
+        return False
+
+    def _route(self) -> tuple[str, str]:
+        """/서비스/나머지 → (서비스, /나머지?쿼리)"""
+        parts = urlsplit(self.path)
+        svc, _, rest = parts.path.lstrip("/").partition("/")
+        return svc, "/" + rest + (f"?{parts.query}" if parts.query else "")
+
+    # ---------- GET ----------
+    def do_GET(self):
+        svc, path = self._route()
+        if svc == "_stats":
+            with self.state.lock:
+                stats = {f"{s} {c}": n for (s, c), n in sorted(self.state.stats.items())}
+            return self._json("_stats", 200, {"requests": stats, "tweets": len(self.state.tweets)})
+        if self._inject(svc):
+            return
+        if svc == "youtube":
+            return self._youtube(path)
+        if svc == "vibe" and path.startswith("/chart/domestic"):
+            # 실제처럼 웹 페이지 접속 시 세션 쿠키 발급
+            return self._send(svc, 200, b"<html><body>VIBE</body></html>", "text/html; charset=utf-8",
+                              {"Set-Cookie": f"{VIBE_COOKIE}; Max-Age=3600; Path=/"})
+        if svc == "vibe_api" and VIBE_COOKIE not in (self.headers.get("Cookie") or ""):
+            return self._json(svc, 401, {"response": {"message": "unauthorized"}})
+        body = self.state.pages.get((svc, path))
+        if body is None:
+            return self._send(svc, 404, b"not found", "text/plain; charset=utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(svc, 304, headers={"ETag": etag})
+        ctype = "application/json; charset=utf-8" if body[:1] == b"{" else "text/html; charset=utf-8"
+        self._send(svc, 200, body, ctype, {"ETag": etag})
+
+    do_HEAD = do_GET
+
+    def _youtube(self, path: str):
+        qs = parse_qs(urlsplit(path).query)
+        ids = [i for raw in qs.get("id", []) for i in raw.split(",") if i]
+        # 조회수는 서버 기동 이후 초당 3씩 증가
+        views = 12_345_678 + int((time.time() - self.state.started) * 3)
+        items = [{"id": vid, "statistics": {"viewCount": str(views + n * 1000), "likeCount": "1000"}}
+                 for n, vid in enumerate(ids)]
+        self._json("youtube", 200, {"kind": "youtube#videoListResponse", "items": items,
+                                    "pageInfo": {"totalResults": len(items), "resultsPerPage": len(items)}},
+                   {"ETag": f'"{views}"'})
+
+    # ---------- POST ----------
+    def do_POST(self):
+        svc, path = self._route()
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = self.rfile.read(length) if length else b""
+        if self._inject(svc):
+            return
+        if svc != "twitter" or not path.startswith("/2/tweets"):
+            return self._send(svc, 404, b"not found", "text/plain; charset=utf-8")
+        if "OAuth " not in (self.headers.get("Authorization") or ""):
+            return self._json(svc, 401, {"title": "Unauthorized", "status": 401})
+        st = self.state
+        posted = None
+        with st.lock:
+            # 15분 창 단위 게시 한도 (x-rate-limit-* 헤더 흉내)
+            if time.time() - st.window_start >= 900:
+                st.window_start, st.tweets = time.time(), []
+            reset = int(st.window_start + 900)
+            if len(st.tweets) < st.tweet_limit:
+                body = json.loads(payload or b"{}")
+                posted = {"id": str(1_800_000_000_000 + len(st.tweets)), "text": body.get("text", "")}
+                if body.get("reply"):
+                    posted["in_reply_to_tweet_id"] = body["reply"].get("in_reply_to_tweet_id")
+                st.tweets.append(posted)
+            remaining = st.tweet_limit - len(st.tweets)
+        headers = {"x-rate-limit-limit": str(st.tweet_limit), "x-rate-limit-remaining": str(remaining),
+                   "x-rate-limit-reset": str(reset)}
+        if posted is None:
+            return self._json(svc, 429, {"title": "Too Many Requests", "status": 429},
+                              {**headers, "Retry-After": str(max(reset - int(time.time()), 1))})
+        self._json(svc, 201, {"data": posted}, headers)
+
+
+def serve(state: StubState, host: str, port: int) -> ThreadingHTTPServer:
+    handler = type("BoundHandler", (Handler,), {"state": state})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+    return httpd
+
+
+def run_once_against_stub(httpd: ThreadingHTTPServer, state: StubState, runs: int, workdir: pathlib.Path):
+    """임시 작업 폴더에서 봇을 스텁으로 N번 실행하고 계측 요약"""
+    host, port = httpd.server_address[:2]
+    os.environ["STUB_URL"] = f"http://{host}:{port}"
+    for k in ("API_KEY", "API_KEY_SECRET", "ACCESS_TOKEN", "ACCESS_TOKEN_SECRET", "YOUTUBE_API_KEY", "YT_VIDEO_ID"):
+        os.environ.setdefault(k, "stub")
+    os.environ.setdefault("CHART_CACHE", "0")  # 매 실행 실제로 요청하도록 (CHART_CACHE=1로 캐시 경로도 측정 가능)
+    os.chdir(workdir)  # fetch_paths.json / history / metrics / cache를 운영 폴더와 분리
+    sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent))
+    import tweet
+
+    state.load_fixtures(tweet.DEFAULT_BASE_URLS)
+    threading.Thread(target=httpd.serve_forever, name="stub-server", daemon=True).start()
+    print(f"[stub] {tweet.BASE_URLS['twitter'].rsplit('/', 1)[0]} workdir={workdir}")
+    for n in range(1, runs + 1):
+        print(f"\n===== run {n}/{runs} =====")
+        tweet.run_once()
+
+    records = [json.loads(line) for line in (workdir / tweet.METRICS_FILE).read_text(encoding="utf-8").splitlines()]
+    sites = sorted({k for r in records for k in r["sites"]})
+    print("\n===== summary =====")
+    print(f"{'run':<5}{'total':>8}{'collect':>9}{'tweet':>8}  " + " ".join(f"{s:>13}" for s in sites))
+    for n, r in enumerate(records, start=1):
+        cells = []
+        for s in sites:
+            d = r["sites"].get(s, {})
+            cells.append(f"{d.get('sec', d.get('waited_sec', 0)):6.2f}s {d.get('status', '-')[:5]:>5}")
+        print(f"{n:<5}{r['total_sec']:>7.2f}s{r['stages'].get('collect', 0):>8.2f}s"
+              f"{r['stages'].get('tweet', 0):>7.2f}s  " + " ".join(f"{c:>13}" for c in cells))
+    with state.lock:
+        print("requests:", {f"{s} {c}": n for (s, c), n in sorted(state.stats.items())})
+    httpd.shutdown()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8808, help="0이면 빈 포트")
+    ap.add_argument("--latency", default="0", help="모든 응답 지연 ms (예: 80 또는 50-300)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="5xx 비율")
+    ap.add_argument("--rate-limit-rate", type=float, default=0.0, help="429 비율")
+    ap.add_argument("--hang-rate", type=float, default=0.0, help="응답하지 않는 요청 비율")
+    ap.add_argument("--hang-sec", type=float, default=60.0)
+    ap.add_argument("--fault", action="append", default=[], metavar="SVC:KIND=VALUE",
+                    help="서비스별 장애 (latency/error/429/hang). 여러 번 지정 가능")
+    ap.add_argument("--tweet-limit", type=int, default=100, help="15분당 트윗 한도")
+    ap.add_argument("--seed", type=int, help="장애 주입 난수 시드")
+    ap.add_argument("--run-once", type=int, metavar="N", help="서버를 띄운 채 run_once를 N번 실행하고 요약")
+    ap.add_argument("--workdir", type=pathlib.Path, help="--run-once 작업 폴더 (기본: 임시 폴더)")
+    args = ap.parse_args()
+
+    default = Fault(parse_latency(args.latency), args.error_rate, args.rate_limit_rate, args.hang_rate)
+    state = StubState(default, parse_faults(args.fault, default), args.tweet_limit, args.hang_sec, args.seed)
+    httpd = serve(state, args.host, 0 if args.run_once and args.port == 8808 else args.port)
+
+    if args.run_once:
+        workdir = args.workdir or pathlib.Path(tempfile.mkdtemp(prefix="twitbot-stub-"))
+        workdir.mkdir(parents=True, exist_ok=True)
+        run_once_against_stub(httpd, state, args.run_once, workdir.resolve())
+        return
+
+    for k in ("API_KEY", "API_KEY_SECRET", "ACCESS_TOKEN", "ACCESS_TOKEN_SECRET", "YOUTUBE_API_KEY", "YT_VIDEO_ID"):
+        os.environ.setdefault(k, "stub")
+    import tweet
+    state.load_fixtures(tweet.DEFAULT_BASE_URLS)
+    host, port = httpd.server_address[:2]
+    print(f"[stub] listening on http://{host}:{port}  (STUB_URL=http://{host}:{port})")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,21 @@
 # -*- coding: utf-8 -*-
-import os, json, pathlib, re
-from datetime import datetime
-import pytz, requests
-from requests_oauthlib import OAuth1
+import time
+_IMPORT_T0 = time.perf_counter()
+import os, sys, json, pathlib, re, random, threading, hashlib, sqlite3, csv, gzip, gc, unicodedata
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed
+from datetime import datetime, timedelta, timezone
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field, replace
+from functools import lru_cache, cached_property
+from types import SimpleNamespace
+from typing import Callable, NamedTuple
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
-from apscheduler.schedulers.blocking import BlockingScheduler
-from apscheduler.triggers.cron import CronTrigger
-from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
+# 무거운 모듈(Playwright/asyncio, bs4, APScheduler, requests_oauthlib, pyarrow)은 쓰는 경로에서만 import
+# → HTTP만으로 끝나는 --once / lambda_handler 실행은 import 비용을 치르지 않음 (STARTUP_BUDGET_SEC 참고)
 
 # ===================== 기본 설정 =====================
 load_dotenv()
@@ -19,67 +27,152 @@ load_dotenv()
 # YT_VIDEO_ID = os.getenv("YT_VIDEO_ID")
 # TARGET_TITLE = (os.getenv("TARGET_TITLE") or "Surf").strip()
 # TARGET_ARTIST = (os.getenv("TARGET_ARTIST") or "NCT WISH").strip()
-# Twitter API Credentials
-API_KEY = os.environ["API_KEY"]
-API_KEY_SECRET = os.environ["API_KEY_SECRET"]
-ACCESS_TOKEN = os.environ["ACCESS_TOKEN"]
-ACCESS_TOKEN_SECRET = os.environ["ACCESS_TOKEN_SECRET"]
+# 여러 계정 설정 파일 (아래 "캠페인" 참고). 있으면 계정별 자격 증명을 쓰므로 아래 기본 값들은 없어도 됨
+CAMPAIGNS_FILE = os.environ.get("CAMPAIGNS", "").strip()
+
+# Twitter API Credentials (필수 여부는 default_campaign()에서 확인)
+API_KEY = os.environ.get("API_KEY", "")
+API_KEY_SECRET = os.environ.get("API_KEY_SECRET", "")
+ACCESS_TOKEN = os.environ.get("ACCESS_TOKEN", "")
+ACCESS_TOKEN_SECRET = os.environ.get("ACCESS_TOKEN_SECRET", "")
 
 # YouTube API
-YOUTUBE_API_KEY = os.environ["YOUTUBE_API_KEY"]
-YT_VIDEO_ID = os.environ["YT_VIDEO_ID"]
+YOUTUBE_API_KEY = os.environ.get("YOUTUBE_API_KEY", "")
+YT_VIDEO_ID = os.environ.get("YT_VIDEO_ID", "").strip()
 
 # Target Song Info (기본값 설정 + 공백 제거)
 TARGET_TITLE = os.environ.get("TARGET_TITLE", "Surf").strip()
 TARGET_ARTIST = os.environ.get("TARGET_ARTIST", "NCT WISH").strip()
 
-for k, v in {
-    "API_KEY": API_KEY, "API_KEY_SECRET": API_KEY_SECRET,
-    "ACCESS_TOKEN": ACCESS_TOKEN, "ACCESS_TOKEN_SECRET": ACCESS_TOKEN_SECRET,
-}.items():
-    if not v:
-        raise SystemExit(f"❌ .env에 {k}가 필요합니다.")
-
-KST = pytz.timezone("Asia/Seoul")
-STATE = pathlib.Path("state.json")  # 이전 순위 저장해서 🔺/🔻 계산
-SITES = [
-    ("멜론 TOP100", "melon_top100"),
-    ("멜론 HOT100", "melon_hot100"),
-    ("지니", "genie"),
-    ("벅스", "bugs"),
-    ("FLO", "flo"),
-    ("VIBE", "vibe"),  
-]
+
+class Target(NamedTuple):
+    title: str
+    artist: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.title} - {self.artist}"
+
+
+def parse_targets(raw: str, default_artist: str = TARGET_ARTIST) -> list[Target]:
+    """TARGETS="Surf|NCT WISH; Steady|NCT WISH" → [Target, ...] (아티스트 생략 시 default_artist)"""
+    out = []
+    for item in filter(None, (x.strip() for x in raw.split(";"))):
+        title, _, artist = item.partition("|")
+        out.append(Target(title.strip(), artist.strip() or default_artist))
+    return out
+
+
+# 여러 곡 동시 추적: 차트는 한 번만 긁고 모든 곡을 한 번에 매칭. 첫 곡이 대표 곡
+TARGETS = parse_targets(os.environ.get("TARGETS", "")) or [Target(TARGET_TITLE, TARGET_ARTIST)]
+
+
+class Video(NamedTuple):
+    id: str
+    label: str = ""  # 영상이 여러 개일 때 본문에 붙일 이름 (MV, 무대, 쇼츠 ...)
+
+
+def parse_videos(raw: str | list) -> list[Video]:
+    """YT_VIDEO_IDS="id1=MV,id2=무대,id3" 또는 ["id1=MV", {"id": "id2", "label": "무대"}] → [Video, ...]"""
+    items = raw.split(",") if isinstance(raw, str) else raw
+    out = []
+    for item in items:
+        if isinstance(item, dict):
+            out.append(Video(item["id"], item.get("label", "")))
+        elif item.strip():
+            vid, _, label = item.strip().partition("=")
+            out.append(Video(vid.strip(), label.strip()))
+    return out
+
+
+# 여러 영상 조회수 추적 (한 번의 요청으로). 비우면 YT_VIDEO_ID 하나. 첫 영상이 대표 영상
+YT_VIDEOS = parse_videos(os.environ.get("YT_VIDEO_IDS", "")) or ([Video(YT_VIDEO_ID)] if YT_VIDEO_ID else [])
+
+KST = timezone(timedelta(hours=9), "KST")  # 서머타임 없음 → 고정 오프셋 (pytz/tzdata 불필요)
+STATE = pathlib.Path("state.json")  # 구버전 직전 순위 파일 (이제는 HISTORY_DB로 한 번 이전만 함)
+# 수집 대상 차트 목록(SITES)은 아래 "차트 스펙 정의"에서 CHARTS 설정으로 만든다
+
+# 동시 수집: 전체 마감(초) + 사이트별 예산(초). 늦은 사이트는 ❌ 처리하고 그대로 트윗
+# 예) SITE_BUDGETS="bugs=20,genie=40"
+RUN_DEADLINE_SEC = float(os.environ.get("RUN_DEADLINE_SEC", "90"))
+FETCH_WORKERS = int(os.environ.get("FETCH_WORKERS", "7"))  # 1이면 순차 실행
+SITE_BUDGETS = {
+    "melon_top100": 30, "melon_hot100": 30, "genie": 60, "bugs": 35,
+    "flo": 20, "vibe": 20, "youtube": 20,
+}
+for _item in filter(None, os.environ.get("SITE_BUDGETS", "").split(",")):
+    _k, _, _v = _item.partition("=")
+    SITE_BUDGETS[_k.strip()] = float(_v)
+
+# 외부 서비스 기본 URL. 지연/오류/부하 테스트 때 로컬 스텁(stub_server.py)으로 돌릴 수 있게 설정으로 뺌
+# 예) BASE_URLS="flo=http://127.0.0.1:8808/flo,twitter=http://127.0.0.1:8808/twitter"
+#     STUB_URL=http://127.0.0.1:8808 → 모든 서비스를 {STUB_URL}/{이름}으로
+DEFAULT_BASE_URLS = {
+    "twitter": "https://api.twitter.com",
+    "youtube": "https://www.googleapis.com",
+    "melon": "https://www.melon.com",
+    "genie": "https://www.genie.co.kr",
+    "bugs": "https://music.bugs.co.kr",
+    "flo": "https://www.music-flo.com",
+    "vibe_api": "https://apis.naver.com",
+    "vibe": "https://vibe.naver.com",
+}
+BASE_URLS = dict(DEFAULT_BASE_URLS)
+if os.environ.get("STUB_URL"):
+    BASE_URLS = {k: f"{os.environ['STUB_URL'].rstrip('/')}/{k}" for k in BASE_URLS}
+for _item in filter(None, os.environ.get("BASE_URLS", "").split(",")):
+    _k, _, _v = _item.partition("=")
+    BASE_URLS[_k.strip()] = _v.strip().rstrip("/")
+
+
+def rebase_url(url: str) -> str:
+    """운영 URL → 현재 BASE_URLS 기준 URL (저장해 둔 운영 URL을 스텁/대체 주소로 옮길 때)"""
+    for name, default in DEFAULT_BASE_URLS.items():
+        if url == default or url.startswith(default + "/"):
+            return BASE_URLS[name] + url[len(default):]
+    return url
 
 
 
 # ===================== 유틸 =====================
+_FEAT_PAREN_RE = re.compile(r"\(feat\.?.*?\)|\(prod\.?.*?\)")
+_FEAT_WORD_RE = re.compile(r"feat\.?|featuring|prod\.?")
+_PUNCT_TABLE = str.maketrans({c: " " for c in "[]()-–—·~_:/.,!?'"})
+
+
+@lru_cache(maxsize=8192)
 def normalize(s: str) -> str:
+    # 같은 곡이 여러 차트/여러 회차에 반복 등장하므로 결과를 캐시
     s = s.lower()
-    s = re.sub(r"\(feat\.?.*?\)|\(prod\.?.*?\)", "", s)
-    s = re.sub(r"feat\.?|featuring|prod\.?", "", s)
-    s = re.sub(r"[\[\]\(\)\-–—·~_:/.,!?']", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+    s = _FEAT_PAREN_RE.sub("", s)
+    s = _FEAT_WORD_RE.sub("", s)
+    s = s.translate(_PUNCT_TABLE)
+    return " ".join(s.split())
+
+
+@lru_cache(maxsize=8192)
+def artist_tokens(artist: str) -> frozenset[str]:
+    return frozenset(normalize(artist).split())
+
 
 def is_match(title: str, artist: str, target_title: str, target_artist: str) -> bool:
-    t1, a1 = normalize(title), normalize(artist)
-    t2, a2 = normalize(target_title), normalize(target_artist)
+    t1, t2 = normalize(title), normalize(target_title)
     if t2 in t1 or t1 in t2:
-        return len(set(a1.split()) & set(a2.split())) > 0
+        return not artist_tokens(artist).isdisjoint(artist_tokens(target_artist))
     return False
 
-def load_state():
-    if STATE.exists():
+def load_state(path: pathlib.Path = STATE):
+    if path.exists():
         try:
-            return json.loads(STATE.read_text(encoding="utf-8"))
+            d = json.loads(path.read_text(encoding="utf-8"))
+            # 구버전(단일 곡) state: {"ranks": {...}} → 대표 곡의 {"songs": {key: {"ranks": ...}}}
+            if "ranks" in d and "songs" not in d:
+                d["songs"] = {TARGETS[0].key: {"ranks": d.pop("ranks")}}
+            return d
         except Exception:
             pass
     return {}
 
-def save_state(d):
-    STATE.write_text(json.dumps(d, ensure_ascii=False, indent=2), encoding="utf-8")
-
 def delta_text(prev, curr):
     if prev is None or curr is None:
         return ""
@@ -92,10 +185,29 @@ def delta_text(prev, curr):
 def format_views(n: int | None) -> str:
     return "❌" if n is None else f"{n:,}"
 
-def tweet(text: str) -> int:
-    url = "https://api.twitter.com/2/tweets"
-    auth = OAuth1(API_KEY, API_KEY_SECRET, ACCESS_TOKEN, ACCESS_TOKEN_SECRET)
-    r = requests.post(url, json={"text": text}, auth=auth, timeout=20)
+TWITTER_CREDENTIALS = (API_KEY, API_KEY_SECRET, ACCESS_TOKEN, ACCESS_TOKEN_SECRET)
+_twitter_sessions: dict[tuple[str, ...], requests.Session] = {}
+
+
+def twitter_session(credentials: tuple[str, ...] = TWITTER_CREDENTIALS) -> requests.Session:
+    """계정별 OAuth1 서명 세션 (커넥션 풀은 공용과 공유, 프로세스 동안 재사용)"""
+    with _http_lock:
+        sess = _twitter_sessions.get(credentials)
+        if sess is None:
+            from requests_oauthlib import OAuth1
+            sess = _new_session()
+            sess.auth = OAuth1(*credentials)
+            _twitter_sessions[credentials] = sess
+        return sess
+
+
+def post_tweet(text: str, credentials: tuple[str, ...] = TWITTER_CREDENTIALS,
+               reply_to: str | None = None) -> requests.Response:
+    url = f"{BASE_URLS['twitter']}/2/tweets"
+    payload = {"text": text}
+    if reply_to:
+        payload["reply"] = {"in_reply_to_tweet_id": reply_to}
+    r = twitter_session(credentials).post(url, json=payload, timeout=20)
     print("Tweet:", r.status_code, r.text)
     print("Headers:", {
     "x-rate-limit-limit": r.headers.get("x-rate-limit-limit"),
@@ -103,7 +215,11 @@ def tweet(text: str) -> int:
     "x-rate-limit-reset": r.headers.get("x-rate-limit-reset"),
     "retry-after": r.headers.get("retry-after"),
 })
-    return r.status_code
+    return r
+
+
+def tweet(text: str) -> int:
+    return post_tweet(text).status_code
 
 def as_int(x):
     if isinstance(x, (list, tuple)):
@@ -116,92 +232,1544 @@ def as_int(x):
     except Exception:
         return None
 
-# ===================== YouTube 조회수 =====================
-def fetch_youtube_views() -> int | None:
-    if not (YOUTUBE_API_KEY and YT_VIDEO_ID):
+# ===================== 메모리 제한 모드 =====================
+# 작은 인스턴스(t-class)에서 Chromium이 떠 있는 동안 OOM으로 죽지 않도록.
+# LOW_MEMORY=1: 브라우저 동시 페이지 BROWSER_MAX_PAGES개, 저메모리 Chromium 플래그, 실행이 끝나면 브라우저 종료
+# MEMORY_BUDGET_MB: 프로세스 트리(본체 + Playwright 드라이버 + Chromium) RSS 예산. 예산의 MEMORY_SERIAL_RATIO에
+#   닿으면 그 실행의 남은 페이지 수집/파싱을 한 번에 하나씩(직렬)으로 낮춤 → 느려질 뿐 죽지 않음 (0이면 끔)
+LOW_MEMORY = os.environ.get("LOW_MEMORY", "0") == "1"
+MEMORY_BUDGET_MB = int(os.environ.get("MEMORY_BUDGET_MB", "600" if LOW_MEMORY else "0"))
+MEMORY_SERIAL_RATIO = 0.8
+BROWSER_MAX_PAGES = int(os.environ.get("BROWSER_MAX_PAGES", "1" if LOW_MEMORY else "0"))  # 0이면 제한 없음
+CHROMIUM_LOW_MEMORY_ARGS = [
+    "--disable-dev-shm-usage",  # 작은 /dev/shm 대신 /tmp 사용
+    "--disable-gpu",
+    "--disable-extensions",
+    "--renderer-process-limit=1",
+    "--disable-features=site-per-process,Translate,BackForwardCache,MediaRouter",
+    "--js-flags=--max-old-space-size=128",
+    "--disk-cache-size=1",
+]
+_PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024 if hasattr(os, "sysconf") else 4
+# 같은 실행 안에서 이 간격(초) 안의 재측정은 직전 값을 그대로 씀 (slot()마다 /proc을 읽지 않도록)
+MEMORY_SAMPLE_SEC = float(os.environ.get("MEMORY_SAMPLE_SEC", "0.5"))
+
+
+def _child_pids(proc: pathlib.Path, pid: int) -> list[int] | None:
+    """/proc/<pid>/task/*/children로 직계 자식만. 커널이 이 파일을 지원하지 않으면 None"""
+    try:
+        tasks = list((proc / str(pid) / "task").iterdir())
+    except OSError:
+        return []  # 그 사이 종료된 프로세스
+    out: list[int] = []
+    for t in tasks:
+        try:
+            out.extend(int(x) for x in (t / "children").read_text().split())
+        except FileNotFoundError:
+            return None if pid == os.getpid() else out
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def _all_children(proc: pathlib.Path) -> dict[int, list[int]]:
+    """children 파일이 없는 커널용: /proc 전체를 훑어 ppid → 자식 목록"""
+    children: dict[int, list[int]] = {}
+    for d in proc.iterdir():
+        if not d.name.isdigit():
+            continue
+        try:
+            ppid = int((d / "stat").read_text().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue  # 그 사이 종료된 프로세스
+        children.setdefault(ppid, []).append(int(d.name))
+    return children
+
+
+def process_tree_rss_kb() -> int | None:
+    """현재 프로세스 + 모든 자손 프로세스의 RSS 합 (KB, 자손은 공유 페이지 제외). /proc이 없으면 None"""
+    proc = pathlib.Path("/proc")
+    me = os.getpid()
+    if not (proc / str(me) / "statm").exists():
         return None
+    kids = _child_pids(proc, me)
+    table = None if kids is not None else _all_children(proc)
+    total, stack = 0, [me]
+    while stack:
+        pid = stack.pop()
+        try:
+            _, resident, shared = (int(x) for x in (proc / str(pid) / "statm").read_text().split()[:3])
+        except (OSError, ValueError):
+            continue
+        # Chromium 프로세스끼리는 공유 페이지가 많아 그대로 더하면 과대 계산 → 자손은 익명(비공유) 페이지만
+        total += (resident if pid == me else resident - shared) * _PAGE_KB
+        if table is not None:
+            stack.extend(table.get(pid, ()))
+        else:
+            stack.extend(kids if pid == me else (_child_pids(proc, pid) or ()))
+    return total
+
+
+class MemoryGuard:
+    """
+    실행 단위 메모리 감시. RunMetrics.reset()마다 초기화되므로 상주 모드(스케줄러/데몬)에서도 실행별 값.
+    - sample(): 현재 프로세스 트리 RSS (max_age 안이면 직전 측정값). 파싱 직후에는 max_age=0으로 새로 재고,
+      slot()의 확인은 그 값을 재사용. 새로 잰 값은 METRICS의 최대 RSS에 반영
+    - slot(): 예산에 가까워졌으면 전역 잠금으로 직렬화, 아니면 그냥 통과. 한 번 직렬로 바뀌면 그 실행 끝까지 유지
+    """
+
+    def __init__(self, budget_mb: int = MEMORY_BUDGET_MB):
+        self.budget_kb = budget_mb * 1024
+        self._lock = threading.Lock()
+        self._serial = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.samples = 0
+            self.serialized = 0
+            self.degraded_at_kb: int | None = None
+            self._last: tuple[float, int | None] | None = None
+
+    def sample(self, max_age: float = MEMORY_SAMPLE_SEC) -> int | None:
+        with self._lock:
+            if self._last is not None and time.monotonic() - self._last[0] < max_age:
+                return self._last[1]
+        kb = process_tree_rss_kb()
+        with self._lock:
+            self._last = (time.monotonic(), kb)
+            if kb is not None:
+                self.samples += 1
+        if kb is not None:
+            METRICS.rss(kb)
+        return kb
+
+    def tight(self) -> bool:
+        if not self.budget_kb:
+            return False
+        if self.degraded_at_kb is not None:
+            return True
+        kb = self.sample()
+        if kb is None or kb < self.budget_kb * MEMORY_SERIAL_RATIO:
+            return False
+        with self._lock:
+            if self.degraded_at_kb is None:
+                self.degraded_at_kb = kb
+                print(f"[memory] RSS {kb / 1024:.0f}MB ≥ 예산 {self.budget_kb / 1024:.0f}MB의 "
+                      f"{MEMORY_SERIAL_RATIO:.0%} → 남은 수집을 직렬로")
+        return True
+
+    @contextmanager
+    def slot(self):
+        if not self.tight():
+            yield
+            return
+        with self._serial:
+            with self._lock:
+                self.serialized += 1
+            try:
+                yield
+            finally:
+                gc.collect()  # 다음 작업 전에 순환 참조(파싱 트리 등)까지 회수
+
+    def stats(self) -> dict:
+        """최대 RSS는 METRICS의 peak_rss_kb["tree"]에 있으므로 여기서는 감시 상태만"""
+        self.sample(max_age=0)
+        with self._lock:
+            out = {"samples": self.samples, "serialized": self.serialized}
+            if self.budget_kb:
+                out["budget_mb"] = self.budget_kb // 1024
+            if self.degraded_at_kb is not None:
+                out["degraded_at_mb"] = round(self.degraded_at_kb / 1024, 1)
+            return out
+
+
+MEMORY = MemoryGuard()
+
+
+# ===================== 계측 =====================
+# 실행마다 단계별 소요 시간, 사이트별 수집(경로/바이트/행 수/소요), 브라우저 실행 시간, 최대 RSS를 모아
+# METRICS_FILE에 JSON 한 줄로 추가. METRICS_PROM을 주면 node_exporter textfile collector용 .prom도 기록.
+METRICS_FILE = pathlib.Path(os.environ.get("METRICS_FILE", "metrics.jsonl"))
+# 예) METRICS_PROM=/var/lib/node_exporter/textfile_collector/twitbot.prom
+METRICS_PROM = os.environ.get("METRICS_PROM", "").strip()
+# 모듈 로드(import + 설정) 예산. 넘으면 실행마다 경고 (bench.py --startup이 새 프로세스로 측정·검사)
+STARTUP_BUDGET_SEC = float(os.environ.get("STARTUP_BUDGET_SEC", "0.3"))
+# 필요한 경로에서만 import하는 모듈 → 실행이 끝났을 때 어떤 것을 실제로 불러왔는지 기록
+LAZY_MODULES = ("playwright", "asyncio", "bs4", "apscheduler", "requests_oauthlib", "pyarrow")
+
+
+def loaded_lazy_modules() -> list[str]:
+    return [m for m in LAZY_MODULES if m in sys.modules]
+
+
+def peak_rss_kb() -> dict[str, int]:
+    """자기 자신 / 회수된 자식 프로세스(Playwright 드라이버·Chromium)의 최대 RSS (KB, 리눅스 기준)"""
     try:
-        url = "https://www.googleapis.com/youtube/v3/videos"
-        params = {"part": "statistics", "id": YT_VIDEO_ID, "key": YOUTUBE_API_KEY}
-        r = requests.get(url, params=params, timeout=20)
-        r.raise_for_status()
-        items = r.json().get("items", [])
-        if not items:
+        import resource
+    except ImportError:  # Windows
+        return {}
+    return {"self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss}
+
+
+class RunMetrics:
+    """
+    한 번의 실행 계측. 여러 수집 스레드에서 동시에 기록하므로 잠금으로 보호.
+    - stage(): 단계 소요 시간 (같은 이름은 누적)
+    - site(): 사이트별 값. 숫자는 누적, 그 외(경로/상태)는 덮어씀
+    - campaign(): 캠페인(계정)별 값 (덮어씀)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        MEMORY.reset()
+        with self._lock:
+            self.started = time.time()
+            self._t0 = time.perf_counter()
+            self.stages: dict[str, float] = {}
+            self.sites: dict[str, dict] = {}
+            self.campaigns: dict[str, dict] = {}
+            self.info: dict = {}
+            self.tree_rss_kb = 0
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - t0)
+
+    def add_stage(self, name: str, sec: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + sec
+
+    def site(self, key: str, **values):
+        with self._lock:
+            d = self.sites.setdefault(key, {})
+            for k, v in values.items():
+                if isinstance(v, (int, float)) and not isinstance(v, bool):
+                    d[k] = d.get(k, 0) + v
+                else:
+                    d[k] = v
+
+    def campaign(self, name: str, **values):
+        with self._lock:
+            self.campaigns.setdefault(name, {}).update(values)
+
+    def set(self, **values):
+        with self._lock:
+            self.info.update(values)
+
+    def rss(self, kb: int):
+        """MemoryGuard가 잰 프로세스 트리 RSS → 이번 실행 최대값"""
+        with self._lock:
+            self.tree_rss_kb = max(self.tree_rss_kb, kb)
+
+    def snapshot(self) -> dict:
+        def rounded(d: dict) -> dict:
+            return {k: round(v, 4) if isinstance(v, float) else v for k, v in d.items()}
+
+        memory = MEMORY.stats()  # 마지막 측정이 rss()로 들어오므로 잠금 밖에서 먼저
+        with self._lock:
+            peak = peak_rss_kb()
+            if self.tree_rss_kb:
+                peak["tree"] = self.tree_rss_kb
+            return {
+                "ts": int(self.started),
+                "at": datetime.fromtimestamp(self.started, KST).strftime("%Y-%m-%d %H:%M:%S"),
+                "total_sec": round(time.perf_counter() - self._t0, 4),
+                "stages": rounded(self.stages),
+                "sites": {k: rounded(v) for k, v in self.sites.items()},
+                "campaigns": {k: rounded(v) for k, v in self.campaigns.items()},
+                **self.info,
+                "peak_rss_kb": peak,
+                "memory": memory,
+            }
+
+    def write(self, path: pathlib.Path = METRICS_FILE, prom_path: str = METRICS_PROM) -> dict:
+        record = self.snapshot()
+        try:
+            with path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"[metrics] {path} write error:", e)
+        if prom_path:
+            try:
+                prom = pathlib.Path(prom_path)
+                tmp = prom.with_suffix(".tmp")
+                tmp.write_text(prometheus_text(record), encoding="utf-8")
+                tmp.replace(prom)  # collector가 반쯤 쓴 파일을 읽지 않도록 원자적 교체
+            except OSError as e:
+                print(f"[metrics] {prom_path} write error:", e)
+        return record
+
+
+def prometheus_text(record: dict) -> str:
+    """계측 레코드 → Prometheus 텍스트 포맷 (게이지만 사용)"""
+    out: list[str] = []
+
+    def gauge(name: str, help_: str, samples: list[tuple[dict, float]]):
+        if not samples:
+            return
+        out.append(f"# HELP twitbot_{name} {help_}")
+        out.append(f"# TYPE twitbot_{name} gauge")
+        for labels, value in samples:
+            lbl = ",".join(f'{k}="{v}"' for k, v in labels.items())
+            out.append(f"twitbot_{name}{{{lbl}}} {value}" if lbl else f"twitbot_{name} {value}")
+
+    sites = record["sites"]
+    gauge("last_run_timestamp_seconds", "마지막 실행 시각", [({}, record["ts"])])
+    gauge("run_seconds", "실행 전체 소요", [({}, record["total_sec"])])
+    gauge("stage_seconds", "단계별 소요", [({"stage": k}, v) for k, v in record["stages"].items()])
+    for field_, help_ in (("sec", "사이트별 수집 소요"), ("bytes", "사이트별 내려받은 바이트"),
+                          ("rows", "사이트별 파싱한 행 수"), ("pages", "사이트별 요청 페이지 수"),
+                          ("parse_sec", "사이트별 파싱 소요")):
+        gauge(f"site_{field_}", help_, [({"site": k}, v[field_]) for k, v in sites.items() if field_ in v])
+    gauge("site_ok", "사이트 수집 성공 여부", [({"site": k}, int(v.get("status") == "ok")) for k, v in sites.items()
+                                          if "status" in v])
+    browser = record.get("browser") or {}
+    gauge("browser_launch_seconds", "Chromium 실행 소요", [({}, browser["launch_sec"])] if "launch_sec" in browser else [])
+    gauge("browser_pages", "브라우저로 렌더한 페이지 수", [({}, browser["pages"])] if "pages" in browser else [])
+    if record.get("import_sec") is not None:
+        gauge("import_seconds", "모듈 로드 소요 (프로세스당 1회)", [({}, record["import_sec"])])
+    # process="tree"는 이번 실행 중 잰 프로세스 트리(본체 + 자손) 최대값
+    gauge("peak_rss_bytes", "최대 RSS", [({"process": k}, v * 1024) for k, v in record["peak_rss_kb"].items()])
+    memory = record.get("memory") or {}
+    if memory.get("samples"):
+        gauge("run_serialized_tasks", "메모리 예산 때문에 직렬로 돌린 수집 작업 수", [({}, memory["serialized"])])
+    if record.get("tweet_status") is not None:
+        gauge("tweet_status_code", "트윗 API 응답 코드", [({}, record["tweet_status"])])
+    if record.get("post_latency_sec") is not None:
+        gauge("post_latency_seconds", "기준 시각(정각/목표 초) → 트윗 게시 지연", [({}, record["post_latency_sec"])])
+    campaigns = record.get("campaigns") or {}
+    gauge("campaign_tweet_status_code", "캠페인별 트윗 API 응답 코드",
+          [({"campaign": k}, v["tweet_status"]) for k, v in campaigns.items() if v.get("tweet_status") is not None])
+    gauge("campaign_post_latency_seconds", "캠페인별 기준 시각 → 게시 지연",
+          [({"campaign": k}, v["post_latency_sec"]) for k, v in campaigns.items() if "post_latency_sec" in v])
+    return "\n".join(out) + "\n"
+
+
+METRICS = RunMetrics()
+
+
+# ===================== 순위 이력 (SQLite) =====================
+# 매 실행의 모든 관측(시각, 사이트, 곡, 순위, 사이트 제공 변동치)과 유튜브 조회수를 append-only로 저장.
+# 직전 게시 순위 / 24시간·7일 전 순위 / 역대 최고 순위를 인덱스 조회로 꺼낸다. (state.json 대체)
+HISTORY_DB = pathlib.Path(os.environ.get("HISTORY_DB", "history.sqlite3"))
+# 트윗에 덧붙일 추세: "24h", "7d", "peak" 중 선택. 예) TWEET_TRENDS="24h,peak"
+TWEET_TRENDS = [k.strip() for k in os.environ.get("TWEET_TRENDS", "").split(",") if k.strip()]
+TREND_WINDOWS = {"24h": 24 * 3600, "7d": 7 * 86400}
+TREND_TOLERANCE_SEC = 2 * 3600  # 24시간 전 "그 무렵" 관측으로 인정할 범위
+# 시간당 조회수: 30분~3시간 전 가장 최근 관측과 비교해 1시간 기준으로 환산
+VIEW_RATE_MIN_SEC = 1800
+VIEW_RATE_MAX_SEC = 3 * 3600
+YT_SHOW_RATE = os.environ.get("YT_SHOW_RATE", "1") != "0"
+
+_HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    youtube_views INTEGER,
+    posted INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS observations (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    ts INTEGER NOT NULL,
+    site TEXT NOT NULL,
+    song TEXT NOT NULL,
+    rank INTEGER,
+    change INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_obs_song_site_ts ON observations(song, site, ts);
+CREATE INDEX IF NOT EXISTS idx_obs_song_site_rank ON observations(song, site, rank);
+CREATE INDEX IF NOT EXISTS idx_runs_posted_ts ON runs(posted, ts);
+CREATE TABLE IF NOT EXISTS video_views (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    ts INTEGER NOT NULL,
+    video_id TEXT NOT NULL,
+    views INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_video_views_id_ts ON video_views(video_id, ts);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER REFERENCES runs(id),
+    created_at INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at INTEGER NOT NULL DEFAULT 0,
+    last_status INTEGER,
+    tweet_id TEXT,
+    updated_at INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox(status, next_attempt_at);
+"""
+# 나중에 추가된 열: 기존 DB에는 ALTER TABLE로 붙임 (CREATE TABLE IF NOT EXISTS는 있는 표를 바꾸지 않음)
+_HISTORY_COLUMNS = {
+    # 곡별로 나눈 본문 스레드: 첫 트윗 id(thread_of, 첫 트윗 자신은 NULL)와 순서(seq)
+    # 종류(kind): hourly(정시 게시) / poll(변동 감지 게시) — 대체(superseded)는 같은 종류끼리만
+    "outbox": {"thread_of": "INTEGER", "seq": "INTEGER NOT NULL DEFAULT 0", "kind": "TEXT NOT NULL DEFAULT 'hourly'"},
+}
+
+
+class RankHistory:
+    """순위 이력 저장소. 연결 하나를 잠금으로 보호해 스레드 간 공유."""
+
+    def __init__(self, path: pathlib.Path = HISTORY_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_HISTORY_SCHEMA)
+        for table, columns in _HISTORY_COLUMNS.items():
+            have = {row[1] for row in self._db.execute(f"PRAGMA table_info({table})")}
+            for name, decl in columns.items():
+                if name not in have:
+                    self._db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _one(self, sql: str, args: tuple):
+        with self._lock:
+            row = self._db.execute(sql, args).fetchone()
+        return row[0] if row else None
+
+    # ---------- 기록 ----------
+    def record_run(self, ts: float, ranks: dict[str, dict[str, int | None]],
+                   changes: dict[str, dict[str, int]], views: int | None, posted: bool = False,
+                   video_views: dict[str, int] | None = None) -> int:
+        """한 실행의 관측 전부(영상별 조회수 포함)를 한 트랜잭션으로 추가 → run id"""
+        ts = int(ts)
+        with self._lock:
+            cur = self._db.cursor()
+            cur.execute("BEGIN")
+            cur.execute("INSERT INTO runs(ts, youtube_views, posted) VALUES (?, ?, ?)", (ts, views, int(posted)))
+            run_id = cur.lastrowid
+            cur.executemany(
+                "INSERT INTO observations(run_id, ts, site, song, rank, change) VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id, ts, site, song, as_int(rank), (changes.get(song) or {}).get(site))
+                 for song, per_site in ranks.items() for site, rank in per_site.items()],
+            )
+            cur.executemany("INSERT INTO video_views(run_id, ts, video_id, views) VALUES (?, ?, ?, ?)",
+                            [(run_id, ts, vid, n) for vid, n in (video_views or {}).items() if n is not None])
+            cur.execute("COMMIT")
+        return run_id
+
+    def mark_posted(self, run_id: int):
+        with self._lock:
+            self._db.execute("UPDATE runs SET posted = 1 WHERE id = ?", (run_id,))
+
+    # ---------- 조회 ----------
+    def previous_rank(self, song: str, site: str) -> int | None:
+        """마지막으로 게시된 실행에서의 순위 (🔺/🔻 계산 기준)"""
+        return self._one(
+            "SELECT o.rank FROM observations o JOIN runs r ON r.id = o.run_id "
+            "WHERE o.song = ? AND o.site = ? AND r.posted = 1 ORDER BY o.ts DESC LIMIT 1",
+            (song, site),
+        )
+
+    def rank_at(self, song: str, site: str, ts: float, tolerance_sec: int = TREND_TOLERANCE_SEC) -> int | None:
+        """ts 시점(또는 그 직전 tolerance 안)의 순위"""
+        return self._one(
+            "SELECT rank FROM observations WHERE song = ? AND site = ? AND ts <= ? AND ts >= ? "
+            "AND rank IS NOT NULL ORDER BY ts DESC LIMIT 1",
+            (song, site, int(ts), int(ts - tolerance_sec)),
+        )
+
+    def peak(self, song: str, site: str) -> int | None:
+        return self._one(
+            "SELECT MIN(rank) FROM observations WHERE song = ? AND site = ? AND rank IS NOT NULL",
+            (song, site),
+        )
+
+    def last_posted_ts(self) -> int | None:
+        return self._one("SELECT MAX(ts) FROM runs WHERE posted = 1", ())
+
+    def views_per_hour(self, video_id: str, ts: float, views: int | None) -> float | None:
+        """저장된 조회수 이력으로 계산한 시간당 증가량 (비교할 관측이 없으면 None)"""
+        if views is None:
             return None
-        return int(items[0]["statistics"]["viewCount"])
-    except Exception as e:
-        print("YouTube fetch error:", e)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT ts, views FROM video_views WHERE video_id = ? AND ts <= ? AND ts >= ? ORDER BY ts DESC LIMIT 1",
+                (video_id, int(ts - VIEW_RATE_MIN_SEC), int(ts - VIEW_RATE_MAX_SEC))).fetchone()
+        if row is None:
+            return None
+        return (views - row[1]) * 3600 / (ts - row[0])
+
+    def last_posted_views(self) -> int | None:
+        return self._one("SELECT youtube_views FROM runs WHERE posted = 1 ORDER BY ts DESC LIMIT 1", ())
+
+    def previous_state(self, targets: list[Target], sites: list[str]) -> dict:
+        """build_text가 쓰는 직전 게시 상태 {"songs": {key: {"ranks": {site: rank}}}}"""
+        return {"songs": {t.key: {"ranks": {site: self.previous_rank(t.key, site) for site in sites}}
+                          for t in targets}}
+
+    def trends(self, targets: list[Target], sites: list[str], now_ts: float,
+               kinds: list[str] = TWEET_TRENDS) -> dict[str, dict[str, dict[str, int | None]]]:
+        """{곡: {사이트: {"24h": 그때 순위, "7d": ..., "peak": 최고 순위}}}"""
+        out = {}
+        for t in targets:
+            per_site = out.setdefault(t.key, {})
+            for site in sites:
+                info = {}
+                for kind in kinds:
+                    if kind == "peak":
+                        info[kind] = self.peak(t.key, site)
+                    elif kind in TREND_WINDOWS:
+                        info[kind] = self.rank_at(t.key, site, now_ts - TREND_WINDOWS[kind])
+                per_site[site] = info
+        return out
+
+    # ---------- state.json 이전 ----------
+    def migrate_state_json(self, state_path: pathlib.Path = STATE):
+        """기존 state.json의 직전 게시 순위를 게시된 실행 하나로 옮김 (한 번만)"""
+        if self._one("SELECT value FROM meta WHERE key = 'migrated_state_json'", ()) or not state_path.exists():
+            return
+        state = load_state(state_path)
+        try:
+            ts = datetime.strptime(state["last_posted_at"], "%Y-%m-%d %H:%M:%S").replace(tzinfo=KST).timestamp()
+        except (KeyError, ValueError):
+            ts = state_path.stat().st_mtime
+        ranks = {song: info.get("ranks", {}) for song, info in state.get("songs", {}).items()}
+        if ranks:
+            self.record_run(ts, ranks, {}, as_int(state.get("youtube_views")), posted=True)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('migrated_state_json', ?)",
+                             (str(int(time.time())),))
+        print(f"[history] {state_path} → {self.path} 이전 완료 ({len(ranks)}곡)")
+
+
+def open_history(path: pathlib.Path = HISTORY_DB) -> RankHistory:
+    history = RankHistory(path)
+    history.migrate_state_json()
+    return history
+
+
+# ===================== 트윗 발송함 =====================
+# 본문을 먼저 outbox 테이블에 넣고 보낸다. 429/5xx/연결 오류면 남겨 두고 X API 한도 헤더(reset, retry-after)에
+# 맞춰 다음 시도 시각을 정함. 새 본문이 들어오면 아직 못 보낸 같은 종류(kind)의 옛 본문은 superseded로 접는다
+# (변동 감지 게시가 재시도 대기 중인 정시 게시를 지우지 않도록).
+# 본문이 여러 트윗(스레드)이면 행을 트윗마다 두고, 앞 트윗이 올라간 뒤 그 트윗의 답글로 이어 보낸다.
+# 상태: pending → posted / superseded / expired(너무 늦음) / failed(재시도해도 안 되는 4xx, 시도 초과)
+OUTBOX_MAX_AGE_SEC = int(os.environ.get("OUTBOX_MAX_AGE_SEC", "3000"))  # 정각 본문을 50분 넘게 늦게 올리지 않음
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BACKOFF_SEC = 60
+OUTBOX_BACKOFF_CAP_SEC = 900
+
+
+class RateLimit(NamedTuple):
+    """X API 응답 헤더의 게시 한도 (15분 창 + 사용자 24시간 한도 중 더 빡빡한 쪽)"""
+    limit: int | None = None
+    remaining: int | None = None
+    reset: int | None = None
+    retry_after: int | None = None
+
+    @classmethod
+    def from_headers(cls, headers) -> "RateLimit":
+        limit, remaining, reset = (as_int(headers.get(f"x-rate-limit-{k}")) for k in ("limit", "remaining", "reset"))
+        day_remaining = as_int(headers.get("x-user-limit-24hour-remaining"))
+        if day_remaining is not None and (remaining is None or day_remaining < remaining):
+            limit = as_int(headers.get("x-user-limit-24hour-limit"))
+            remaining, reset = day_remaining, as_int(headers.get("x-user-limit-24hour-reset"))
+        return cls(limit, remaining, reset, as_int(headers.get("retry-after")))
+
+    def blocked_until(self, now: float) -> int | None:
+        """한도를 다 썼고 reset 전이면 reset 시각"""
+        if self.remaining == 0 and self.reset and self.reset > now:
+            return self.reset
         return None
 
+
+class TweetOutbox:
+    """내구성 있는 트윗 발송함 (순위 이력 DB에 함께 저장, 게시 성공 시 해당 실행을 posted로)"""
+
+    def __init__(self, history: RankHistory, post: Callable[..., requests.Response] | None = None):
+        self.history = history
+        self._post = post or post_tweet  # post(text) / 답글이면 post(text, reply_to=트윗 id)
+
+    def enqueue(self, run_id: int | None, text: str | list[str], ts: float, kind: str = "hourly") -> int:
+        """
+        새 본문(여러 개면 스레드) 추가 → 첫 트윗 outbox id.
+        아직 대기 중인 같은 종류의 옛 본문은 이 본문으로 대체(superseded)
+        """
+        texts = [text] if isinstance(text, str) else text
+        now = int(time.time())
+        with self.history._lock:
+            cur = self.history._db.cursor()
+            cur.execute("BEGIN")
+            cur.execute("UPDATE outbox SET status = 'superseded', updated_at = ? WHERE status = 'pending' AND kind = ?",
+                        (now, kind))
+            if cur.rowcount:
+                print(f"[outbox] 대기 중이던 옛 {kind} 본문 {cur.rowcount}건을 새 본문으로 대체")
+            cur.execute("INSERT INTO outbox(run_id, created_at, text, updated_at, kind) VALUES (?, ?, ?, ?, ?)",
+                        (run_id, int(ts), texts[0], now, kind))
+            outbox_id = cur.lastrowid
+            cur.executemany("INSERT INTO outbox(run_id, created_at, text, updated_at, thread_of, seq, kind) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            [(run_id, int(ts), t, now, outbox_id, seq, kind)
+                             for seq, t in enumerate(texts[1:], start=1)])
+            cur.execute("COMMIT")
+        return outbox_id
+
+    def rate_limit(self) -> RateLimit:
+        raw = self.history._one("SELECT value FROM meta WHERE key = 'x_rate_limit'", ())
+        try:
+            return RateLimit(**json.loads(raw)) if raw else RateLimit()
+        except (TypeError, ValueError):
+            return RateLimit()
+
+    def _save_rate_limit(self, rl: RateLimit):
+        if rl == RateLimit():
+            return
+        with self.history._lock:
+            self.history._db.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('x_rate_limit', ?)",
+                                     (json.dumps(rl._asdict()),))
+
+    def _update(self, outbox_id: int, **cols):
+        cols["updated_at"] = int(time.time())
+        sets = ", ".join(f"{k} = ?" for k in cols)
+        with self.history._lock:
+            self.history._db.execute(f"UPDATE outbox SET {sets} WHERE id = ?", (*cols.values(), outbox_id))
+
+    def pending(self, kind: str = "hourly") -> tuple | None:
+        """그 종류의 가장 최근 본문(스레드)에서 아직 못 보낸 첫 트윗"""
+        with self.history._lock:
+            return self.history._db.execute(
+                "SELECT id, run_id, created_at, text, attempts, next_attempt_at, thread_of, seq FROM outbox "
+                "WHERE status = 'pending' AND kind = ? "
+                "ORDER BY created_at DESC, COALESCE(thread_of, id) DESC, seq LIMIT 1", (kind,)
+            ).fetchone()
+
+    def pending_kinds(self) -> list[str]:
+        """대기 본문이 있는 종류 (정시 게시 먼저)"""
+        with self.history._lock:
+            kinds = [row[0] for row in self.history._db.execute(
+                "SELECT DISTINCT kind FROM outbox WHERE status = 'pending'")]
+        return sorted(kinds, key=lambda k: k != "hourly")
+
+    def _reply_target(self, thread_of: int, seq: int) -> str | None:
+        """스레드에서 바로 앞 트윗이 게시됐으면 그 트윗 id"""
+        return self.history._one(
+            "SELECT tweet_id FROM outbox WHERE (id = ? OR thread_of = ?) AND seq = ? AND status = 'posted'",
+            (thread_of, thread_of, seq - 1))
+
+    def next_due(self) -> int | None:
+        """종류와 상관없이 가장 이른 다음 시도 시각"""
+        due = self.history._one("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'", ())
+        return None if due is None else max(due, self.rate_limit().blocked_until(time.time()) or 0)
+
+    def flush(self, now: float | None = None, kind: str | None = None) -> int | None:
+        """
+        종류별 가장 최근 대기 본문을 (때가 됐으면) 게시 시도 → 마지막 HTTP 상태 코드 (kind를 주면 그 종류만).
+        스레드면 앞 트윗이 올라가는 대로 같은 스레드의 다음 트윗을 이어서 보냄.
+        보내지 않았으면(대기 없음 / 재시도 시각 전 / 한도 소진) None.
+        """
+        now = time.time() if now is None else now
+        code = None
+        for k in [kind] if kind else self.pending_kinds():
+            code = self._flush_kind(k, now) or code
+        return code
+
+    def _flush_kind(self, kind: str, now: float) -> int | None:
+        code, thread = None, None
+        while (row := self.pending(kind)) is not None and thread in (None, row[6] or row[0]):
+            thread = row[6] or row[0]
+            code = self._flush_row(row, now)
+            if code is None or not 200 <= code < 300:
+                break
+        return code
+
+    def _flush_row(self, row: tuple, now: float) -> int | None:
+        outbox_id, run_id, created_at, text, attempts, next_attempt_at, thread_of, seq = row
+        if now - created_at > OUTBOX_MAX_AGE_SEC:
+            print(f"[outbox] #{outbox_id} 본문이 {int(now - created_at) // 60}분 지나 폐기")
+            self._update(outbox_id, status="expired")
+            return None
+        if next_attempt_at > now:
+            print(f"[outbox] #{outbox_id} 재시도 대기 ({int(next_attempt_at - now)}s 후)")
+            return None
+        blocked = self.rate_limit().blocked_until(now)
+        if blocked:
+            print(f"[outbox] 게시 한도 소진 → {datetime.fromtimestamp(blocked, KST):%H:%M:%S}에 재시도")
+            self._update(outbox_id, next_attempt_at=blocked)
+            return None
+        reply_to = self._reply_target(thread_of, seq) if seq else None
+        if seq and reply_to is None:
+            # 앞 트윗이 실패/폐기됨 → 이어 붙일 곳이 없음
+            print(f"[outbox] #{outbox_id} 스레드 앞 트윗이 게시되지 않음 → 포기")
+            self._update(outbox_id, status="failed")
+            return None
+
+        attempts += 1
+        try:
+            r = self._post(text, reply_to=reply_to) if reply_to else self._post(text)
+        except requests.RequestException as e:
+            print("[outbox] 게시 요청 실패:", e)
+            return self._reschedule(outbox_id, attempts, None, now + self._backoff(attempts))
+        rl = RateLimit.from_headers(r.headers)
+        self._save_rate_limit(rl)
+
+        if 200 <= r.status_code < 300:
+            try:
+                tweet_id = str(r.json()["data"]["id"])
+            except (ValueError, KeyError, TypeError):
+                tweet_id = None
+            self._update(outbox_id, status="posted", attempts=attempts, last_status=r.status_code, tweet_id=tweet_id)
+            if run_id is not None:
+                self.history.mark_posted(run_id)
+            return r.status_code
+        if r.status_code == 429:
+            retry_at = now + rl.retry_after if rl.retry_after else (rl.reset or now + self._backoff(attempts))
+            return self._reschedule(outbox_id, attempts, r.status_code, retry_at)
+        if r.status_code >= 500:
+            return self._reschedule(outbox_id, attempts, r.status_code, now + self._backoff(attempts))
+        # 401/403(중복 본문 등) 같은 4xx는 다시 보내도 같은 결과
+        self._update(outbox_id, status="failed", attempts=attempts, last_status=r.status_code)
+        return r.status_code
+
+    @staticmethod
+    def _backoff(attempts: int) -> float:
+        return min(OUTBOX_BACKOFF_SEC * 2 ** (attempts - 1), OUTBOX_BACKOFF_CAP_SEC)
+
+    def _reschedule(self, outbox_id: int, attempts: int, status: int | None, retry_at: float) -> int | None:
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            print(f"[outbox] #{outbox_id} {attempts}회 실패 → 포기")
+            self._update(outbox_id, status="failed", attempts=attempts, last_status=status)
+        else:
+            print(f"[outbox] #{outbox_id} {status or '연결 오류'} → "
+                  f"{datetime.fromtimestamp(retry_at, KST):%H:%M:%S}에 재시도")
+            self._update(outbox_id, attempts=attempts, last_status=status, next_attempt_at=int(retry_at))
+        return status
+
+
+# ===================== YouTube 조회수 =====================
+# videos.list는 id를 최대 50개까지 쉼표로 묶어도 할당량 1 → 추적 영상 전체를 묶어 한 번에 조회.
+# 결과는 YT_STATS_CACHE에 YT_STATS_TTL_SEC 동안 보관 (같은 시간대 재실행·폴링 게시·여러 캠페인이 공유)
+YT_BATCH = 50
+YT_STATS_CACHE = pathlib.Path(os.environ.get("YT_STATS_CACHE", "youtube_stats.json"))
+YT_STATS_TTL_SEC = int(os.environ.get("YT_STATS_TTL_SEC", "300"))
+_yt_lock = threading.Lock()
+
+
+def _load_yt_cache() -> dict:
+    try:
+        return json.loads(YT_STATS_CACHE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_yt_cache(cache: dict):
+    try:
+        tmp = YT_STATS_CACHE.with_suffix(".tmp")
+        tmp.write_text(json.dumps(cache, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(YT_STATS_CACHE)
+    except OSError as e:
+        print(f"[youtube] {YT_STATS_CACHE} write error:", e)
+
+
+def _fetch_youtube_batch(ids: list[str]) -> dict[str, dict]:
+    url = f"{BASE_URLS['youtube']}/youtube/v3/videos"
+    params = {"part": "statistics", "id": ",".join(ids), "key": YOUTUBE_API_KEY}  # id 목록은 YT_BATCH개씩 잘라 보냄
+    r = resilient_request("youtube", lambda t: http_session().get(url, params=params, timeout=t), 20)
+    r.raise_for_status()
+    now = int(time.time())
+    return {item["id"]: {"views": int(item["statistics"]["viewCount"]),
+                         "likes": as_int(item["statistics"].get("likeCount")),
+                         "comments": as_int(item["statistics"].get("commentCount")),
+                         "fetched_at": now}
+            for item in r.json().get("items", [])}
+
+
+def fetch_youtube_stats(video_ids: list[str]) -> dict[str, int] | None:
+    """
+    여러 영상 조회수 → {video_id: viewCount}. TTL 안의 캐시는 재사용하고 나머지만 YT_BATCH개씩 묶어 요청.
+    아무것도 얻지 못하면 None (삭제/비공개 영상은 결과에서 빠짐)
+    """
+    ids = list(dict.fromkeys(v for v in video_ids if v))
+    if not (YOUTUBE_API_KEY and ids):
+        return None
+    with _yt_lock:
+        cache = _load_yt_cache()
+        now = time.time()
+        stale = [v for v in ids if now - cache.get(v, {}).get("fetched_at", 0) >= YT_STATS_TTL_SEC]
+        fresh = {v: cache[v] for v in ids if v not in stale}
+        requests_made = 0
+        for i in range(0, len(stale), YT_BATCH):
+            try:
+                fresh.update(_fetch_youtube_batch(stale[i:i + YT_BATCH]))
+                requests_made += 1
+            except Exception as e:
+                print("YouTube fetch error:", e)
+        if requests_made:
+            _save_yt_cache({**cache, **fresh})
+    METRICS.site("youtube", requests=requests_made, cached=len(ids) - len(stale))
+    return {v: stat["views"] for v, stat in fresh.items()} or None
+
+
+def fetch_youtube_views() -> int | None:
+    """대표 영상 하나의 조회수. YT_VIDEO_IDS/캠페인 영상의 첫 영상, 없으면 YT_VIDEO_ID"""
+    vid = (COLLECT_VIDEO_IDS or [YT_VIDEO_ID])[0]
+    return (fetch_youtube_stats([vid]) or {}).get(vid)
+
+# ===================== 브라우저 풀 =====================
+# 경량 렌더: 표 DOM만 읽으므로 문서/스크립트/XHR 외 리소스와 광고·분석 호스트는 차단
+RENDER_LIGHT = os.environ.get("RENDER_LIGHT", "1") != "0"
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet", "texttrack", "manifest", "websocket", "eventsource", "other"}
+BLOCKED_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "googlesyndication.com", "doubleclick.net",
+    "googleadservices.com", "facebook.net", "facebook.com", "criteo.com", "criteo.net",
+    "scorecardresearch.com", "adnxs.com", "taboola.com", "mobon.net", "wcs.naver.net",
+    "nelo2-col.navercorp.com", "tivan.naver.com", "ad.daum.net", "kakaoad", "adfit",
+)
+
+
+def _is_blocked_host(url: str) -> bool:
+    host = url.split("://", 1)[-1].split("/", 1)[0].lower()
+    return any(h in host for h in BLOCKED_HOSTS)
+
+
+@lru_cache(maxsize=None)
+def _playwright():
+    """Playwright는 브라우저 폴백을 실제로 쓸 때 처음 import. 미설치 환경(서버리스 등)에선 폴백만 실패"""
+    try:
+        import playwright.async_api
+    except ImportError as e:
+        raise RuntimeError("playwright 미설치 → 브라우저 폴백 불가 (pip install playwright)") from e
+    return playwright.async_api
+
+
+class BrowserPool:
+    """
+    run_once 한 번 동안 Chromium을 한 번만 띄워 두고 페이지를 빌려주는 풀.
+    - 첫 render 호출 때 실행(lazy launch) → 브라우저가 필요 없는 실행은 비용 0
+    - 컨텍스트/브라우저가 죽으면 새로 만들고 한 번 재시도
+    - launch_sec(브라우저 실행) / fetch_sec(페이지 수집)를 따로 집계
+    - light=True면 이미지/폰트/CSS/트래커 요청을 끊고, 표 행이 붙고 문서 파싱이 끝나는 즉시 HTML 반환
+    - max_pages>0이면 동시에 열린 탭 수 제한, low_memory=True면 저메모리 플래그로 실행
+    Playwright 객체는 전용 스레드의 이벤트 루프에서만 다루므로 어느 스레드에서 호출해도 안전.
+    """
+
+    def __init__(self, headless: bool = True, light: bool = RENDER_LIGHT,
+                 max_pages: int = BROWSER_MAX_PAGES, low_memory: bool = LOW_MEMORY):
+        self.headless = headless
+        self.light = light
+        self.max_pages = max_pages
+        self.low_memory = low_memory
+        self._loop = None  # asyncio 이벤트 루프 (첫 render 때 생성)
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._ctx_lock = None
+        self._page_sem = None  # max_pages용 asyncio.Semaphore (이벤트 루프 안에서 생성)
+        self._closed = False
+        self._pw = None
+        self._browser = None
+        self._context = None
+        # 통계
+        self.launches = 0
+        self.recycles = 0
+        self.pages = 0
+        self.blocked = 0
+        self.launch_sec = 0.0
+        self.fetch_sec = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- 이벤트 루프 스레드 ----------
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._closed:
+                # 마감 후 늦게 도착한 수집 스레드가 브라우저를 다시 띄우지 않도록
+                raise RuntimeError("BrowserPool is closed")
+            if self._loop is not None:
+                return
+            import asyncio
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name="browser-pool", daemon=True)
+            self._thread.start()
+
+    def _submit(self, coro, cancel: threading.Event | None = None):
+        """코루틴을 풀 스레드에서 실행하고 결과를 기다림. cancel이 켜지면 태스크를 취소(탭 닫힘)하고 FetchCancelled"""
+        try:
+            self._ensure_loop()
+        except RuntimeError:
+            coro.close()
+            raise
+        import asyncio
+        fut = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        if cancel is None:
+            return fut.result()
+        while True:
+            try:
+                return fut.result(timeout=0.1)
+            except FuturesTimeout:
+                if cancel.is_set():
+                    fut.cancel()
+                    raise FetchCancelled()
+
+    # ---------- 브라우저/컨텍스트 ----------
+    async def _get_context(self):
+        import asyncio
+        if self._ctx_lock is None:
+            self._ctx_lock = asyncio.Lock()
+        async with self._ctx_lock:
+            if self._browser is None or not self._browser.is_connected():
+                t0 = time.perf_counter()
+                if self._pw is None:
+                    self._pw = await _playwright().async_playwright().start()
+                args = CHROMIUM_LOW_MEMORY_ARGS if self.low_memory else []
+                self._browser = await self._pw.chromium.launch(headless=self.headless, args=args)
+                self._context = None
+                self.launches += 1
+                self.launch_sec += time.perf_counter() - t0
+            if self._context is None:
+                # 저메모리: 작은 뷰포트 → 래스터/합성 버퍼도 작게
+                viewport = {"width": 800, "height": 600} if self.low_memory else None
+                self._context = await self._browser.new_context(**({"viewport": viewport} if viewport else {}))
+                if self.light:
+                    await self._context.route("**/*", self._route_light)
+            return self._context
+
+    async def _route_light(self, route):
+        req = route.request
+        if req.resource_type in BLOCKED_RESOURCE_TYPES or _is_blocked_host(req.url):
+            self.blocked += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _recycle(self):
+        """죽은 컨텍스트 폐기. 브라우저까지 끊겼으면 다음 요청 때 재실행된다."""
+        ctx, self._context = self._context, None
+        self.recycles += 1
+        if ctx is not None:
+            try:
+                await ctx.close()
+            except Exception:
+                pass
+
+    async def _render(self, ctx, url: str, timeout_ms: int, wait_selector: str | None) -> str:
+        import asyncio
+        if self.max_pages and self._page_sem is None:
+            self._page_sem = asyncio.Semaphore(self.max_pages)
+        async with self._page_sem or nullcontext():
+            return await self._render_page(ctx, url, timeout_ms, wait_selector)
+
+    async def _render_page(self, ctx, url: str, timeout_ms: int, wait_selector: str | None) -> str:
+        page = await ctx.new_page()
+        try:
+            if not wait_selector:
+                await page.goto(url, wait_until="domcontentloaded", timeout=timeout_ms)
+                return await page.content()
+            # 응답 수신(commit) 직후부터 표 행 + 문서 파싱 완료(domcontentloaded)만 기다림 (load/하위 리소스는 안 기다림).
+            # 첫 행만 보고 반환하면 천천히 내려오는 문서에서는 표가 반쯤만 파싱된 상태라 뒤쪽 행이 빠짐
+            deadline = time.monotonic() + timeout_ms / 1000
+            await page.goto(url, wait_until="commit", timeout=timeout_ms)
+
+            def remaining_ms() -> float:
+                return max((deadline - time.monotonic()) * 1000, 1)
+
+            try:
+                await page.wait_for_selector(wait_selector, state="attached", timeout=remaining_ms())
+                await page.wait_for_load_state("domcontentloaded", timeout=remaining_ms())
+            except _playwright().TimeoutError:
+                print(f"[browser] {url}: '{wait_selector}' 표가 {timeout_ms}ms 안에 완성되지 않음")
+            return await page.content()
+        finally:
+            try:
+                await page.close()
+            except Exception:
+                pass
+
+    async def _render_with_recycle(self, url: str, timeout_ms: int, wait_selector: str | None) -> str:
+        ctx = await self._get_context()  # 실행 실패는 재시도해도 소용없으므로 그대로 전파
+        try:
+            return await self._render(ctx, url, timeout_ms, wait_selector)
+        except _playwright().TimeoutError:
+            raise
+        except _playwright().Error as e:
+            # 탭/컨텍스트/브라우저 크래시 → 새 컨텍스트로 한 번만 재시도
+            print(f"[browser] {url} crashed ({e}); recycling context")
+            await self._recycle()
+            return await self._render(await self._get_context(), url, timeout_ms, wait_selector)
+
+    def warm(self):
+        """브라우저/컨텍스트를 미리 띄워 둠 (데몬 모드: 실행 비용을 정각 전에 치름)"""
+        self._submit(self._get_context())
+
+    def render(self, url: str, timeout_ms: int = 20000, wait_selector: str | None = None,
+               cancel: threading.Event | None = None) -> str:
+        t0 = time.perf_counter()
+        try:
+            return self._submit(self._render_with_recycle(url, timeout_ms, wait_selector), cancel)
+        finally:
+            self.pages += 1
+            self.fetch_sec += time.perf_counter() - t0
+
+    # ---------- 종료/리포트 ----------
+    async def _shutdown(self):
+        for obj in (self._context, self._browser):
+            if obj is not None:
+                try:
+                    await obj.close()
+                except Exception:
+                    pass
+        if self._pw is not None:
+            try:
+                await self._pw.stop()
+            except Exception:
+                pass
+        self._context = self._browser = self._pw = None
+
+    def close(self):
+        with self._start_lock:
+            self._closed = True
+        if self._loop is None:
+            return
+        import asyncio
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=30)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=10)
+            self._loop.close()
+            self._loop = self._thread = None
+            self._ctx_lock = self._page_sem = None
+
+    def stats(self) -> dict:
+        # fetch_sec에는 첫 페이지의 launch 시간도 포함되어 있으므로 빼서 순수 수집 시간만 표시
+        return {"launches": self.launches, "launch_sec": round(self.launch_sec, 4), "pages": self.pages,
+                "fetch_sec": round(max(self.fetch_sec - self.launch_sec, 0.0), 4),
+                "recycles": self.recycles, "blocked": self.blocked}
+
+    def report(self) -> str:
+        st = self.stats()
+        return (f"[browser] launches={st['launches']} launch={st['launch_sec']:.2f}s "
+                f"pages={st['pages']} fetch={st['fetch_sec']:.2f}s recycles={st['recycles']} blocked={st['blocked']}")
+
+
 # ===================== 공통: 페이지 렌더 + 파싱 =====================
-def render_get_html(url: str, timeout_ms=20000) -> str | None:
-    """동적 렌더링 페이지를 Playwright로 열고 HTML 반환."""
+def render_get_html(url: str, timeout_ms=20000, pool: BrowserPool | None = None,
+                    wait_selector: str | None = None, cancel: threading.Event | None = None) -> str | None:
+    """
+    동적 렌더링 페이지를 Playwright로 열고 HTML 반환. pool이 없으면 1회용 브라우저 사용.
+    wait_selector를 주면 domcontentloaded에 더해 해당 요소(스크립트로 그리는 표)가 붙을 때까지 기다림.
+    cancel이 켜지면 열린 탭을 닫고 None.
+    """
     try:
-        with sync_playwright() as p:
-            br = p.chromium.launch(headless=True)
-            pg = br.new_page()
-            pg.goto(url, wait_until="domcontentloaded", timeout=timeout_ms)
-            html = pg.content()
-            br.close()
-            return html
+        if pool is None:
+            with BrowserPool() as one_shot:
+                return one_shot.render(url, timeout_ms, wait_selector, cancel)
+        return pool.render(url, timeout_ms, wait_selector, cancel)
+    except FetchCancelled:
+        return None
     except Exception as e:
         print(f"[render] {url} error:", e)
         return None
 
-# ===================== 사이트별 스크래퍼 =====================
-def fetch_melon_top100(title: str, artist: str):
-    html = render_get_html("https://www.melon.com/chart/index.htm")
-    if not html:
-        return None, None
+# ===================== 재시도 / 헤지 요청 / 서킷 브레이커 =====================
+# - 재시도: 연결 오류·타임아웃·429·5xx만, 지수 백오프(+지터). 사이트 남은 예산 안에 끝날 수 없으면 포기
+# - 헤지: HEDGE_SITES 사이트는 응답이 그 사이트 p90보다 늦으면 같은 요청을 하나 더 보내 먼저 온 쪽 사용
+# - 서킷 브레이커: 연속 BREAKER_THRESHOLD회 실패한 사이트는 즉시 ❌, BREAKER_PROBE_SEC마다 한 번 시험 수집
+#   상태와 최근 응답 시간은 SITE_HEALTH 파일로 실행 간 유지. 폴링(--poll)은 매시 실행과 함께 떠 있으므로
+#   서로 덮어쓰지 않게 POLL_SITE_HEALTH 파일을 따로 씀
+RETRY_MAX = int(os.environ.get("RETRY_MAX", "2"))
+RETRY_BASE_SEC = 0.5
+RETRY_CAP_SEC = 8.0
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# 예) HEDGE_SITES="genie,bugs" / "all"
+HEDGE_SITES = {k.strip() for k in os.environ.get("HEDGE_SITES", "").split(",") if k.strip()}
+HEDGE_MIN_SAMPLES = 10
+BREAKER_THRESHOLD = int(os.environ.get("BREAKER_THRESHOLD", "3"))
+BREAKER_PROBE_SEC = int(os.environ.get("BREAKER_PROBE_SEC", str(3 * 3600)))
+SITE_HEALTH = pathlib.Path(os.environ.get("SITE_HEALTH", "site_health.json"))
+POLL_SITE_HEALTH = pathlib.Path(os.environ.get("POLL_SITE_HEALTH", "site_health.poll.json"))
+LATENCY_SAMPLES = 50
+
+# 사이트별 마감(monotonic). collect_concurrently가 작업을 낼 때 기록 → 재시도가 남은 시간을 앎
+SITE_DEADLINES: dict[str, float] = {}
+
+
+def remaining_budget(site: str) -> float:
+    deadline = SITE_DEADLINES.get(site)
+    return float("inf") if deadline is None else deadline - time.monotonic()
+
+
+class SiteHealth:
+    """사이트별 서킷 브레이커 상태 + 최근 요청 지연 (헤지 기준 p90). 파일 하나에 저장."""
+
+    def __init__(self, path: pathlib.Path = SITE_HEALTH):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            self._data: dict[str, dict] = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self._data = {}
+
+    def _site(self, site: str) -> dict:
+        return self._data.setdefault(site, {"state": "closed", "failures": 0, "opened_at": 0, "latencies": []})
+
+    def allow(self, site: str) -> bool:
+        """닫힘 → 허용, 열림 → 시험 주기가 됐으면 한 번 허용(half_open), 아니면 거부"""
+        with self._lock:
+            s = self._site(site)
+            if s["state"] == "closed":
+                return True
+            if time.time() - s["opened_at"] >= BREAKER_PROBE_SEC:
+                s["state"] = "half_open"
+                print(f"[{site}] 서킷 시험 수집 (연속 실패 {s['failures']}회)")
+                return True
+            return False
+
+    def record(self, site: str, ok: bool):
+        with self._lock:
+            s = self._site(site)
+            if ok:
+                if s["state"] != "closed":
+                    print(f"[{site}] 서킷 닫힘 (회복)")
+                s.update(state="closed", failures=0)
+                return
+            s["failures"] += 1
+            if s["state"] == "half_open" or s["failures"] >= BREAKER_THRESHOLD:
+                if s["state"] != "open":
+                    print(f"[{site}] 서킷 열림: 연속 실패 {s['failures']}회 → {BREAKER_PROBE_SEC // 60}분마다 시험")
+                s.update(state="open", opened_at=int(time.time()))
+
+    def observe(self, site: str, sec: float):
+        with self._lock:
+            lat = self._site(site)["latencies"]
+            lat.append(round(sec, 3))
+            del lat[:-LATENCY_SAMPLES]
+
+    def p90(self, site: str) -> float | None:
+        with self._lock:
+            lat = sorted(self._data.get(site, {}).get("latencies", []))
+        if len(lat) < HEDGE_MIN_SAMPLES:
+            return None
+        return lat[min(len(lat) - 1, int(len(lat) * 0.9))]
 
-    soup = BeautifulSoup(html, "lxml")
-    rows = soup.select("tr.lst50, tr.lst100")
-    for row in rows:
-        rank_el = row.select_one(".rank")
-        title_el = row.select_one(".rank01 a")
-        artist_el = row.select_one(".rank02 a")
+    def save(self):
+        with self._lock:
+            body = json.dumps(self._data, ensure_ascii=False, indent=2)
+        try:
+            tmp = self.path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_text(body, encoding="utf-8")
+            tmp.replace(self.path)
+        except OSError as e:
+            print(f"[health] {self.path} write error:", e)
 
-        if not (rank_el and title_el and artist_el):
-            continue
 
-        # 순위
-        digits = "".join(c for c in rank_el.get_text(strip=True) if c.isdigit())
-        if not digits:
-            continue
-        rank = int(digits)
+HEALTH = SiteHealth()
+_hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
 
-        # 등락 (정확한 구조 기반)
-        change_val = None
-        rank_wrap = row.select_one(".rank_wrap")
-        if rank_wrap:
-            if rank_wrap.select_one(".rank_up"):
-                num = "".join(c for c in rank_wrap.select_one(".up").get_text(strip=True) if c.isdigit())
-                change_val = +int(num) if num else 0
-            elif rank_wrap.select_one(".rank_down"):
-                num = "".join(c for c in rank_wrap.select_one(".down").get_text(strip=True) if c.isdigit())
-                change_val = -int(num) if num else 0
-            elif rank_wrap.select_one(".rank_static"):
-                change_val = 0
-            elif rank_wrap.select_one(".rank_new"):
-                change_val = 0
 
-        # 매칭
-        t = title_el.get_text(" ", strip=True)
-        a = artist_el.get_text(" ", strip=True)
-        if is_match(t, a, title, artist):
-            return rank, change_val
+def _hedged(site: str, send: Callable[[float], requests.Response], timeout: float) -> requests.Response:
+    """p90이 지나도 응답이 없으면 같은 요청을 하나 더 보내고 먼저 성공한 응답을 반환"""
+    delay = HEALTH.p90(site) if ("all" in HEDGE_SITES or site in HEDGE_SITES) else None
+    if delay is None or delay >= timeout:
+        return send(timeout)
+    first = _hedge_pool.submit(send, timeout)
+    try:
+        return first.result(timeout=delay)
+    except FuturesTimeout:
+        pass
+    METRICS.site(site, hedges=1)
+    second = _hedge_pool.submit(send, max(timeout - delay, 1.0))
+    error = None
+    for fut in as_completed([first, second]):
+        try:
+            return fut.result()
+        except Exception as e:  # 다른 쪽이 성공할 수 있으므로 끝까지 기다림
+            error = e
+    raise error
+
+
+def _retry_delay(attempt: int, r: requests.Response | None) -> float:
+    if r is not None and r.status_code == 429:
+        retry_after = as_int(r.headers.get("Retry-After"))
+        if retry_after is not None:
+            return float(retry_after)
+    base = min(RETRY_CAP_SEC, RETRY_BASE_SEC * 2 ** attempt)
+    return base / 2 + random.uniform(0, base / 2)
+
+
+class FetchCancelled(Exception):
+    """더 필요 없어진 수집(조기 중단된 페이지 등)을 요청 전/재시도 대기 중에 멈춤"""
+
+
+def resilient_request(site: str, send: Callable[[float], requests.Response], timeout: float,
+                      cancel: threading.Event | None = None) -> requests.Response:
+    """
+    send(timeout)을 재시도/헤지로 감싼다. 시도마다 timeout은 사이트 남은 예산으로 줄임.
+    재시도할 수 없으면 마지막 응답(예: 503)을 그대로 반환하거나 마지막 예외를 다시 던짐.
+    cancel이 켜져 있으면 시도 전·재시도 대기 중에 FetchCancelled (이미 보낸 요청은 응답까지 기다림).
+    """
+    attempt = 0
+    while True:
+        if cancel is not None and cancel.is_set():
+            raise FetchCancelled()
+        budget = remaining_budget(site)
+        t0 = time.monotonic()
+        r, error = None, None
+        try:
+            r = _hedged(site, send, max(min(timeout, budget), 1.0))
+            if r.status_code not in RETRYABLE_STATUS:  # 빠른 오류 응답이 p90을 끌어내리지 않도록
+                HEALTH.observe(site, time.monotonic() - t0)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        took = time.monotonic() - t0
+        if r is not None and r.status_code not in RETRYABLE_STATUS:
+            return r
+        reason = error.__class__.__name__ if error else f"HTTP {r.status_code}"
+        delay = _retry_delay(attempt, r)
+        # 다음 시도가 (대기 + 이번만큼의 소요) 안에 끝나지 않으면 재시도하지 않음
+        if attempt >= RETRY_MAX or delay + took > remaining_budget(site):
+            if attempt:
+                print(f"[{site}] {reason} → 재시도 {attempt}회 후 포기")
+            if error:
+                raise error
+            return r
+        attempt += 1
+        METRICS.site(site, retries=1)
+        print(f"[{site}] {reason} → {delay:.1f}s 후 재시도 ({attempt}/{RETRY_MAX})")
+        if cancel is None:
+            time.sleep(delay)
+        elif cancel.wait(delay):
+            raise FetchCancelled()
+
+
+# ===================== 정적 HTTP 우선 + 브라우저 폴백 =====================
+# 차트 표는 대부분 서버 렌더링 → requests로 먼저 받고, 기대한 행이 없을 때만 Chromium 사용.
+# 사이트별로 어느 경로가 통했는지 기억해 다음 실행에서 바로 그 경로를 탄다.
+FETCH_PATHS = pathlib.Path(os.environ.get("FETCH_PATHS", "fetch_paths.json"))
+PATH_REPROBE_SEC = int(os.environ.get("PATH_REPROBE_SEC", str(6 * 3600)))  # browser로 기억된 사이트도 주기적으로 HTTP 재시도
+CHART_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+                  "AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/139.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "ko,en-US;q=0.9,en;q=0.8",
+}
+# 차트/API/트윗 호출이 모두 커넥션 풀 하나를 공유 (호스트별 keep-alive → 매 호출 TCP+TLS 핸드셰이크 생략)
+# 호스트: 멜론·지니·벅스·FLO·네이버 API·VIBE 웹·YouTube·트위터
+HTTP_POOL_HOSTS = 12
+HTTP_POOL_MAXSIZE = 16  # 호스트당 동시 커넥션 (지니 페이지 동시 수집 + 여유)
+COOKIE_JAR = pathlib.Path(os.environ.get("COOKIE_JAR", "cookies.json"))
+_http_lock = threading.Lock()
+_http_adapter: HTTPAdapter | None = None
+_http_session: requests.Session | None = None
+_cookie_sessions: dict[str, requests.Session] = {}
+_paths_lock = threading.Lock()
+_paths: dict | None = None
+
+
+def _shared_adapter() -> HTTPAdapter:
+    global _http_adapter
+    if _http_adapter is None:
+        _http_adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_MAXSIZE)
+    return _http_adapter
+
+
+def _new_session() -> requests.Session:
+    sess = requests.Session()
+    sess.mount("https://", _shared_adapter())
+    sess.mount("http://", _shared_adapter())
+    return sess
+
+
+def http_session() -> requests.Session:
+    """커넥션 재사용용 공용 세션 (스레드 간 공유)."""
+    global _http_session
+    with _http_lock:
+        if _http_session is None:
+            _http_session = _new_session()
+        return _http_session
+
+
+def warm_connections(urls: list[str], timeout_sec: float = 5) -> int:
+    """
+    주어진 URL들의 호스트마다 HEAD 한 번 → 공용 커넥션 풀에 keep-alive 연결을 열어 둠.
+    유휴 시간 동안 서버가 끊은 연결을 수집 직전에 다시 맺어 TLS 핸드셰이크를 미리 치름. 반환: 연결한 호스트 수
+    """
+    origins = list(dict.fromkeys(f"{u.scheme}://{u.netloc}/" for u in map(urlsplit, urls) if u.netloc))
+    sess = http_session()
+
+    def head(origin: str) -> bool:
+        try:
+            sess.head(origin, headers=CHART_HEADERS, timeout=timeout_sec, allow_redirects=False)
+            return True
+        except requests.RequestException as e:
+            print(f"[http] warm {origin} error:", e)
+            return False
+
+    with ThreadPoolExecutor(max_workers=max(1, min(len(origins), HTTP_POOL_HOSTS)), thread_name_prefix="warm") as ex:
+        return sum(ex.map(head, origins))
+
+
+def _load_cookie_jar() -> dict:
+    try:
+        return json.loads(COOKIE_JAR.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
 
-    return None, None
 
+def cookie_session(name: str) -> requests.Session:
+    """
+    서비스 전용 쿠키를 가진 세션 (커넥션 풀은 공용과 공유).
+    쿠키는 COOKIE_JAR에서 불러오며, 만료된 쿠키는 버린다.
+    """
+    with _http_lock:
+        sess = _cookie_sessions.get(name)
+        if sess is None:
+            sess = _cookie_sessions[name] = _new_session()
+            for c in _load_cookie_jar().get(name, []):
+                sess.cookies.set(c["name"], c["value"], domain=c.get("domain", ""), path=c.get("path", "/"),
+                                 expires=c.get("expires"), secure=c.get("secure", False))
+        sess.cookies.clear_expired_cookies()
+        return sess
+
+
+def save_cookies(name: str, sess: requests.Session):
+    """세션 쿠키를 COOKIE_JAR에 저장 (다음 실행에서 워밍업 없이 재사용)"""
+    with _http_lock:
+        jar = _load_cookie_jar()
+        jar[name] = [{"name": c.name, "value": c.value, "domain": c.domain, "path": c.path,
+                      "expires": c.expires, "secure": c.secure} for c in sess.cookies]
+        try:
+            tmp = COOKIE_JAR.with_suffix(".tmp")
+            tmp.write_text(json.dumps(jar, ensure_ascii=False, indent=2), encoding="utf-8")
+            tmp.replace(COOKIE_JAR)
+        except OSError as e:
+            print(f"[cookies] {COOKIE_JAR} write error:", e)
+
+
+class Fetched(NamedTuple):
+    """HTTP/브라우저 수집 결과. not_modified면 body 없이 캐시된 행을 재사용."""
+    body: str | None
+    etag: str = ""
+    last_modified: str = ""
+    not_modified: bool = False
+    nbytes: int = 0  # 내려받은 바이트 (계측용)
+
+
+def conditional_headers(validators: dict | None) -> dict:
+    """캐시 항목의 ETag/Last-Modified → If-None-Match/If-Modified-Since"""
+    headers = {}
+    if validators and validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators and validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+def fetched_from_response(r: requests.Response) -> Fetched:
+    if r.status_code == 304:
+        return Fetched(None, r.headers.get("ETag", ""), r.headers.get("Last-Modified", ""), not_modified=True)
+    r.raise_for_status()
+    if not r.encoding or r.encoding.lower() == "iso-8859-1":
+        r.encoding = r.apparent_encoding  # charset 헤더가 없으면 requests 기본값이 latin-1
+    return Fetched(r.text, r.headers.get("ETag", ""), r.headers.get("Last-Modified", ""), nbytes=len(r.content))
+
+
+def http_get_page(url: str, timeout_sec: float = 10, validators: dict | None = None, site: str = "http",
+                  cancel: threading.Event | None = None) -> Fetched:
+    try:
+        headers = {**CHART_HEADERS, **conditional_headers(validators)}
+        r = resilient_request(site, lambda t: http_session().get(url, headers=headers, timeout=t), timeout_sec, cancel)
+        return fetched_from_response(r)
+    except FetchCancelled:
+        return Fetched(None)
+    except Exception as e:
+        print(f"[http] {url} error:", e)
+        return Fetched(None)
 
-def fetch_melon_hot100(title: str, artist: str):
-    html = render_get_html("https://www.melon.com/chart/hot100/index.htm")
-    if not html:
-        return None, None
 
+def _load_paths() -> dict:
+    global _paths
+    if _paths is None:
+        try:
+            _paths = json.loads(FETCH_PATHS.read_text(encoding="utf-8")) if FETCH_PATHS.exists() else {}
+        except Exception:
+            _paths = {}
+    return _paths
+
+
+def _remember_path(site: str, path: str):
+    with _paths_lock:
+        paths = _load_paths()
+        prev = paths.get(site, {})
+        if prev.get("path") == path and path == "http":
+            return  # http는 재확인 시각이 필요 없으므로 매번 파일을 쓰지 않음
+        paths[site] = {"path": path, "checked_at": int(time.time())}
+        try:
+            tmp = FETCH_PATHS.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps(paths, ensure_ascii=False, indent=2), encoding="utf-8")
+            tmp.replace(FETCH_PATHS)
+        except OSError as e:
+            print(f"[paths] {FETCH_PATHS} write error:", e)
+
+
+def _preferred_path(site: str) -> str:
+    with _paths_lock:
+        info = _load_paths().get(site) or {}
+    if info.get("path") == "browser" and time.time() - info.get("checked_at", 0) < PATH_REPROBE_SEC:
+        return "browser"
+    return "http"
+
+
+def get_chart_html(site: str, url: str, marker: re.Pattern, wait_selector: str, timeout_ms: int = 20000,
+                   pool: BrowserPool | None = None, validators: dict | None = None,
+                   cancel: threading.Event | None = None) -> Fetched:
+    """
+    차트 HTML 가져오기: 기억된 경로가 http면 requests → 받은 HTML에 행이 없을 때만 Playwright 폴백.
+    HTTP 자체가 실패(시간 초과/5xx/연결 오류)하면 일시 장애로 보고 폴백하지도, browser로 기억하지도 않음.
+    - marker: 정적 HTML에 차트 행이 있는지 파싱 없이 확인하는 정규식
+    - wait_selector: 브라우저 폴백 시 이 요소가 붙고 문서 파싱이 끝나면 반환
+    - validators: 캐시된 ETag/Last-Modified → HTTP 조건부 요청 (304면 not_modified)
+    browser로 기억된 사이트는 PATH_REPROBE_SEC 동안 HTTP 시도 없이 바로 렌더.
+    - cancel: 켜지면 다음 요청(재시도/브라우저 폴백)을 하지 않고 빈 결과, 렌더 중이면 탭을 닫음
+    """
+    has_rows = marker.search
+    METRICS.site(site, pages=1)
+    if _preferred_path(site) == "http":
+        t0 = time.perf_counter()
+        got = http_get_page(url, timeout_sec=min(timeout_ms / 1000, 10), validators=validators, site=site,
+                            cancel=cancel)
+        METRICS.site(site, http_sec=time.perf_counter() - t0, bytes=got.nbytes)
+        if got.not_modified:
+            return got
+        if not got.body:
+            METRICS.site(site, path="http")
+            return got
+        if has_rows(got.body):
+            _remember_path(site, "http")
+            METRICS.site(site, path="http")
+            return got
+        if cancel is not None and cancel.is_set():
+            return got
+        print(f"[{site}] 정적 HTML에 차트 행 없음 → 브라우저 폴백")
+
+    if cancel is not None and cancel.is_set():
+        return Fetched(None)
+    t0 = time.perf_counter()
+    html = render_get_html(url, timeout_ms=timeout_ms, pool=pool, wait_selector=wait_selector, cancel=cancel)
+    nbytes = len(html.encode("utf-8")) if html else 0
+    METRICS.site(site, browser_sec=time.perf_counter() - t0, bytes=nbytes, path="browser")
+    if html and has_rows(html):
+        _remember_path(site, "browser")
+    return Fetched(html, nbytes=nbytes)
+
+
+# ===================== 차트 행 + 다곡 매칭 =====================
+class ChartRow(NamedTuple):
+    rank: int
+    title: str
+    artist: str
+    change: int | None  # 사이트가 알려준 변동치(부호 포함). 상승 +, 하락 -, 유지/NEW 0, 정보 없음 None
+
+
+class Matcher:
+    """
+    run 한 번에 한 번 생성하는 대상 곡 매처. is_match와 결과가 같다.
+    - 대상 곡 제목/아티스트 토큰은 생성 시 한 번만 정규화
+    - 아티스트 토큰 → 대상 곡 인덱스: 행마다 토큰이 겹치는 대상만 제목 비교
+    - 제목 부분문자열 인덱스: "행 제목 ⊂ 대상 제목" 검사를 집합 조회로 처리
+    - 행 정규화는 normalize/artist_tokens 캐시를 공유 (멜론 TOP100/HOT100처럼 겹치는 행은 재계산 없음)
+    """
+
+    MAX_SUBSTRING_INDEX = 64  # 이보다 긴 제목은 부분문자열 집합 대신 `in` 검사
+
+    def __init__(self, targets: list[Target]):
+        self.targets = list(targets)
+        self._titles: dict[str, str] = {}
+        self._title_subs: dict[str, frozenset[str] | None] = {}
+        self._by_token: dict[str, list[Target]] = {}
+        for t in self.targets:
+            nt = normalize(t.title)
+            self._titles[t.key] = nt
+            self._title_subs[t.key] = (
+                frozenset(nt[i:j] for i in range(len(nt) + 1) for j in range(i, len(nt) + 1))
+                if len(nt) <= self.MAX_SUBSTRING_INDEX else None
+            )
+            for tok in artist_tokens(t.artist):
+                self._by_token.setdefault(tok, []).append(t)
+
+    def _title_ok(self, key: str, row_title: str) -> bool:
+        t2 = self._titles[key]
+        if t2 in row_title:
+            return True
+        subs = self._title_subs[key]
+        return row_title in subs if subs is not None else row_title in t2
+
+    def is_match(self, title: str, artist: str, target: Target) -> bool:
+        return (not artist_tokens(artist).isdisjoint(artist_tokens(target.artist))
+                and self._title_ok(target.key, normalize(title)))
+
+    def match(self, rows: list[ChartRow], pending: list[Target] | None = None) -> dict[str, ChartRow | None]:
+        """차트 행을 한 번만 훑어 대상 곡들을 찾기 → {target.key: 처음 매칭된 행 | None}"""
+        hits: dict[str, ChartRow | None] = {t.key: None for t in (self.targets if pending is None else pending)}
+        wanted = hits.keys()
+        remaining = len(hits)
+        for row in rows:
+            if not remaining:
+                break
+            row_title = None
+            for tok in artist_tokens(row.artist):
+                for t in self._by_token.get(tok, ()):
+                    if t.key not in wanted or hits[t.key] is not None:
+                        continue
+                    if row_title is None:
+                        row_title = normalize(row.title)
+                    if self._title_ok(t.key, row_title):
+                        hits[t.key] = row
+                        remaining -= 1
+        return hits
+
+
+def report_matches(site: str, hits: dict[str, ChartRow | None]) -> dict:
+    """매칭 결과 로그 + {target.key: (rank|None, change|None)} 형태로 변환"""
+    found = {}
+    for key, hit in hits.items():
+        if hit is None:
+            print(f"[{site}] target not found in chart: {key}")
+            found[key] = (None, None)
+            continue
+        change = "" if hit.change is None else f", change={hit.change:+d}"
+        print(f"[{site}] MATCHED -> rank={hit.rank}{change} | '{hit.title}' / '{hit.artist}'")
+        found[key] = (hit.rank, hit.change)
+    return found
+
+
+def resolve_targets(site: str, rows: list[ChartRow] | None, matcher: Matcher) -> dict | None:
+    """
+    파싱된 차트 행에서 모든 대상 곡을 한 번에 찾기.
+    반환: {target.key: (rank|None, change|None)} / 차트 자체를 못 가져왔으면 None (→ 전 곡 ❌)
+    """
+    if rows is None:
+        return None
+    return report_matches(site, matcher.match(rows))
+
+
+# ===================== bs4 기준 파서 =====================
+# 기존 BeautifulSoup 파서. PARSER_BACKENDS로 사이트별 선택 가능하며, 스펙 엔진 결과 검증 기준(bench.py --parity)
+def parse_melon_rows_bs4(html: str) -> list[ChartRow]:
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html, "lxml")
-    rows = soup.select("tr.lst50, tr.lst100")
-    for row in rows:
+    out = []
+    for row in soup.select("tr.lst50, tr.lst100"):
         rank_el = row.select_one(".rank")
         title_el = row.select_one(".rank01 a")
         artist_el = row.select_one(".rank02 a")
@@ -230,102 +1798,63 @@ def fetch_melon_hot100(title: str, artist: str):
             elif rank_wrap.select_one(".rank_new"):
                 change_val = 0
 
-        # 매칭
-        t = title_el.get_text(" ", strip=True)
-        a = artist_el.get_text(" ", strip=True)
-        if is_match(t, a, title, artist):
-            return rank, change_val
-
-    return None, None
+        out.append(ChartRow(rank, title_el.get_text(" ", strip=True), artist_el.get_text(" ", strip=True), change_val))
+    soup.decompose()  # 부모/자식 순환 참조 → GC를 기다리지 않고 트리를 바로 해제
+    return out
 
 
-# 지니 (데스크톱 Top200 전용, 변동치 포함)
-def fetch_genie_rank(title: str, artist: str):
-    """
-    지니 Top200에서 특정 곡 순위와 변동치 검색
-    - 페이지당 50위, 총 4페이지(200위) 순회
-    - 반환: (rank:int|None, change_sign:int|None, change_abs:int|None)
-    """
-
-    def parse_page(html: str, page: int):
-        soup = BeautifulSoup(html, "lxml")
-        rows = soup.select("tr.list") or soup.select("tbody tr")
-        preview = []
-
-        for idx, tr in enumerate(rows, start=1):
-            try:
-                # 순위
-                rank_tag = tr.select_one(".number") or tr.select_one(".rank")
-                if rank_tag:
-                    m = re.search(r"\d+", rank_tag.get_text(" ", strip=True))
-                    rank = int(m.group()) if m else (page - 1) * 50 + idx
-                else:
-                    rank = (page - 1) * 50 + idx
-
-                # 변동치
-                change_sign, change_abs = (None, None)
-                up_tag = tr.select_one(".rank-up")
-                down_tag = tr.select_one(".rank-down")
-
-                if up_tag:
-                    m = re.search(r"\d+", up_tag.get_text(strip=True))
-                    if m:
-                        change_sign = +1
-                        change_abs = int(m.group())
-                elif down_tag:
-                    m = re.search(r"\d+", down_tag.get_text(strip=True))
-                    if m:
-                        change_sign = -1
-                        change_abs = int(m.group())
-
-                # 곡/가수
-                title_tag = tr.select_one(".title a") or tr.select_one(".title")
-                artist_tag = tr.select_one(".artist a") or tr.select_one(".artist")
-                song = title_tag.get_text(strip=True) if title_tag else ""
-                art = artist_tag.get_text(strip=True) if artist_tag else ""
-
-                # 매칭
-                if is_match(song, art, title, artist):
-                    return rank, change_sign, change_abs
-                if len(preview) < 3:
-                    preview.append(f"{rank} | {song} | {art}")
-
-            except Exception:
-                continue
+def parse_genie_rows_bs4(html: str, page: int) -> list[ChartRow]:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "lxml")
+    rows = soup.select("tr.list") or soup.select("tbody tr")
+    out = []
 
-        if preview:
-            print(f"[지니 p{page} 미스매치]\n  " + "\n  ".join(preview))
-        return None, None, None
+    for idx, tr in enumerate(rows, start=1):
+        try:
+            # 순위
+            rank_tag = tr.select_one(".number") or tr.select_one(".rank")
+            if rank_tag:
+                m = re.search(r"\d+", rank_tag.get_text(" ", strip=True))
+                rank = int(m.group()) if m else (page - 1) * 50 + idx
+            else:
+                rank = (page - 1) * 50 + idx
+
+            # 변동치
+            change = None
+            up_tag = tr.select_one(".rank-up")
+            down_tag = tr.select_one(".rank-down")
+
+            if up_tag:
+                m = re.search(r"\d+", up_tag.get_text(strip=True))
+                if m:
+                    change = +int(m.group())
+            elif down_tag:
+                m = re.search(r"\d+", down_tag.get_text(strip=True))
+                if m:
+                    change = -int(m.group())
+
+            # 곡/가수
+            title_tag = tr.select_one(".title a") or tr.select_one(".title")
+            artist_tag = tr.select_one(".artist a") or tr.select_one(".artist")
+            song = title_tag.get_text(strip=True) if title_tag else ""
+            art = artist_tag.get_text(strip=True) if artist_tag else ""
+            out.append(ChartRow(rank, song, art, change))
 
-    # 페이지 순회
-    for page in range(1, 5):
-        url = f"https://www.genie.co.kr/chart/top200?pg={page}"
-        html = render_get_html(url)
-        if not html:
+        except Exception:
             continue
-        rank, change_sign, change_abs = parse_page(html, page)
-        if rank is not None:
-            return (rank, change_sign, change_abs)
-
-    return (None, None, None)
-
+    soup.decompose()  # 부모/자식 순환 참조 → GC를 기다리지 않고 트리를 바로 해제
+    return out
 
 
-# 벅스 — 구조 고정 파서: div.ranking > strong(현재순위), p.change.up/down > em(변동치)
-# 반환: (rank:int|None, change_sign:int|None, change_abs:int|None)
-def fetch_bugs_rank(title: str, artist: str):
-
-    URL = "https://music.bugs.co.kr/chart"
-    html = render_get_html(URL, timeout_ms=30000)
-    if not html:
-        return (None, None, None)
-
+def parse_bugs_rows_bs4(html: str) -> list[ChartRow]:
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html, "lxml")
     rows = soup.select("tr[rowtype='track']") or \
            soup.select("table.list.trackList > tbody > tr") or \
            soup.select("table.list > tbody > tr") or \
            soup.select("tbody > tr")
 
+    out = []
     for row in rows:
         ranking_box = row.select_one("div.ranking")
         strong = ranking_box.select_one("strong") if ranking_box else None
@@ -350,6 +1879,7 @@ def fetch_bugs_rank(title: str, artist: str):
                 change_sign = +1
             elif "down" in cls:
                 change_sign = -1
+        change = change_sign * change_abs if change_sign is not None and change_abs is not None else None
 
         # 제목/아티스트
         title_el = row.select_one("th[scope='row'] p.title a") or row.select_one("p.title a") or row.select_one(".title a")
@@ -357,126 +1887,946 @@ def fetch_bugs_rank(title: str, artist: str):
         if not (title_el and artist_el):
             continue
 
-        t_txt = title_el.get_text(" ", strip=True)
-        a_txt = artist_el.get_text(" ", strip=True)
+        out.append(ChartRow(curr_rank, title_el.get_text(" ", strip=True), artist_el.get_text(" ", strip=True), change))
+    soup.decompose()  # 부모/자식 순환 참조 → GC를 기다리지 않고 트리를 바로 해제
+    return out
+
+
+# ===================== lxml 파서 백엔드 =====================
+# BeautifulSoup 전체 문서 트리 대신: 정규식으로 차트 표 구간만 잘라 lxml로 파싱 + 미리 컴파일한 XPath.
+# 결과(rank, title, artist, change)는 bs4 경로와 동일해야 함 → bench.py --parity 로 확인
+# PARSER_BACKEND: 기본 백엔드(lxml|bs4), PARSER_BACKENDS="bugs=bs4" 처럼 차트 키 또는 묶음(melon)별 지정 가능
+PARSER_BACKEND = os.environ.get("PARSER_BACKEND", "lxml")
+PARSER_BACKENDS = dict(
+    (k.strip(), v.strip()) for k, _, v in
+    (item.partition("=") for item in filter(None, os.environ.get("PARSER_BACKENDS", "").split(",")))
+)
+_DIGITS = re.compile(r"\d+")
+
+
+def parser_backend(spec: "ChartSpec") -> str:
+    return PARSER_BACKENDS.get(spec.key) or PARSER_BACKENDS.get(spec.family) or PARSER_BACKEND
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def _xp(expr: str) -> etree.XPath:
+    return etree.XPath(expr)
+
+
+def _text(el, sep: str = "") -> str:
+    """BeautifulSoup get_text(sep, strip=True)와 같은 규칙"""
+    return sep.join(t.strip() for t in el.itertext() if t.strip())
+
+
+def _first(xpath: etree.XPath, el):
+    found = xpath(el)
+    return found[0] if found else None
+
+
+def _first_of(xpaths, el):
+    for xp in xpaths:
+        found = xp(el)
+        if found:
+            return found[0]
+    return None
+
+
+def _table_root(html: str, marker: re.Pattern):
+    """첫/마지막 차트 행 주변의 <table> 구간만 잘라 파싱. 표를 못 찾으면 전체 문서."""
+    rows = list(marker.finditer(html))
+    if rows:
+        start = html.rfind("<table", 0, rows[0].start())
+        end = html.find("</table>", rows[-1].end())
+        if start != -1:
+            html = html[start:end + len("</table>")] if end != -1 else html[start:]
+    return lxml_html.fromstring(html)
+
+
+# ===================== 차트 스펙 엔진 =====================
+# 사이트마다 URL(페이지네이션), 행/필드 XPath, 등락 규칙만 선언하면 같은 추출 루프 하나로 처리.
+# XPath는 스펙당 한 번만 컴파일하고, 매칭은 run 단위 Matcher를 공유한다.
+class ChangeRule(NamedTuple):
+    """등락 규칙. XPath는 모두 scope(비우면 행) 기준이며, *_num을 비우면 up/down 요소 자체의 숫자를 읽는다."""
+    up: str
+    down: str
+    up_num: str = ""
+    down_num: str = ""
+    same: str = ""                      # 있으면 0 (유지/NEW)
+    scope: str = ""                     # 등락 표시 영역 (멜론 .rank_wrap, 벅스 p.change)
+    missing_num_as_zero: bool = False   # 화살표만 있고 숫자가 없을 때 0(멜론) / None
+
+
+# 차트 기준 시각 요소(ChartSpec.chart_time) 텍스트의 "2025.08.01 14:00" 형태 (태그/공백을 사이에 둘 수 있음)
+CHART_TIME_RE = (r"(?P<y>20\d{2})[.\-/](?P<m>\d{1,2})[.\-/](?P<d>\d{1,2})\.?\s*(?:<[^>]+>\s*)*"
+                 r"(?P<H>\d{1,2}):(?P<M>\d{2})")
+
+
+@dataclass(frozen=True)
+class ChartSpec:
+    """HTML 차트 한 개. rows/rank/title/artist는 XPath 후보 목록(처음으로 찾은 것 사용)."""
+    key: str
+    label: str
+    urls: tuple[str, ...]               # 여러 개면 페이지네이션 (순서대로, 대상 곡을 다 찾으면 중단)
+    marker: str                         # 파싱 전 "표가 있는지" 확인하는 정규식 (정적 HTML 판별/표 구간 자르기)
+    wait_selector: str                  # 브라우저 폴백 시 이 요소가 붙고 문서 파싱이 끝나면 HTML 반환
+    rows: tuple[str, ...]
+    rank: tuple[str, ...]
+    title: tuple[str, ...]
+    artist: tuple[str, ...]
+    change: ChangeRule
+    family: str = ""                    # PARSER_BACKENDS 지정용 묶음 (멜론 TOP100/HOT100 → melon)
+    single_page_url: str = ""           # 전체 순위를 한 번에 주는 URL (SINGLE_PAGE_CHARTS에 키가 있을 때 사용)
+    page_size: int = 0                  # >0이면 순위를 못 읽은 행은 (page-1)*page_size+idx, 0이면 건너뜀
+    text_sep: str = " "                 # 제목/아티스트 텍스트 조각 구분자
+    require_fields: bool = True         # 제목/아티스트가 없으면 행 건너뜀 (False면 "")
+    timeout_ms: int = 20000
+    bs4_parser: Callable[[str, int], list[ChartRow]] | None = None  # bs4 백엔드 선택 시 사용
+    update_every_min: int = 60          # 차트 갱신 주기 (KST 정시 기준 정렬) → 캐시 만료 계산
+    publish_lag_sec: int = 90           # 갱신 시각 이후 새 차트가 실제로 올라오기까지 여유
+    chart_time: tuple[str, ...] = ()    # 차트 기준 시각 요소 XPath 후보 (비우면 갱신 주기로만 만료 계산)
+    chart_time_re: str = CHART_TIME_RE  # 그 요소 텍스트에서 읽는 기준 시각 (y, m, d, H, M 그룹)
+
+    @cached_property
+    def marker_re(self) -> re.Pattern:
+        return re.compile(self.marker)
+
+    @cached_property
+    def xp(self) -> SimpleNamespace:
+        many = lambda exprs: tuple(_xp(e) for e in exprs)
+        one = lambda expr: _xp(expr) if expr else None
+        c = self.change
+        return SimpleNamespace(
+            rows=many(self.rows), rank=many(self.rank), title=many(self.title), artist=many(self.artist),
+            chart_time=many(self.chart_time),
+            scope=one(c.scope), up=one(c.up), down=one(c.down),
+            up_num=one(c.up_num), down_num=one(c.down_num), same=one(c.same),
+        )
+
+
+@dataclass(frozen=True)
+class JsonChartSpec:
+    """JSON API 차트 한 개. 경로는 dict 키/리스트 인덱스 튜플이며 순위는 목록 순서."""
+    key: str
+    label: str
+    url: str
+    rows: tuple
+    title: tuple
+    artist: tuple
+    change: tuple                       # 부호 포함 변동치 (0 → None)
+    headers: dict = field(default_factory=dict)
+    warmup_url: str = ""                # 쿠키 발급용 선행 요청 (VIBE)
+    warmup_headers: dict = field(default_factory=dict)
+    timeout_sec: float = 20
+    update_every_min: int = 60
+    publish_lag_sec: int = 90
+    chart_time: tuple = ()              # 응답 안의 차트 기준 시각 경로 (비우면 갱신 주기로만 만료 계산)
+
+
+def _first_number(el) -> int | None:
+    m = _DIGITS.search(_text(el, " ")) if el is not None else None
+    return int(m.group()) if m else None
+
+
+def _row_change(xp: SimpleNamespace, rule: ChangeRule, row) -> int | None:
+    scope = _first(xp.scope, row) if xp.scope is not None else row
+    if scope is None:
+        return None
+    for marker, num_xp, sign in ((xp.up, xp.up_num, +1), (xp.down, xp.down_num, -1)):
+        hit = _first(marker, scope)
+        if hit is None:
+            continue
+        n = _first_number(_first(num_xp, scope) if num_xp is not None else hit)
+        if n is None:
+            return 0 if rule.missing_num_as_zero else None
+        return sign * n
+    if xp.same is not None and xp.same(scope):
+        return 0
+    return None
+
+
+def parse_chart_html(spec: ChartSpec, html: str, page: int = 1) -> list[ChartRow]:
+    """스펙대로 차트 표 구간만 파싱 → ChartRow 목록"""
+    if spec.bs4_parser is not None and parser_backend(spec) == "bs4":
+        return spec.bs4_parser(html, page)
+    xp = spec.xp
+    root = _table_root(html, spec.marker_re)
+    rows = []
+    for row_xp in xp.rows:
+        rows = row_xp(root)
+        if rows:
+            break
+
+    out = []
+    for idx, row in enumerate(rows, start=1):
+        rank = _first_number(_first_of(xp.rank, row))
+        if rank is None:
+            if not spec.page_size:
+                continue
+            rank = (page - 1) * spec.page_size + idx
+
+        title_el = _first_of(xp.title, row)
+        artist_el = _first_of(xp.artist, row)
+        if spec.require_fields and (title_el is None or artist_el is None):
+            continue
+        title = _text(title_el, spec.text_sep) if title_el is not None else ""
+        artist = _text(artist_el, spec.text_sep) if artist_el is not None else ""
+        out.append(ChartRow(rank, title, artist, _row_change(xp, spec.change, row)))
+    return out
+
+
+def _dig(obj, path: tuple, default=None):
+    for k in path:
+        try:
+            obj = obj[k]
+        except (KeyError, IndexError, TypeError):
+            return default
+    return obj
+
+
+def parse_chart_json(spec: JsonChartSpec, data: dict) -> list[ChartRow]:
+    out = []
+    for idx, item in enumerate(_dig(data, spec.rows, []) or [], start=1):
+        out.append(ChartRow(idx, _dig(item, spec.title, "") or "", _dig(item, spec.artist, "") or "",
+                            _dig(item, spec.change, 0) or None))
+    return out
+
+
+def _warm_up(spec: JsonChartSpec, sess: requests.Session):
+    """웹 페이지를 열어 세션 쿠키를 새로 받고 저장"""
+    print(f"[{spec.key}] 쿠키 워밍업: {spec.warmup_url}")
+    METRICS.site(spec.key, warmups=1)
+    sess.get(spec.warmup_url, headers=spec.warmup_headers, timeout=spec.timeout_sec)
+    save_cookies(spec.key, sess)
+
+
+def fetch_chart_json(spec: JsonChartSpec, validators: dict | None = None) -> Fetched:
+    headers = {**spec.headers, **conditional_headers(validators)}
+    if not spec.warmup_url:
+        sess = http_session()
+        return fetched_from_response(resilient_request(
+            spec.key, lambda t: sess.get(spec.url, headers=headers, timeout=t), spec.timeout_sec))
+    # 저장된 쿠키가 살아 있으면 바로 API 호출. 쿠키가 없거나 401/403이면 그때만 웹 페이지로 워밍업
+    sess = cookie_session(spec.key)
+
+    def call() -> requests.Response:
+        return resilient_request(spec.key, lambda t: sess.get(spec.url, headers=headers, timeout=t),
+                                 spec.timeout_sec)
+
+    if not len(sess.cookies):
+        _warm_up(spec, sess)
+    r = call()
+    if r.status_code in (401, 403):
+        print(f"[{spec.key}] {r.status_code} → 쿠키 만료로 보고 재발급")
+        sess.cookies.clear()
+        _warm_up(spec, sess)
+        r = call()
+    return fetched_from_response(r)
+
+
+# ===================== 차트 스냅샷 캐시 =====================
+# URL별 파싱된 행을 디스크에 저장. 만료 = 차트 기준 시각 다음 갱신 시각 + 게시 지연.
+# 같은 차트 시간대 안의 재실행(수동 실행, --once 재시도)은 네트워크/브라우저 없이 순위를 낸다.
+CHART_CACHE_DIR = pathlib.Path(os.environ.get("CHART_CACHE_DIR", "chart_cache"))
+CHART_CACHE_ENABLED = os.environ.get("CHART_CACHE", "1") != "0"
+# 갱신 시각이 지났는데 사이트가 아직 옛 차트를 줄 때 재확인 간격 (데몬 모드의 새 차트 폴링 간격이기도 함)
+CACHE_RECHECK_SEC = int(os.environ.get("CACHE_RECHECK_SEC", "20"))
+CHART_TIMES: dict[str, float] = {}  # 사이트별 이번에 본 차트 기준 시각 (캐시 적중 포함, 데몬이 새 차트 게시 판별에 사용)
+
+
+def _parse_chart_time(value) -> float | None:
+    """차트 기준 시각(KST) → epoch. "2025.08.01 14:00" 류 문자열, epoch(ms) 숫자 모두 허용. 엉뚱한 값은 버림."""
+    ts = None
+    if isinstance(value, (int, float)):
+        ts = value / 1000 if value > 1e11 else float(value)
+    elif isinstance(value, str):
+        m = re.search(CHART_TIME_RE, value)
+        if m:
+            value = m
+    if isinstance(value, re.Match):
+        try:
+            g = {k: int(v) for k, v in value.groupdict().items()}
+            ts = datetime(g["y"], g["m"], g["d"], g["H"], g["M"], tzinfo=KST).timestamp()
+        except (ValueError, KeyError):
+            return None
+    if ts is None or not (time.time() - 2 * 86400 <= ts <= time.time() + 300):
+        return None
+    return ts
+
+
+def chart_time_from_html(spec: ChartSpec, html: str) -> float | None:
+    """spec.chart_time 요소의 텍스트에서만 기준 시각을 읽음 (공지/푸터/스크립트의 날짜를 잡지 않도록). 요소가 없으면 None"""
+    if not (spec.chart_time and spec.chart_time_re):
+        return None
+    # 기준 시각은 표 밖(페이지 상단)에 있으므로 문서 전체를 파싱
+    el = _first_of(spec.xp.chart_time, lxml_html.fromstring(html))
+    m = re.search(spec.chart_time_re, _text(el, " ")) if el is not None else None
+    return _parse_chart_time(m) if m else None
+
+
+def _note_chart_time(key: str, chart_ts: float | None):
+    if chart_ts is not None:
+        CHART_TIMES[key] = max(chart_ts, CHART_TIMES.get(key, chart_ts))
+
+
+def update_boundary(spec: ChartSpec | JsonChartSpec, ts: float) -> float:
+    """ts 이전(포함)의 마지막 갱신 경계 (KST 기준 update_every_min 배수)"""
+    every = spec.update_every_min * 60
+    kst_offset = 9 * 3600
+    return ((ts + kst_offset) // every) * every - kst_offset
 
-        if is_match(t_txt, a_txt, title, artist):
-            if change_abs is not None and change_sign is not None:
-                arrow = "▲" if change_sign > 0 else "▼"
-                print(f"[bugs] MATCHED -> rank={curr_rank}, change={arrow}{change_abs} | '{t_txt}' / '{a_txt}'")
-            else:
-                print(f"[bugs] MATCHED -> rank={curr_rank} | '{t_txt}' / '{a_txt}'")
-            return (curr_rank, change_sign, change_abs)
 
-    print("[bugs] target not found in chart")
-    return (None, None, None)
+def chart_boundary(spec: ChartSpec | JsonChartSpec, ts: float) -> float:
+    """ts 시점에 게시돼 있어야 할 차트의 기준 시각 = (ts - 게시 지연) 이전의 마지막 갱신 경계"""
+    return update_boundary(spec, ts - spec.publish_lag_sec)
 
 
-# ===================== FLO Top100 (API 직접 호출) =====================
-def fetch_flo_rank(title: str, artist: str):
+def cache_expiry(spec: ChartSpec | JsonChartSpec, chart_ts: float | None, now: float | None = None) -> float:
     """
-    FLO Top100에서 특정 곡 순위와 변동치 검색
-    - API: https://www.music-flo.com/api/display/v1/browser/chart/1/track/list?size=100
-    - 반환: (rank:int|None, change_sign:int|None, change_abs:int|None)
+    캐시 만료 시각(epoch). 갱신 경계는 KST 기준 update_every_min 배수.
+    - 차트 기준 시각을 알면: 그 다음 갱신 경계 + 게시 지연 (이미 지났으면 CACHE_RECHECK_SEC 후 재확인)
+    - 모르면: 지금 이후 처음 오는 (갱신 경계 + 게시 지연)
     """
-    url = "https://www.music-flo.com/api/display/v1/browser/chart/1/track/list?size=100"
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Referer": "https://www.music-flo.com/browse?chartId=1",
-    }
-    try:
-        r = requests.get(url, headers=headers, timeout=20)
-        r.raise_for_status()
-        data = r.json()
-
-        track_list = data.get("data", {}).get("trackList", [])
-        for idx, track in enumerate(track_list, start=1):
-            song_name = track.get("name", "")
-            artist_name = track.get("representationArtist", {}).get("name", "")
-            if is_match(song_name, artist_name, title, artist):
-                # rankBadge: 양수 = 상승, 음수 = 하락, 0 = 변동 없음
-                rank_badge = track.get("rank", {}).get("rankBadge", 0)
-                change_sign, change_abs = (None, None)
-                if rank_badge > 0:
-                    change_sign = +1
-                    change_abs = rank_badge
-                elif rank_badge < 0:
-                    change_sign = -1
-                    change_abs = abs(rank_badge)
-                return idx, change_sign, change_abs
-
-        print("[flo] target not found in chart")
-        return (None, None, None)
-    except Exception as e:
-        print("flo error:", e)
-        return (None, None, None)
+    now = time.time() if now is None else now
+    every = spec.update_every_min * 60
+    kst_offset = 9 * 3600
+
+    def next_boundary(ts: float) -> float:
+        return ((ts + kst_offset) // every + 1) * every - kst_offset
+
+    if chart_ts is not None:
+        expires = next_boundary(chart_ts) + spec.publish_lag_sec
+        return expires if expires > now else now + CACHE_RECHECK_SEC
+    return next_boundary(now - spec.publish_lag_sec) + spec.publish_lag_sec
+
 
-# ===================== VIBE 급상승 (API 직접 호출) =====================
-def fetch_vibe_rank(title: str, artist: str):
+class ChartCache:
+    """차트 URL별 파싱 결과 캐시 (파일 하나 = URL 하나, 원자적 교체로 기록)."""
+
+    def __init__(self, root: pathlib.Path, enabled: bool = True, revalidate: bool = False):
+        self.root = root
+        self.enabled = enabled
+        self.revalidate = revalidate  # True면 만료 전이어도 매번 조건부 요청 (폴링 모드)
+
+    def _path(self, key: str, url: str) -> pathlib.Path:
+        return self.root / f"{key}-{hashlib.sha1(url.encode()).hexdigest()[:12]}.json"
+
+    def get(self, key: str, url: str) -> dict | None:
+        if not self.enabled:
+            return None
+        path = self._path(key, url)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        entry["rows"] = [ChartRow(*r) for r in entry.get("rows", [])]
+        return entry
+
+    def is_fresh(self, entry: dict | None) -> bool:
+        return not self.revalidate and bool(entry) and time.time() < entry.get("expires_at", 0)
+
+    def put(self, spec, url: str, rows: list[ChartRow], got: Fetched, chart_ts: float | None):
+        if not self.enabled:
+            return
+        entry = {
+            "url": url,
+            "fetched_at": int(time.time()),
+            "chart_time": chart_ts,
+            "expires_at": cache_expiry(spec, chart_ts),
+            "etag": got.etag,
+            "last_modified": got.last_modified,
+            "rows": [list(r) for r in rows],
+        }
+        self._write(spec.key, url, entry)
+
+    def touch(self, spec, url: str, entry: dict, got: Fetched):
+        """304 Not Modified: 행은 그대로 두고 만료/검증자만 갱신"""
+        if not self.enabled:
+            return
+        entry = {**entry, "rows": [list(r) for r in entry["rows"]],
+                 "expires_at": cache_expiry(spec, entry.get("chart_time")),
+                 "etag": got.etag or entry.get("etag", ""),
+                 "last_modified": got.last_modified or entry.get("last_modified", "")}
+        self._write(spec.key, url, entry)
+
+    def _write(self, key: str, url: str, entry: dict):
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            path = self._path(key, url)
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(path)
+        except OSError as e:
+            print(f"[cache] {url} write error:", e)
+
+
+CHART_CACHE = ChartCache(CHART_CACHE_DIR, CHART_CACHE_ENABLED)
+
+
+def _cache_hit(spec, url: str, entry: dict) -> list[ChartRow]:
+    until = datetime.fromtimestamp(entry["expires_at"], KST).strftime("%H:%M:%S")
+    print(f"[{spec.key}] cache hit ({len(entry['rows'])} rows, until {until})")
+    _note_chart_time(spec.key, entry.get("chart_time"))
+    METRICS.site(spec.key, cache_hits=1, rows=len(entry["rows"]))
+    return entry["rows"]
+
+
+def _fetch_page(spec: ChartSpec, page: int, url: str, pool: BrowserPool | None,
+                cancel: threading.Event | None = None) -> list[ChartRow] | None:
+    """페이지 하나 (신선한 캐시 → 그대로). cancel이 켜져 있으면 요청하지 않고 None"""
+    cached = CHART_CACHE.get(spec.key, url)
+    if CHART_CACHE.is_fresh(cached):
+        return _cache_hit(spec, url, cached)
+    with MEMORY.slot():
+        # 직렬 모드에서 차례를 기다리는 사이 취소됐을 수 있음
+        if cancel is not None and cancel.is_set():
+            METRICS.site(spec.key, cancelled=1)
+            return None
+        return _fetch_page_rows(spec, page, url, pool, cached, cancel)
+
+
+def _fetch_page_rows(spec: ChartSpec, page: int, url: str, pool: BrowserPool | None,
+                     cached: dict | None, cancel: threading.Event | None = None) -> list[ChartRow] | None:
+    # 취소돼도 이미 받은 본문은 파싱해 캐시에 넣음 (다음 실행이 재사용)
+    got = get_chart_html(spec.key, url, spec.marker_re, spec.wait_selector,
+                         timeout_ms=spec.timeout_ms, pool=pool, validators=cached, cancel=cancel)
+    if got.not_modified and cached:
+        print(f"[{spec.key}] 304 Not Modified → 캐시 재사용")
+        CHART_CACHE.touch(spec, url, cached, got)
+        METRICS.site(spec.key, not_modified=1, rows=len(cached["rows"]))
+        _note_chart_time(spec.key, cached.get("chart_time"))
+        return cached["rows"]
+    if not got.body:
+        return None
+    # 원본 HTML은 행과 차트 시각만 뽑고 바로 놓음 (캐시에는 검증자만 필요)
+    body, got = got.body, got._replace(body=None)
+    t0 = time.perf_counter()
+    rows = parse_chart_html(spec, body, page)
+    chart_ts = chart_time_from_html(spec, body) if rows else None
+    del body
+    METRICS.site(spec.key, parse_sec=time.perf_counter() - t0, rows=len(rows))
+    MEMORY.sample(max_age=0)  # 파싱 직후가 가장 높을 때라 캐시 없이
+    if rows:
+        _note_chart_time(spec.key, chart_ts)
+        CHART_CACHE.put(spec, url, rows, got, chart_ts)
+    return rows
+
+
+def _fetch_json_rows(spec: JsonChartSpec) -> list[ChartRow]:
+    cached = CHART_CACHE.get(spec.key, spec.url)
+    if CHART_CACHE.is_fresh(cached):
+        return _cache_hit(spec, spec.url, cached)
+    with MEMORY.slot():
+        return _fetch_json_rows_uncached(spec, cached)
+
+
+def _fetch_json_rows_uncached(spec: JsonChartSpec, cached: dict | None) -> list[ChartRow]:
+    t0 = time.perf_counter()
+    got = fetch_chart_json(spec, validators=cached)
+    METRICS.site(spec.key, pages=1, http_sec=time.perf_counter() - t0, bytes=got.nbytes, path="api")
+    if got.not_modified and cached:
+        print(f"[{spec.key}] 304 Not Modified → 캐시 재사용")
+        CHART_CACHE.touch(spec, spec.url, cached, got)
+        METRICS.site(spec.key, not_modified=1, rows=len(cached["rows"]))
+        _note_chart_time(spec.key, cached.get("chart_time"))
+        return cached["rows"]
+    t0 = time.perf_counter()
+    data = json.loads(got.body)
+    got = got._replace(body=None)
+    rows = parse_chart_json(spec, data)
+    chart_ts = _parse_chart_time(_dig(data, spec.chart_time)) if rows and spec.chart_time else None
+    del data
+    METRICS.site(spec.key, parse_sec=time.perf_counter() - t0, rows=len(rows))
+    MEMORY.sample(max_age=0)
+    if rows:
+        _note_chart_time(spec.key, chart_ts)
+        CHART_CACHE.put(spec, spec.url, rows, got, chart_ts)
+    return rows
+
+
+def _scan_pages(spec: ChartSpec, matcher: Matcher, pool: BrowserPool | None,
+                pages: list[tuple[int, str]],
+                all_rows: list[ChartRow] | None = None,
+                resolved: dict[int, dict | None] | None = None) -> tuple[dict[int, dict | None], list[ChartRow]]:
     """
-    VIBE 국내 차트 Top100에서 특정 곡 순위와 변동치 검색
-    - 쿠키 만료 방지를 위해 매 호출 시 chart/domestic 페이지 접속 후 API 호출
+    여러 페이지를 동시에 받아 페이지별로 매칭.
+    앞 페이지부터 모든 대상 곡의 결과가 확정되면(찾았거나 남은 페이지가 없음) 나머지 페이지는 취소.
+    resolved: 이미 매칭한 앞 페이지 결과 (단일 요청 폴백의 1페이지) → 확정 판단에 포함, 다시 받지 않음.
+    all_rows를 넘기면 아카이브용으로 전 페이지를 받아 행을 모두 담음 (조기 취소 없음).
+    반환: ({page: {target.key: 행|None} | None(실패)} (resolved 포함), 첫 페이지 미리보기 행)
     """
-    session = requests.Session()
-
+    results: dict[int, dict | None] = dict(resolved or {})
+    page_nums = sorted(set(results) | {p for p, _ in pages})
+    preview: list[ChartRow] = []
+
+    def settled() -> bool:
+        if all_rows is not None:
+            return len(results) == len(page_nums)
+        # 대상 곡마다 앞 페이지부터 확인: 아직 안 온 페이지를 만나기 전에 찾았어야 확정
+        for t in matcher.targets:
+            for p in page_nums:
+                if p not in results:
+                    return False
+                if results[p] and results[p][t.key] is not None:
+                    break
+        return True
+
+    if settled():
+        print(f"[{spec.key}] 대상 곡 확정 → 남은 {len(pages)}페이지 생략")
+        return results, preview
+    ex = ThreadPoolExecutor(max_workers=max(1, min(PAGE_WORKERS, len(pages))), thread_name_prefix=f"{spec.key}-page")
+    # 확정되면 대기 중인 페이지는 취소, 이미 받는 중인 페이지는 이 이벤트로 재시도/브라우저 폴백/렌더를 멈춤
+    cancel = threading.Event()
+    futures = {ex.submit(_fetch_page, spec, p, url, pool, cancel): p for p, url in pages}
     try:
-        # 1) 메인 페이지 접속 → 세션 쿠키 발급
-        session.get("https://vibe.naver.com/chart/domestic", headers={
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-                          "AppleWebKit/537.36 (KHTML, like Gecko) "
-                          "Chrome/139.0.0.0 Safari/537.36",
-            "Referer": "https://vibe.naver.com/",
-            "Accept-Language": "ko,en-US;q=0.9,en;q=0.8"
-        }, timeout=10)
-
-        # 2) API 호출
-        api_url = "https://apis.naver.com/vibeWeb/musicapiweb/vibe/v1/chart/track/domestic?start=1&display=100"
-        headers = {
+        for fut in as_completed(futures):
+            p = futures[fut]
+            try:
+                rows = fut.result()
+            except Exception as e:
+                print(f"[{spec.key}] p{p} error:", e)
+                rows = None
+            results[p] = matcher.match(rows) if rows is not None else None
+            if all_rows is not None and rows:
+                all_rows.extend(rows)
+            if p == page_nums[0] and rows:
+                preview = rows[:3]
+            if settled():
+                break
+    finally:
+        cancel.set()
+        ex.shutdown(wait=False, cancel_futures=True)
+    skipped = len(page_nums) - len(results)
+    if skipped:
+        print(f"[{spec.key}] 대상 곡 확정 → 남은 {skipped}페이지 취소")
+    return results, preview
+
+
+def scrape_chart(spec: ChartSpec | JsonChartSpec, matcher: Matcher,
+                 pool: BrowserPool | None = None, archive: dict | None = None) -> dict | None:
+    """
+    스펙 하나를 수집해 대상 곡을 일괄 매칭.
+    archive를 넘기면 파싱한 전체 행을 archive[spec.key]에 순위순으로 담음.
+    반환: {target.key: (rank|None, change|None)} / 차트를 못 가져왔으면 None (→ 전 곡 ❌)
+    """
+    if isinstance(spec, JsonChartSpec):
+        try:
+            rows = _fetch_json_rows(spec)
+        except Exception as e:
+            print(f"{spec.key} error:", e)
+            return None
+        if archive is not None and rows:
+            archive[spec.key] = rows
+        return resolve_targets(spec.key, rows, matcher)
+
+    pages = list(enumerate(spec.urls, start=1))
+    results: dict[int, dict | None] = {}
+    preview: list[ChartRow] = []
+    all_rows: list[ChartRow] | None = [] if archive is not None else None
+    if spec.single_page_url and spec.key in SINGLE_PAGE_CHARTS:
+        # 한 번에 전체 순위 요청. 파라미터가 무시되어 한 페이지 분량만 오면 1페이지로 보고 나머지만 페이지 순회
+        rows = _fetch_page(spec, 1, spec.single_page_url, pool)
+        if rows:
+            results[1] = matcher.match(rows)
+            preview = rows[:3]
+            pages = [] if len(rows) > spec.page_size else pages[1:]
+            if all_rows is not None:
+                all_rows.extend(rows)
+    if pages:
+        more, more_preview = _scan_pages(spec, matcher, pool, pages, all_rows, resolved=results)
+        results.update(more)
+        preview = preview or more_preview
+    if all_rows:
+        archive[spec.key] = sorted(all_rows, key=lambda r: r.rank)
+
+    if not any(r is not None for r in results.values()):
+        return None
+    hits = {
+        t.key: next((results[p][t.key] for p in sorted(results) if results[p] and results[p][t.key] is not None), None)
+        for t in matcher.targets
+    }
+    if preview and None in hits.values():
+        print(f"[{spec.key} 미스매치]\n  " + "\n  ".join(f"{r.rank} | {r.title} | {r.artist}" for r in preview))
+    return report_matches(spec.key, hits)
+
+
+# ===================== 차트 스펙 정의 =====================
+_MELON = dict(
+    family="melon",
+    marker=r"<tr[^>]*class=\"[^\"]*\blst(?:50|100)\b",
+    wait_selector="tr.lst50",
+    rows=(f"//tr[{_has_class('lst50')} or {_has_class('lst100')}]",),
+    rank=(f".//*[{_has_class('rank')}]",),
+    title=(f".//*[{_has_class('rank01')}]//a",),
+    artist=(f".//*[{_has_class('rank02')}]//a",),
+    change=ChangeRule(
+        scope=f".//*[{_has_class('rank_wrap')}]",
+        up=f".//*[{_has_class('rank_up')}]", up_num=f".//*[{_has_class('up')}]",
+        down=f".//*[{_has_class('rank_down')}]", down_num=f".//*[{_has_class('down')}]",
+        same=f".//*[{_has_class('rank_static')} or {_has_class('rank_new')}]",
+        missing_num_as_zero=True,
+    ),
+    # 차트 위 날짜 선택 영역: <span class="year">2025.08.01</span> <span class="hour">14:00</span>
+    chart_time=(f"//*[{_has_class('calendar_prid')}]",),
+    bs4_parser=lambda html, page: parse_melon_rows_bs4(html),
+)
+
+# 지니 (데스크톱 Top200 전용, 변동치 포함) — 페이지당 50위, 총 4페이지
+_GENIE = dict(
+    family="genie",
+    marker=r"<tr[^>]*class=\"[^\"]*\blist\b",
+    wait_selector="tr.list",
+    rows=(f"//tr[{_has_class('list')}]", "//tbody//tr"),
+    rank=(f".//*[{_has_class('number')}]", f".//*[{_has_class('rank')}]"),
+    title=(f".//*[{_has_class('title')}]//a", f".//*[{_has_class('title')}]"),
+    artist=(f".//*[{_has_class('artist')}]//a", f".//*[{_has_class('artist')}]"),
+    change=ChangeRule(up=f".//*[{_has_class('rank-up')}]", down=f".//*[{_has_class('rank-down')}]"),
+    page_size=50,
+    text_sep="",
+    require_fields=False,
+    chart_time=(f"//*[{_has_class('calendar')}]//*[{_has_class('date')}]", f"//div[{_has_class('date')}]"),
+    bs4_parser=lambda html, page: parse_genie_rows_bs4(html, page),
+)
+
+# 벅스 — 구조 고정: div.ranking > strong(현재순위), p.change.up/down > em(변동치)
+_BUGS = dict(
+    family="bugs",
+    marker=r"<tr[^>]*rowtype=\"track\"",
+    wait_selector="tr[rowtype='track']",
+    rows=(
+        "//tr[@rowtype='track']",
+        f"//table[{_has_class('list')} and {_has_class('trackList')}]/tbody/tr",
+        f"//table[{_has_class('list')}]/tbody/tr",
+        "//tbody/tr",
+    ),
+    rank=(f"(.//div[{_has_class('ranking')}])[1]//strong",),
+    title=(
+        f".//th[@scope='row']//p[{_has_class('title')}]//a",
+        f".//p[{_has_class('title')}]//a",
+        f".//*[{_has_class('title')}]//a",
+    ),
+    artist=(
+        f".//td[{_has_class('left')}]//p[{_has_class('artist')}]//a",
+        f".//p[{_has_class('artist')}]//a",
+        f".//*[{_has_class('artist')}]//a",
+    ),
+    change=ChangeRule(
+        scope=f"(.//div[{_has_class('ranking')}])[1]//p[{_has_class('change')}]",
+        up="self::*[contains(@class, 'up')]", up_num=".//em",
+        down="self::*[contains(@class, 'down')]", down_num=".//em",
+    ),
+    timeout_ms=30000,
+    chart_time=(f"//*[{_has_class('chartDate')}]//time", f"//*[{_has_class('chartDate')}]"),
+    bs4_parser=lambda html, page: parse_bugs_rows_bs4(html),
+)
+
+_API_UA = ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+           "AppleWebKit/537.36 (KHTML, like Gecko) "
+           "Chrome/139.0.0.0 Safari/537.36")
+
+CHART_SPECS: list[ChartSpec | JsonChartSpec] = [
+    ChartSpec("melon_top100", "멜론 TOP100", (f"{BASE_URLS['melon']}/chart/index.htm",), **_MELON),
+    ChartSpec("melon_hot100", "멜론 HOT100", (f"{BASE_URLS['melon']}/chart/hot100/index.htm",), **_MELON),
+    ChartSpec("genie", "지니", tuple(f"{BASE_URLS['genie']}/chart/top200?pg={p}" for p in range(1, 5)),
+              single_page_url=f"{BASE_URLS['genie']}/chart/top200?pg=1&rows=200", **_GENIE),
+    ChartSpec("bugs", "벅스", (f"{BASE_URLS['bugs']}/chart",), **_BUGS),
+    # FLO Top100 (API 직접 호출) — rankBadge: 양수 = 상승, 음수 = 하락, 0 = 변동 없음
+    JsonChartSpec(
+        "flo", "FLO",
+        f"{BASE_URLS['flo']}/api/display/v1/browser/chart/1/track/list?size=100",
+        rows=("data", "trackList"), title=("name",), artist=("representationArtist", "name"),
+        change=("rank", "rankBadge"),
+        headers={"User-Agent": "Mozilla/5.0", "Referer": "https://www.music-flo.com/browse?chartId=1"},
+    ),
+    # VIBE 국내 차트 Top100 (API 직접 호출) — 쿠키 만료 방지를 위해 chart/domestic 페이지 접속 후 호출
+    JsonChartSpec(
+        "vibe", "VIBE",
+        f"{BASE_URLS['vibe_api']}/vibeWeb/musicapiweb/vibe/v1/chart/track/domestic?start=1&display=100",
+        rows=("response", "result", "chart", "items", "tracks"), title=("trackTitle",),
+        artist=("artists", 0, "artistName"), change=("rank", "rankVariation"),
+        headers={
             "Accept": "application/json",
             "Origin": "https://vibe.naver.com",
             "Referer": "https://vibe.naver.com/chart/domestic",
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-                          "AppleWebKit/537.36 (KHTML, like Gecko) "
-                          "Chrome/139.0.0.0 Safari/537.36",
-            "Accept-Language": "ko,en-US;q=0.9,en;q=0.8,ko-KR;q=0.7"
-        }
-        r = session.get(api_url, headers=headers, timeout=10)
-        r.raise_for_status()
-        data = r.json()
-
-        tracks = data.get("response", {}).get("result", {}).get("chart", {}).get("items", {}).get("tracks", [])
-        for idx, track in enumerate(tracks, start=1):
-            song_name = track.get("trackTitle", "")
-            artist_list = track.get("artists", [])
-            artist_name = artist_list[0].get("artistName", "") if artist_list else ""
-
-            if is_match(song_name, artist_name, title, artist):
-                variation = track.get("rank", {}).get("rankVariation", 0)
-                change_sign, change_abs = (None, None)
-                if variation > 0:
-                    change_sign = +1
-                    change_abs = variation
-                elif variation < 0:
-                    change_sign = -1
-                    change_abs = abs(variation)
-                return idx, change_sign, change_abs
-
-        print("[vibe] target not found in chart")
-        return (None, None, None)
+            "User-Agent": _API_UA,
+            "Accept-Language": "ko,en-US;q=0.9,en;q=0.8,ko-KR;q=0.7",
+        },
+        warmup_url=f"{BASE_URLS['vibe']}/chart/domestic",
+        warmup_headers={"User-Agent": _API_UA, "Referer": "https://vibe.naver.com/",
+                        "Accept-Language": "ko,en-US;q=0.9,en;q=0.8"},
+        timeout_sec=10,
+    ),
+    # ---- 기본 비활성 (CHARTS에 키를 넣으면 수집/트윗에 포함) ----
+    # 일간 차트는 KST 자정에 한 번 갱신 → 캐시/갱신 경계/데몬이 매시 다시 받지 않도록
+    ChartSpec("melon_day", "멜론 일간", (f"{BASE_URLS['melon']}/chart/day/index.htm",),
+              update_every_min=1440, **_MELON),
+    ChartSpec("genie_day", "지니 일간",
+              tuple(f"{BASE_URLS['genie']}/chart/top200?ditc=D&rtm=N&pg={p}" for p in range(1, 5)),
+              update_every_min=1440, **_GENIE),
+]
+CHART_SPECS_BY_KEY = {spec.key: spec for spec in CHART_SPECS}
 
-    except Exception as e:
-        print("vibe error:", e)
-        return (None, None, None)
+# 페이지가 여러 개인 차트(지니 Top200)는 페이지를 동시에 받음. 1이면 순차
+PAGE_WORKERS = int(os.environ.get("PAGE_WORKERS", "4"))
+# single_page_url로 전체 순위를 한 번에 받을 차트. 예) SINGLE_PAGE_CHARTS="genie"
+SINGLE_PAGE_CHARTS = {k.strip() for k in os.environ.get("SINGLE_PAGE_CHARTS", "").split(",") if k.strip()}
+
+# 수집·트윗할 차트 (순서 = 트윗 줄 순서). 예) CHARTS="melon_top100,melon_day,genie,bugs,flo,vibe"
+CHARTS = [k.strip() for k in os.environ.get(
+    "CHARTS", "melon_top100,melon_hot100,genie,bugs,flo,vibe").split(",") if k.strip()]
+ACTIVE_SPECS = [CHART_SPECS_BY_KEY[k] for k in CHARTS]
+SITES = [(spec.label, spec.key) for spec in ACTIVE_SPECS]
+
+
+# 기존 호출부 호환용
+def fetch_melon_top100(matcher: Matcher, pool: BrowserPool | None = None):
+    return scrape_chart(CHART_SPECS_BY_KEY["melon_top100"], matcher, pool)
+
+
+def fetch_melon_hot100(matcher: Matcher, pool: BrowserPool | None = None):
+    return scrape_chart(CHART_SPECS_BY_KEY["melon_hot100"], matcher, pool)
+
+
+def fetch_genie_rank(matcher: Matcher, pool: BrowserPool | None = None):
+    return scrape_chart(CHART_SPECS_BY_KEY["genie"], matcher, pool)
+
+
+def fetch_bugs_rank(matcher: Matcher, pool: BrowserPool | None = None):
+    return scrape_chart(CHART_SPECS_BY_KEY["bugs"], matcher, pool)
+
+
+def fetch_flo_rank(matcher: Matcher):
+    return scrape_chart(CHART_SPECS_BY_KEY["flo"], matcher)
+
+
+def fetch_vibe_rank(matcher: Matcher):
+    return scrape_chart(CHART_SPECS_BY_KEY["vibe"], matcher)
+
+
+# ===================== 차트 전체 아카이브 =====================
+# ARCHIVE=1이면 매 실행마다 사이트별 전체 차트(100/200행)를 날짜 파티션(archive/date=YYYY-MM-DD/HHMMSS-마이크로초.*)에
+# 한 파일씩 저장. 전체 행이 필요하므로 여러 페이지 차트(지니)의 조기 중단·단일 요청 생략을 하지 않고 pyarrow도 불러옴
+# → 기본은 끔 (대상 곡 순위만 필요한 실행은 찾는 즉시 멈춤).
+# pyarrow가 있으면 Arrow IPC 파일(사이트/곡명/가수 dictionary 인코딩) → 메모리 매핑으로 읽음.
+# 없으면 gzip CSV로 저장. 예) "14시 멜론에서 우리 곡 주변은?" → chart_at("melon_top100", ...)
+ARCHIVE_DIR = pathlib.Path(os.environ.get("ARCHIVE_DIR", "archive"))
+ARCHIVE_ENABLED = os.environ.get("ARCHIVE", "0") == "1"
+# Arrow 버퍼 압축: ""(무압축, 메모리 매핑 시 복사 없음) / "lz4" / "zstd"
+ARCHIVE_COMPRESSION = os.environ.get("ARCHIVE_COMPRESSION", "").strip() or None
+ARCHIVE_COLUMNS = ("ts", "site", "rank", "title", "artist", "change")
+
+
+class ArchivedRow(NamedTuple):
+    ts: int
+    site: str
+    rank: int
+    title: str
+    artist: str
+    change: int | None
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def _archive_table(pa, rows: list[ArchivedRow]):
+    """행 목록 → Arrow 테이블. 문자열 열은 dictionary 인코딩 (같은 곡명/가수가 시간대마다 반복)"""
+    cols = list(zip(*rows)) if rows else [()] * len(ARCHIVE_COLUMNS)
+    return pa.table({
+        "ts": pa.array(cols[0], pa.timestamp("s", tz="Asia/Seoul")),
+        "site": pa.array(cols[1], pa.string()).dictionary_encode(),
+        "rank": pa.array(cols[2], pa.int16()),
+        "title": pa.array(cols[3], pa.string()).dictionary_encode(),
+        "artist": pa.array(cols[4], pa.string()).dictionary_encode(),
+        "change": pa.array(cols[5], pa.int16()),
+    })
+
+
+def archive_run(ts: float, charts: dict[str, list[ChartRow]], root: pathlib.Path = ARCHIVE_DIR) -> pathlib.Path | None:
+    """한 실행의 전체 차트 {site: 행들}을 파일 하나로 기록. 실패해도 실행은 계속"""
+    rows = [ArchivedRow(int(ts), site, r.rank, r.title, r.artist, r.change)
+            for site, chart in charts.items() for r in chart]
+    if not rows:
+        return None
+    at = datetime.fromtimestamp(ts, KST)
+    part = root / f"date={at:%Y-%m-%d}"
+    pa = _pyarrow()
+    suffix = ".arrow" if pa is not None else ".csv.gz"
+    try:
+        part.mkdir(parents=True, exist_ok=True)
+        # 같은 초에 실행이 둘이어도 덮어쓰지 않도록 마이크로초(+ 그래도 겹치면 일련번호)
+        path = part / f"{at:%H%M%S-%f}{suffix}"
+        n = 1
+        while path.exists():
+            path = part / f"{at:%H%M%S-%f}-{n}{suffix}"
+            n += 1
+        if pa is not None:
+            table = _archive_table(pa, rows)
+            tmp = path.with_suffix(".tmp")
+            options = pa.ipc.IpcWriteOptions(compression=ARCHIVE_COMPRESSION)
+            with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+        else:
+            tmp = path.with_suffix(".tmp")
+            with gzip.open(tmp, "wt", encoding="utf-8", newline="") as f:
+                w = csv.writer(f)
+                w.writerow(ARCHIVE_COLUMNS)
+                w.writerows(rows)
+        tmp.replace(path)
+    except OSError as e:
+        print(f"[archive] {part} write error:", e)
+        return None
+    print(f"[archive] {path} ({len(rows)} rows, {len(charts)} charts)")
+    return path
+
+
+def _archive_files(root: pathlib.Path, start: str | None, end: str | None) -> list[pathlib.Path]:
+    """start/end("YYYY-MM-DD", 포함) 범위의 파티션 파일을 시간순으로"""
+    files = []
+    for part in sorted(root.glob("date=*")):
+        day = part.name[len("date="):]
+        if (start and day < start) or (end and day > end):
+            continue
+        files.extend(sorted(p for p in part.iterdir() if p.name.endswith((".arrow", ".csv.gz"))))
+    return files
+
+
+def _read_csv_archive(path: pathlib.Path) -> list[ArchivedRow]:
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return [ArchivedRow(int(ts), site, int(rank), title, artist, as_int(change) if change else None)
+                for ts, site, rank, title, artist, change in reader]
+
+
+def load_archive(start: str | None = None, end: str | None = None, sites: list[str] | None = None,
+                 root: pathlib.Path = ARCHIVE_DIR):
+    """
+    아카이브를 하나의 Arrow 테이블로 (pyarrow 필요). Arrow 파일은 메모리 매핑으로 열어
+    무압축이면 복사 없이 읽는다. gzip CSV 파티션도 같은 스키마로 합쳐 줌.
+    """
+    pa = _pyarrow()
+    if pa is None:
+        raise RuntimeError("load_archive에는 pyarrow가 필요합니다 (없으면 iter_archive 사용)")
+    tables = []
+    for path in _archive_files(root, start, end):
+        if path.suffix == ".arrow":
+            with pa.memory_map(str(path), "r") as src:
+                tables.append(pa.ipc.open_file(src).read_all())
+        else:
+            tables.append(_archive_table(pa, _read_csv_archive(path)))
+    if not tables:
+        return _archive_table(pa, [])
+    table = pa.concat_tables(tables, promote_options="permissive")
+    if sites:
+        import pyarrow.compute as pc
+        table = table.filter(pc.is_in(pc.cast(table["site"], pa.string()), value_set=pa.array(sites, pa.string())))
+    return table
+
+
+def iter_archive(start: str | None = None, end: str | None = None, sites: list[str] | None = None,
+                 root: pathlib.Path = ARCHIVE_DIR):
+    """아카이브 행을 시간순으로 하나씩 (pyarrow 없어도 CSV 파티션은 읽음)"""
+    pa = _pyarrow()
+    wanted = set(sites) if sites else None
+    for path in _archive_files(root, start, end):
+        if path.suffix == ".arrow":
+            if pa is None:
+                continue
+            with pa.memory_map(str(path), "r") as src:
+                table = pa.ipc.open_file(src).read_all()
+            cols = [table[c].to_pylist() for c in ARCHIVE_COLUMNS]
+            rows = (ArchivedRow(int(ts.timestamp()), *rest) for ts, *rest in zip(*cols))
+        else:
+            rows = iter(_read_csv_archive(path))
+        for row in rows:
+            if wanted is None or row.site in wanted:
+                yield row
+
+
+def chart_at(site: str, when: datetime, root: pathlib.Path = ARCHIVE_DIR) -> list[ChartRow]:
+    """when(KST) 이전 가장 가까운 스냅샷의 전체 차트. 예) chart_at("melon_top100", datetime(2025, 8, 1, 14, tzinfo=KST))"""
+    when_ts = int(when.timestamp())
+    day = datetime.fromtimestamp(when_ts, KST).strftime("%Y-%m-%d")
+    best_ts, best = None, []
+    for row in iter_archive(day, day, [site], root):
+        if row.ts > when_ts:
+            break
+        if row.ts != best_ts:
+            best_ts, best = row.ts, []
+        best.append(ChartRow(row.rank, row.title, row.artist, row.change))
+    return best
 
 
 # ===================== 본문 생성 =====================
+# X 글자 수 한도: 가중치 1인 구간(라틴·일부 문장부호) 밖의 문자(한글·CJK·이모지)는 2로 셈.
+# 넘으면 X가 403으로 거절하고 발송함은 재시도 없이 failed로 접으므로, 본문을 만들 때 맞춤 (build_tweets)
+TWEET_MAX_WEIGHT = int(os.environ.get("TWEET_MAX_WEIGHT", "280"))
+_LIGHT_RANGES = ((0x0000, 0x10FF), (0x2000, 0x200D), (0x2010, 0x201F), (0x2032, 0x2037))
+
+
+def tweet_weight(text: str) -> int:
+    """X 가중 글자 수 (twitter-text 규칙 근사: ZWJ로 이은 이모지·이체 선택자·피부색은 앞 이모지에 포함)"""
+    total, joined = 0, False
+    for ch in unicodedata.normalize("NFC", text):
+        cp = ord(ch)
+        if cp == 0x200D:
+            joined = True
+            continue
+        if joined or cp in (0xFE0E, 0xFE0F) or 0x1F3FB <= cp <= 0x1F3FF or 0xE0020 <= cp <= 0xE007F:
+            joined = False
+            continue
+        total += 1 if any(lo <= cp <= hi for lo, hi in _LIGHT_RANGES) else 2
+    return total
+
+
+class TweetTemplate(NamedTuple):
+    """본문 머리줄({time} = YYYY-MM-DD HH:MM)과 끝의 해시태그 줄들"""
+    header: str = "🏄‍♂️Surf | {time}"
+    hashtags: tuple[str, ...] = ("#NCTWISH #Surf #NCTWISH_Surf", "#올여름_최고의Surfer_WISH",
+                                 "#最高の夏_WISHと一緒にSURF")
+
+
 def build_text(now_kst: datetime,
-               ranks: dict[str, int | None],
+               ranks: dict[str, dict[str, int | None]],
                views: int | None,
                prev_state: dict,
-               site_changes: dict[str, int] | None = None) -> str:
-    # site_changes: 사이트가 직접 알려준 변동치(부호 포함). 예) 벅스 { "bugs": -4 }
+               site_changes: dict[str, dict[str, int]] | None = None,
+               targets: list[Target] | None = None,
+               trends: dict[str, dict[str, dict[str, int | None]]] | None = None,
+               sites: list[tuple[str, str]] | None = None,
+               template: TweetTemplate | None = None,
+               videos: list[tuple[str, int | None, float | None]] | None = None,
+               part: str = "all") -> str:
+    # ranks / site_changes: 곡(target.key)별 → 사이트별. 곡이 여러 개면 곡마다 블록을 나눔
+    # site_changes: 사이트가 직접 알려준 변동치(부호 포함). 예) 벅스 { "Surf - NCT WISH": { "bugs": -4 } }
+    # trends: RankHistory.trends() 결과. 있으면 줄 끝에 [24h 🔺3] [최고 1] 처럼 덧붙임
+    # sites / template: 캠페인별 차트 줄 순서와 머리줄·해시태그 (기본: SITES / TweetTemplate())
+    # videos: [(라벨, 조회수, 시간당 증가)] → 영상마다 🎬 줄. 없으면 views 한 줄
+    # part: "all" 한 트윗 / 곡별 스레드면 "head"(머리줄 + 곡 + 조회수 + 해시태그), "reply"(곡 블록만)
     site_changes = site_changes or {}
+    targets = targets or TARGETS
+    trends = trends or {}
+    sites = sites or SITES
+    template = template or TweetTemplate()
+
+    def trend_text(curr: int, info: dict[str, int | None]) -> str:
+        parts = []
+        for kind, then in info.items():
+            if then is None:
+                continue
+            if kind == "peak":
+                parts.append(f"[최고 {min(then, curr)}]")  # 이력에는 이번 실행이 아직 없음
+            else:
+                parts.append(f"[{kind} {delta_text(then, curr).strip()[1:-1]}]")
+        return (" " + " ".join(parts)) if parts else ""
 
     def site_delta_to_text(signed: int | None) -> str:
         if signed is None:
@@ -487,136 +2837,837 @@ def build_text(now_kst: datetime,
             return f" (🔻{abs(signed)})"
         return " (-)"
 
-    header = f"🏄‍♂️Surf | {now_kst.strftime('%Y-%m-%d %H:%M')}"
-    lines = [header, ""]
-    prev_ranks = prev_state.get("ranks", {})
-
-    for label, key in SITES:
-        curr = as_int(ranks.get(key))
-        prev = as_int(prev_ranks.get(key))
-        if curr is None:
-            lines.append(f"•{label} ❌")
-            continue
+    header = template.header.format(time=now_kst.strftime('%Y-%m-%d %H:%M'))
+    lines = [] if part == "reply" else [header, ""]
+    prev_songs = prev_state.get("songs", {})
+
+    for i, target in enumerate(targets):
+        if len(targets) > 1 or part != "all":
+            if i:
+                lines.append("")
+            lines.append(f"🎵 {target.title}")
+        song_ranks = ranks.get(target.key, {})
+        song_changes = site_changes.get(target.key, {})
+        prev_ranks = prev_songs.get(target.key, {}).get("ranks", {})
+        song_trends = trends.get(target.key, {})
+
+        for label, key in sites:
+            curr = as_int(song_ranks.get(key))
+            prev = as_int(prev_ranks.get(key))
+            if curr is None:
+                lines.append(f"•{label} ❌")
+                continue
 
-        # 벅스: 사이트 제공 변동치 우선, 없으면 state 비교
-        if key in site_changes:
-            lines.append(f"•{label} {curr}{site_delta_to_text(site_changes.get(key))}")
-        else:
-            lines.append(f"•{label} {curr}{delta_text(prev, curr)}")
+            # 벅스: 사이트 제공 변동치 우선, 없으면 직전 게시 순위와 비교
+            if key in song_changes:
+                line = f"•{label} {curr}{site_delta_to_text(song_changes.get(key))}"
+            else:
+                line = f"•{label} {curr}{delta_text(prev, curr)}"
+            lines.append(line + trend_text(curr, song_trends.get(key, {})))
 
+    if part == "reply":
+        return "\n".join(lines)
     lines.append("")
-    lines.append(f"🎬 {format_views(views)}")
-    # 해시태그 3줄 추가
-    lines.append("")  
-    lines.append("#NCTWISH #Surf #NCTWISH_Surf")
-    lines.append("#올여름_최고의Surfer_WISH")
-    lines.append("#最高の夏_WISHと一緒にSURF")
+    for label, n, per_hour in videos or [("", views, None)]:
+        rate = f" (+{per_hour:,.0f}/h)" if per_hour is not None and n is not None else ""
+        lines.append(f"🎬 {label + ' ' if label else ''}{format_views(n)}{rate}")
+    # 해시태그 줄 추가
+    if template.hashtags:
+        lines.append("")
+        lines.extend(template.hashtags)
     return "\n".join(lines)
 
-# ===================== 실행(한 번) =====================
-def run_once():
-    now = datetime.now(KST)
-    print(f"[DEBUG] 실행 시각: {now.strftime('%Y-%m-%d %H:%M:%S %Z')}")
-    state = load_state()
 
-    ranks: dict[str, int | None] = {}
-    site_changes: dict[str, int] = {}
-    title, artist = TARGET_TITLE, TARGET_ARTIST
+def _drop_trends(kw: dict) -> dict:
+    return {**kw, "trends": None}
 
-    # 멜론 TOP100
-    try:
-        rank, change_val = fetch_melon_top100(title, artist)
-        ranks["melon_top100"] = rank
-        if change_val is not None:
-            site_changes["melon_top100"] = change_val
-    except Exception as e:
-        print("melon_top100 error:", e)
-        ranks["melon_top100"] = None
 
-    # 멜론 HOT100
-    try:
-        rank, change_val = fetch_melon_hot100(title, artist)
-        ranks["melon_hot100"] = rank
-        if change_val is not None:
-            site_changes["melon_hot100"] = change_val
-    except Exception as e:
-        print("melon_hot100 error:", e)
-        ranks["melon_hot100"] = None
+def _total_views(kw: dict) -> dict:
+    """영상별 🎬 줄(+시간당 증가) → 합계 한 줄"""
+    videos = kw.get("videos")
+    if not videos:
+        return kw
+    counts = [n for _, n, _ in videos if n is not None]
+    total = sum(counts) if counts else None
+    return {**kw, "videos": [("합계" if len(videos) > 1 else "", total, None)]}
 
-    # 지니
-    try:
-        genie_rank, genie_change_sign, genie_change_abs = fetch_genie_rank(title, artist)
-        ranks["genie"] = genie_rank
-        if genie_change_sign is not None and genie_change_abs is not None:
-            site_changes["genie"] = genie_change_sign * genie_change_abs
-    except Exception as e:
-        print("genie error:", e)
-        ranks["genie"] = None
 
-    # 벅스
-    try:
-        bugs_rank, bugs_change_sign, bugs_change_abs = fetch_bugs_rank(title, artist)
-        ranks["bugs"] = bugs_rank
-        if bugs_change_sign is not None and bugs_change_abs is not None:
-            site_changes["bugs"] = bugs_change_sign * bugs_change_abs
-    except Exception as e:
-        print("bugs error:", e)
-        ranks["bugs"] = None
+# 본문이 TWEET_MAX_WEIGHT를 넘을 때 앞에서부터 하나씩 더 적용해 선택 정보를 덜어냄 (build_text 인자 → 인자)
+# 1) 추세 태그([24h 🔺3] [최고 1]) 2) 영상별 조회수·시간당 증가 → 합계 한 줄
+# 스레드로 나눌 때도 모든 트윗에 같은 단계까지 적용 (머리 트윗만 추세가 빠지고 답글에는 남는 일 없게)
+TRIM_STEPS: list[Callable[[dict], dict]] = [_drop_trends, _total_views]
+
+
+def _fit(renders: list[Callable[[dict], str]], kw: dict, last_resort: bool = False) -> list[str] | None:
+    """
+    renders(본문 하나 또는 스레드의 트윗들)에 TRIM_STEPS를 차례로 함께 적용하며 모두 한도 안에 드는 첫 단계의 본문들.
+    끝까지 넘으면 None, last_resort면 넘는 트윗만 해시태그 줄을 뒤에서부터 빼 보고 그래도 넘으면 경고만 하고 마지막 본문
+    """
+    texts = [render(kw) for render in renders]
+    for step in TRIM_STEPS:
+        if all(tweet_weight(t) <= TWEET_MAX_WEIGHT for t in texts):
+            return texts
+        kw = step(kw)
+        texts = [render(kw) for render in renders]
+    if all(tweet_weight(t) <= TWEET_MAX_WEIGHT for t in texts):
+        return texts
+    if not last_resort:
+        return None
+    return [text if tweet_weight(text) <= TWEET_MAX_WEIGHT else _drop_hashtags(render, kw)
+            for render, text in zip(renders, texts)]
+
+
+def _drop_hashtags(render: Callable[[dict], str], kw: dict) -> str:
+    template = kw.get("template") or TweetTemplate()
+    text = render(kw)
+    for n in range(len(template.hashtags) - 1, -1, -1):
+        text = render({**kw, "template": template._replace(hashtags=template.hashtags[:n])})
+        if tweet_weight(text) <= TWEET_MAX_WEIGHT:
+            print(f"[tweet] 한도 초과 → 해시태그 {len(template.hashtags) - n}줄 생략")
+            return text
+    print(f"[tweet] 본문 {tweet_weight(text)}자 > {TWEET_MAX_WEIGHT}자 (더 줄일 줄 없음)")
+    return text
 
-    # FLO
+
+def build_tweets(now_kst: datetime, ranks: dict[str, dict[str, int | None]], views: int | None,
+                 prev_state: dict, targets: list[Target] | None = None, **kw) -> list[str]:
+    """
+    build_text 본문을 X 가중 글자 수(TWEET_MAX_WEIGHT) 안으로 → 게시할 트윗 목록 (2개 이상이면 답글 스레드).
+    넘으면 TRIM_STEPS로 덜어내고, 그래도 넘는 다곡 본문은 곡마다 한 트윗으로 나눔
+    (첫 곡 트윗에 머리줄·조회수·해시태그, 나머지 곡은 답글. 덜어내는 단계는 모든 트윗에 같게). kw는 build_text 인자 그대로.
+    """
+    targets = targets or TARGETS
+
+    def render(songs: list[Target], part: str) -> Callable[[dict], str]:
+        return lambda k: build_text(now_kst, ranks, views, prev_state, targets=songs, part=part, **k)
+
+    if len(targets) > 1:
+        texts = _fit([render(targets, "all")], kw)
+        if texts is not None:
+            return texts
+        print(f"[tweet] {len(targets)}곡 본문이 {TWEET_MAX_WEIGHT}자 초과 → 곡별 스레드로 나눔")
+        parts = [render([t], "head" if i == 0 else "reply") for i, t in enumerate(targets)]
+        return _fit(parts, kw, last_resort=True)
+    return _fit([render(targets, "all")], kw, last_resort=True)
+
+# ===================== 캠페인(여러 계정) =====================
+# 한 호스트에서 여러 팀(계정)을 돌릴 때: 차트는 매시 한 번만 수집하고, 본문 생성·게시만 캠페인별로 병렬 실행.
+# CAMPAIGNS=campaigns.json (없으면 지금처럼 환경변수로 만든 캠페인 하나). 예)
+#   [{"name": "wish", "targets": "Surf|NCT WISH; Steady", "artist": "NCT WISH", "videos": ["abc123=MV", "def456=무대"],
+#     "charts": ["melon_top100", "genie", "flo"], "header": "🏄‍♂️Surf | {time}", "hashtags": ["#NCTWISH"]}]
+# 자격 증명은 파일에 두지 않고 {env_prefix}API_KEY / _API_KEY_SECRET / _ACCESS_TOKEN / _ACCESS_TOKEN_SECRET
+# 환경변수에서 읽음 (env_prefix 기본값: 이름 대문자 + "_"). 이력·발송함·게시 한도는 캠페인별 history_db에 따로 저장.
+CAMPAIGN_WORKERS = int(os.environ.get("CAMPAIGN_WORKERS", "4"))
+CREDENTIAL_KEYS = ("API_KEY", "API_KEY_SECRET", "ACCESS_TOKEN", "ACCESS_TOKEN_SECRET")
+
+
+@dataclass(frozen=True)
+class Campaign:
+    """계정 하나의 설정. 상태(이력/발송함/게시 한도)는 history_db 파일 하나에 격리"""
+    name: str
+    targets: tuple[Target, ...]
+    credentials: tuple[str, ...]
+    videos: tuple[Video, ...] = ()       # 조회수를 본문에 표시할 영상 (첫 영상이 대표)
+    charts: tuple[str, ...] = ()         # 트윗에 넣을 차트 (순서 = 줄 순서)
+    template: TweetTemplate = TweetTemplate()
+    history_db: pathlib.Path = HISTORY_DB
+    migrate_state: bool = False          # 구버전 state.json 이전은 기본 캠페인만
+
+    @property
+    def sites(self) -> list[tuple[str, str]]:
+        return [(CHART_SPECS_BY_KEY[k].label, k) for k in self.charts]
+
+    def open_history(self) -> RankHistory:
+        return open_history(self.history_db) if self.migrate_state else RankHistory(self.history_db)
+
+    def post(self, text: str, reply_to: str | None = None) -> requests.Response:
+        return post_tweet(text, self.credentials, reply_to)
+
+
+def default_campaign() -> Campaign:
+    """CAMPAIGNS 파일이 없을 때 환경변수로 만드는 캠페인 하나. 이때만 기본 자격 증명/영상이 필수"""
+    for k, v in {
+        "API_KEY": API_KEY, "API_KEY_SECRET": API_KEY_SECRET,
+        "ACCESS_TOKEN": ACCESS_TOKEN, "ACCESS_TOKEN_SECRET": ACCESS_TOKEN_SECRET,
+        "YOUTUBE_API_KEY": YOUTUBE_API_KEY, "YT_VIDEO_IDS 또는 YT_VIDEO_ID": YT_VIDEOS,
+    }.items():
+        if not v:
+            raise SystemExit(f"❌ .env에 {k}가 필요합니다.")
+    return Campaign("default", tuple(TARGETS), TWITTER_CREDENTIALS, videos=tuple(YT_VIDEOS),
+                    charts=tuple(CHARTS), migrate_state=True)
+
+
+def load_campaigns(path: pathlib.Path) -> list[Campaign]:
+    campaigns = []
+    for c in json.loads(path.read_text(encoding="utf-8")):
+        name = c["name"]
+        prefix = c.get("env_prefix", f"{name.upper()}_")
+        credentials = tuple(os.environ.get(prefix + k, "").strip() for k in CREDENTIAL_KEYS)
+        missing = [prefix + k for k, v in zip(CREDENTIAL_KEYS, credentials) if not v]
+        if missing:
+            raise SystemExit(f"❌ 캠페인 {name}: {', '.join(missing)}가 필요합니다.")
+        raw = c.get("targets", "")
+        artist = c.get("artist", TARGET_ARTIST)
+        targets = parse_targets(raw, artist) if isinstance(raw, str) else \
+            [Target(t["title"], t.get("artist", artist)) for t in raw]
+        charts = tuple(c.get("charts") or CHARTS)
+        unknown = [k for k in charts if k not in CHART_SPECS_BY_KEY]
+        if not targets or unknown:
+            raise SystemExit(f"❌ 캠페인 {name}: targets가 비었거나 모르는 차트 {unknown}")
+        template = TweetTemplate(c.get("header", TweetTemplate().header),
+                                 tuple(c.get("hashtags", TweetTemplate().hashtags)))
+        videos = tuple(parse_videos(c.get("videos", c.get("video_ids", []))))
+        campaigns.append(Campaign(name, tuple(targets), credentials, videos, charts,
+                                  template, pathlib.Path(c.get("history_db", f"history-{name}.sqlite3"))))
+    dbs = [c.history_db.resolve() for c in campaigns]
+    if not campaigns or len(set(dbs)) != len(dbs) or len({c.name for c in campaigns}) != len(campaigns):
+        raise SystemExit(f"❌ {path}: 캠페인이 없거나 이름/history_db가 겹칩니다.")
+    return campaigns
+
+
+CAMPAIGNS = load_campaigns(pathlib.Path(CAMPAIGNS_FILE)) if CAMPAIGNS_FILE else [default_campaign()]
+# 수집은 모든 캠페인의 합집합으로 한 번 (차트/곡/영상 중복 제거, 순서 유지)
+COLLECT_SPECS = [CHART_SPECS_BY_KEY[k] for k in dict.fromkeys(k for c in CAMPAIGNS for k in c.charts)]
+COLLECT_TARGETS = list({t.key: t for c in CAMPAIGNS for t in c.targets}.values())
+COLLECT_VIDEO_IDS = list(dict.fromkeys(v.id for c in CAMPAIGNS for v in c.videos if v.id))
+
+
+def fetch_campaign_views() -> dict[str, int] | None:
+    return fetch_youtube_stats(COLLECT_VIDEO_IDS)
+
+
+# ===================== 동시 수집 =====================
+def collect_concurrently(jobs: dict, deadline_sec: float = RUN_DEADLINE_SEC,
+                         budgets: dict | None = None, workers: int = FETCH_WORKERS,
+                         health: SiteHealth | None = None) -> dict:
+    """
+    jobs {key: 인자 없는 callable}를 스레드 풀에서 동시에 실행.
+    - 각 작업의 사이트 예산은 그 작업이 실제로 시작될 때부터 센다 (풀 대기열에서 기다린 시간은 제외)
+    - 어떤 작업이든 전체 마감(수집 시작 + deadline_sec)을 넘기면 None (→ ❌)
+    - 늦은 작업은 기다리지 않고 버림 (스레드는 백그라운드에서 마저 끝남)
+    - 서킷이 열린 작업은 실행하지 않고 None, 결과(None = 실패)는 서킷 브레이커에 반영
+    """
+    budgets = SITE_BUDGETS if budgets is None else budgets
+    health = HEALTH if health is None else health
+    start = time.monotonic()
+    run_limit = start + deadline_sec
+
+    def timed(key: str, fn):
+        # 실제 시작 시각 기준으로 마감을 잡아야 resilient_request 재시도도 남은 예산을 제대로 봄
+        SITE_DEADLINES[key] = min(time.monotonic() + budgets.get(key, deadline_sec), run_limit)
+        t0 = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            METRICS.site(key, sec=time.perf_counter() - t0)
+
+    def wait_result(key: str, fut):
+        """시작 전이면 짧게 나눠 기다리며 시작을 확인, 시작 후엔 그 작업의 마감까지 기다림"""
+        while True:
+            queued = key not in SITE_DEADLINES
+            remaining = SITE_DEADLINES.get(key, run_limit) - time.monotonic()
+            try:
+                return fut.result(timeout=max(min(remaining, 0.05) if queued else remaining, 0))
+            except FuturesTimeout:
+                if not queued or remaining <= 0:
+                    fut.cancel()  # 아직 대기열에 있으면 아예 실행하지 않음
+                    raise
+
+    results = {}
+    ex = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="fetch")
+    futures = {}
+    for key, fn in jobs.items():
+        if not health.allow(key):
+            print(f"[{key}] 서킷 열림 → 건너뜀 ❌")
+            results[key] = None
+            METRICS.site(key, status="circuit_open")
+            continue
+        SITE_DEADLINES.pop(key, None)  # 이전 실행의 마감이 남아 있으면 '시작됨'으로 오인
+        futures[key] = ex.submit(timed, key, fn)
     try:
-        flo_rank, flo_change_sign, flo_change_abs = fetch_flo_rank(title, artist)
-        ranks["flo"] = flo_rank
-        if flo_change_sign is not None and flo_change_abs is not None:
-            site_changes["flo"] = flo_change_sign * flo_change_abs
-    except Exception as e:
-        print("flo error:", e)
-        ranks["flo"] = None
+        for key, fut in futures.items():
+            try:
+                results[key] = wait_result(key, fut)
+                METRICS.site(key, status="ok" if results[key] is not None else "empty")
+            except FuturesTimeout:
+                print(f"[{key}] 시간 초과 ({time.monotonic() - start:.1f}s) → ❌")
+                results[key] = None
+                METRICS.site(key, status="timeout", waited_sec=time.monotonic() - start)
+            except Exception as e:
+                print(f"{key} error:", e)
+                results[key] = None
+                METRICS.site(key, status="error")
+            health.record(key, results[key] is not None)
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)
+        health.save()
+    return results
+
 
-    # VIBE
+# ===================== 실행(한 번) =====================
+def run_once() -> int | None:
+    """수집 → 본문 → 게시. 게시를 미뤘으면 발송함 다음 시도 시각(epoch)"""
+    now = datetime.now(KST)
+    print(f"[DEBUG] 실행 시각: {now.strftime('%Y-%m-%d %H:%M:%S %Z')}")
+    METRICS.reset()
+    if IMPORT_SEC > STARTUP_BUDGET_SEC:
+        print(f"[startup] 모듈 로드 {IMPORT_SEC:.2f}s > 예산 {STARTUP_BUDGET_SEC:.2f}s")
     try:
-        vibe_rank, vibe_change_sign, vibe_change_abs = fetch_vibe_rank(title, artist)
-        ranks["vibe"] = vibe_rank
-        if vibe_change_sign is not None and vibe_change_abs is not None:
-            site_changes["vibe"] = vibe_change_sign * vibe_change_abs
-    except Exception as e:
-        print("vibe error:", e)
-        ranks["vibe"] = None
+        return _run_once(now)
+    finally:
+        METRICS.set(import_sec=round(IMPORT_SEC, 4), lazy_modules=loaded_lazy_modules())
+        record = METRICS.write()
+        print_run_summary(record)
+
+
+def print_run_summary(record: dict):
+    print(f"[metrics] total={record['total_sec']:.2f}s "
+          + " ".join(f"{k}={v:.2f}s" for k, v in record["stages"].items()))
+    memory = record.get("memory") or {}
+    tree_kb = record.get("peak_rss_kb", {}).get("tree")
+    if tree_kb:
+        budget = f"/{memory['budget_mb']}MB" if "budget_mb" in memory else ""
+        print(f"[memory] peak={tree_kb / 1024:.0f}MB{budget} serialized={memory.get('serialized', 0)}")
+    if "import_sec" in record:
+        print(f"[startup] import={record['import_sec']:.2f}s lazy={','.join(record['lazy_modules']) or '-'}")
+    if record.get("post_latency_sec") is not None:
+        print(f"[latency] 기준 {record['post_target']} → 게시 {record['post_latency_sec']:+.2f}s "
+              f"(status={record.get('tweet_status')})")
+    if len(record.get("campaigns") or {}) > 1:
+        print("[campaigns] " + " ".join(f"{k}={v.get('tweet_status', v.get('status'))}"
+                                        f"/{v.get('post_latency_sec', 0):+.2f}s" for k, v in record["campaigns"].items()))
+
+
+def _run_once(now: datetime):
+    matcher = Matcher(COLLECT_TARGETS)
+
+    # 브라우저 폴백이 필요한 사이트들은 Chromium 하나를 공유 (필요할 때만 1회 실행, 탭 단위 동시 렌더)
+    archive: dict[str, list[ChartRow]] | None = {} if ARCHIVE_ENABLED else None
+    with METRICS.stage("collect"), BrowserPool() as pool:
+        jobs = {spec.key: (lambda spec=spec: scrape_chart(spec, matcher, pool, archive)) for spec in COLLECT_SPECS}
+        jobs["youtube"] = fetch_campaign_views
+        results = collect_concurrently(jobs)
+        print(pool.report())
+        METRICS.set(browser=pool.stats())
+    return publish_run(now, results, archive)
+
+
+def _earliest(dues) -> int | None:
+    dues = [d for d in dues if d is not None]
+    return min(dues) if dues else None
+
+
+def publish_run(now: datetime, results: dict, archive: dict | None,
+                release_at: float | None = None, campaigns: list[Campaign] | None = None,
+                label: datetime | None = None) -> int | None:
+    """
+    수집 결과 → 아카이브(한 번) → 캠페인별 본문/이력 기록/게시 (CAMPAIGN_WORKERS 스레드로 병렬).
+    release_at(epoch)을 주면 본문을 미리 만들어 두고 그 시각까지 기다렸다가 게시 (데몬 모드).
+    label: 본문 머리줄 시각 (기본 now, 데몬은 받은 차트의 기준 시각)
+    반환: 게시를 미룬 캠페인이 있으면 가장 이른 발송함 다음 시도 시각(epoch)
+    """
+    campaigns = campaigns or CAMPAIGNS
+    if archive is not None:
+        # 마감 안에 끝난 사이트만 (늦게 끝나는 스레드가 나중에 채워도 이번 스냅샷엔 넣지 않음)
+        with METRICS.stage("archive"):
+            archive_run(now.timestamp(), {k: rows for k, rows in list(archive.items()) if results.get(k) is not None})
 
-    # YouTube 조회수
-    views = fetch_youtube_views()
+    def publish(c: Campaign) -> int | None:
+        try:
+            return publish_campaign(c, now, results, release_at, primary=c is campaigns[0], label=label)
+        except Exception as e:
+            # 한 캠페인의 실패(DB 잠김 등)가 다른 캠페인 게시를 막지 않도록
+            print(f"[{c.name}] publish error:", e)
+            METRICS.campaign(c.name, status="error")
+            return None
+
+    if len(campaigns) == 1:
+        return publish(campaigns[0])
+    with ThreadPoolExecutor(max_workers=max(1, min(CAMPAIGN_WORKERS, len(campaigns))),
+                            thread_name_prefix="campaign") as ex:
+        return _earliest(ex.map(publish, campaigns))
 
-    text = build_text(now, ranks, views, state, site_changes=site_changes)
-    print("----- Tweet body -----\n" + text + "\n----------------------")
 
-    code = tweet(text)
-    if 200 <= code < 300:
-        state.setdefault("ranks", {})
-        for _, key in SITES:
-            state["ranks"][key] = as_int(ranks.get(key))
-        state["youtube_views"] = views
-        state["last_posted_at"] = now.strftime("%Y-%m-%d %H:%M:%S")
-        save_state(state)
+def publish_campaign(c: Campaign, now: datetime, results: dict, release_at: float | None = None,
+                     primary: bool = True, label: datetime | None = None, kind: str = "hourly") -> int | None:
+    """
+    캠페인 하나: 공용 수집 결과에서 자기 곡/차트만 골라 본문 → 자기 이력 DB에 기록 → 자기 계정으로 게시.
+    kind: 발송함 종류 (hourly 정시 / poll 변동 감지) — 대기 중인 다른 종류의 본문은 건드리지 않음
+    """
+    targets = list(c.targets)
+    sites = c.sites
+    with METRICS.stage("history_open"):
+        history = c.open_history()
+
+    # 사이트별 {곡: (rank, change)} → 곡별 {사이트: rank}, {사이트: change}
+    ranks: dict[str, dict[str, int | None]] = {t.key: {} for t in targets}
+    site_changes: dict[str, dict[str, int]] = {t.key: {} for t in targets}
+    for _, key in sites:
+        per_song = results.get(key) or {}
+        for t in targets:
+            rank, change = per_song.get(t.key, (None, None))
+            ranks[t.key][key] = rank
+            if change is not None:
+                site_changes[t.key][key] = change
+
+    # YouTube 조회수: 대표 영상은 runs.youtube_views, 영상별은 video_views에
+    stats = results.get("youtube") or {}
+    views = stats.get(c.videos[0].id) if c.videos else None
+    video_views = {v.id: stats[v.id] for v in c.videos if v.id in stats}
+
+    site_keys = [key for _, key in sites]
+    try:
+        with METRICS.stage("build_text"):
+            prev_state = history.previous_state(targets, site_keys)
+            trends = history.trends(targets, site_keys, now.timestamp()) if TWEET_TRENDS else None
+            videos = [(v.label if len(c.videos) > 1 else "", stats.get(v.id),
+                       history.views_per_hour(v.id, now.timestamp(), stats.get(v.id)) if YT_SHOW_RATE else None)
+                      for v in c.videos]
+            texts = build_tweets(label or now, ranks, views, prev_state, site_changes=site_changes, targets=targets,
+                                 trends=trends, sites=sites, template=c.template, videos=videos)
+        print(f"----- Tweet body [{c.name}] -----\n" + "\n----- (reply) -----\n".join(texts)
+              + "\n----------------------")
+
+        # 게시 여부와 상관없이 관측은 모두 기록, 게시 성공 시에만 다음 🔺/🔻 기준이 됨
+        with METRICS.stage("history_write"):
+            run_id = history.record_run(now.timestamp(), ranks, site_changes, views, video_views=video_views)
+            outbox = TweetOutbox(history, post=c.post)
+            outbox.enqueue(run_id, texts, now.timestamp(), kind=kind)
+        if release_at is not None and release_at > time.time():
+            with METRICS.stage("release_wait"):
+                time.sleep(release_at - time.time())
+        with METRICS.stage("tweet"):
+            code = outbox.flush(kind=kind)
+        # 기준 시각(정각) → 게시 지연. 데몬은 목표 초 대비, 정각 실행은 실행 시작 대비
+        scheduled = now.timestamp() if release_at is None else release_at
+        latency = round(time.time() - scheduled, 3)
+        METRICS.campaign(c.name, tweet_status=code, post_latency_sec=latency)
+        if primary:
+            METRICS.set(tweet_status=code, post_target=datetime.fromtimestamp(scheduled, KST).strftime("%H:%M:%S"),
+                        post_latency_sec=latency)
+        return outbox.next_due()
+    finally:
+        history.close()
+
+
+def flush_outbox() -> int | None:
+    """캠페인마다 대기 중인 트윗이 있으면 (때가 됐을 때) 게시 시도 → 가장 이른 다음 시도 시각(epoch) / 없으면 None"""
+    dues = []
+    for c in CAMPAIGNS:
+        history = c.open_history()
+        try:
+            outbox = TweetOutbox(history, post=c.post)
+            outbox.flush()
+            dues.append(outbox.next_due())
+        finally:
+            history.close()
+    return _earliest(dues)
 
 
 # ===================== 스케줄러(매시 정각) =====================
+def schedule_outbox_retry(sched, due: int | None):
+    """발송함에 못 보낸 본문이 남았으면 다음 시도 시각에 한 번 더 (같은 id로 덮어써 중복 예약 없음)"""
+    if due is None:
+        return
+    from apscheduler.triggers.date import DateTrigger
+    run_date = datetime.fromtimestamp(max(due, time.time() + 1), KST)
+
+    def retry():
+        schedule_outbox_retry(sched, flush_outbox())
+
+    sched.add_job(retry, DateTrigger(run_date=run_date), id="outbox-retry", replace_existing=True)
+    print(f"[outbox] 재시도 예약: {run_date:%H:%M:%S}")
+
+
 def main():
+    from apscheduler.schedulers.blocking import BlockingScheduler
+    from apscheduler.triggers.cron import CronTrigger
     sched = BlockingScheduler(timezone="Asia/Seoul")
     # 매시 정각
-    sched.add_job(run_once, CronTrigger(minute=0, timezone="Asia/Seoul"))
+    sched.add_job(lambda: schedule_outbox_retry(sched, run_once()), CronTrigger(minute=0, timezone="Asia/Seoul"))
     print("Scheduler started. (KST 매시 정각 자동 트윗)")
     try:
         sched.start()
     except (KeyboardInterrupt, SystemExit):
         pass
+
+# ===================== 데몬(정각 전 수집 → 목표 초에 게시) =====================
+# 한 프로세스가 계속 떠 있으면서 브라우저/HTTP 커넥션 풀/매처를 실행 사이에 유지.
+# 매시 (목표 초 - DAEMON_LEAD_SEC - DAEMON_WARM_SEC)에 깨어나 연결을 데우고, 사이트별로 이번 시간대의 새 차트가
+# 올라왔는지 확인하며 수집 → 모든 사이트가 새 차트(또는 포기)면 게시. 목표 초보다 먼저 게시하지는 않음.
+# 새 차트가 올라오는 시각은 사이트별로 배운 게시 지연(처음엔 publish_lag_sec)으로 예상하고, 그 DAEMON_LEAD_SEC 전부터 확인.
+# 유튜브 조회수는 차트 수집이 끝난 뒤(게시 직전)에 받음.
+DAEMON_LEAD_SEC = int(os.environ.get("DAEMON_LEAD_SEC", "90"))    # 예상 게시 시각 몇 초 전부터 확인
+DAEMON_WARM_SEC = int(os.environ.get("DAEMON_WARM_SEC", "30"))    # 수집 시작 몇 초 전에 브라우저/연결 예열
+DAEMON_POST_OFFSET_SEC = int(os.environ.get("DAEMON_POST_OFFSET_SEC", "0"))  # 목표 초 = 정각 + 이 값
+DAEMON_PUBLISH_GRACE_SEC = int(os.environ.get("DAEMON_PUBLISH_GRACE_SEC", "60"))  # 새 차트가 예상보다 늦으면 더 기다려 줄 한도
+DAEMON_DELAY_SAMPLES = 5  # 게시 지연 추정에 쓰는 최근 관측 수 (중앙값 → 한 번 늦은 게시에 끌려가지 않음)
+
+
+class ChartDaemon:
+    """
+    상주 모드. 브라우저(BrowserPool)와 매처는 실행마다 새로 만들지 않고 재사용.
+    - 사이트별 이번 시간대 차트의 기준 시각(update_boundary)을 계산해, 받은 차트의 기준 시각이 그보다 이르면
+      CACHE_RECHECK_SEC 간격으로 다시 받음 (가장 늦게 예상되는 게시 시각 + DAEMON_PUBLISH_GRACE_SEC까지)
+    - 새 차트를 처음 본 시각(경계 기준)을 사이트별로 최근 DAEMON_DELAY_SAMPLES번 기억해, 그 중앙값을 다음 시간의
+      예상 게시 시각으로 씀. 첫 확인에서 이미 새 차트였으면 그 시각도 (더 이른) 관측으로 넣으므로 추정이 줄어들 수도 있음
+    - 본문 머리줄 시각은 실제로 받은 차트의 기준 시각 (새 차트를 못 받은 사이트가 있으면 그 이른 시각)
+    """
+
+    def __init__(self):
+        self.matcher = Matcher(COLLECT_TARGETS)
+        self.pool = BrowserPool()
+        self.publish_delays: dict[str, list[float]] = {}  # 사이트별 최근 관측한 (갱신 경계 → 새 차트 게시) 지연
+
+    def publish_delay(self, spec: ChartSpec | JsonChartSpec) -> float:
+        """최근 관측의 중앙값, 관측이 없으면 스펙의 publish_lag_sec"""
+        seen = sorted(self.publish_delays.get(spec.key, ()))
+        return seen[len(seen) // 2] if seen else spec.publish_lag_sec
+
+    def observe_delay(self, key: str, delay: float):
+        seen = self.publish_delays.setdefault(key, [])
+        seen.append(max(delay, 0.0))
+        del seen[:-DAEMON_DELAY_SAMPLES]
+
+    def next_target(self, now: float | None = None) -> float:
+        """이번에 깨어난 시각에 해당하는 목표 초 (스케줄 지터에 흔들리지 않게 가장 가까운 정각 기준)"""
+        now = time.time() if now is None else now
+        ahead = now + DAEMON_WARM_SEC + DAEMON_LEAD_SEC - DAEMON_POST_OFFSET_SEC
+        return round(ahead / 3600) * 3600 + DAEMON_POST_OFFSET_SEC
+
+    def prewarm(self):
+        t0 = time.perf_counter()
+        urls = [u for spec in COLLECT_SPECS for u in (spec.urls if isinstance(spec, ChartSpec) else (spec.url,))]
+        hosts = warm_connections(urls + [BASE_URLS["youtube"], BASE_URLS["twitter"]])
+        browser_sites = [spec.key for spec in COLLECT_SPECS
+                         if isinstance(spec, ChartSpec) and _preferred_path(spec.key) == "browser"]
+        if browser_sites:
+            try:
+                self.pool.warm()
+            except Exception as e:
+                print("[daemon] 브라우저 예열 실패:", e)
+        print(f"[daemon] 예열 {time.perf_counter() - t0:.2f}s (hosts={hosts}, browser={','.join(browser_sites) or '-'})")
+
+    def _watch(self, spec: ChartSpec | JsonChartSpec, archive: dict | None, boundary: float,
+               start_at: float, give_up_at: float):
+        """start_at까지 기다렸다가 수집. 기준 시각이 boundary보다 이른 옛 차트면 give_up_at까지 다시 받음"""
+        time.sleep(max(start_at - time.time(), 0))
+        polls = 0
+        stale = False
+        while True:
+            CHART_TIMES.pop(spec.key, None)
+            polled_at = time.time()
+            result = scrape_chart(spec, self.matcher, self.pool, archive)
+            polls += 1
+            chart_ts = CHART_TIMES.get(spec.key)
+            if chart_ts is None or chart_ts >= boundary:
+                break
+            stale = True
+            if time.time() + CACHE_RECHECK_SEC > give_up_at:
+                print(f"[{spec.key}] {datetime.fromtimestamp(boundary, KST):%H:%M} 차트 미게시 → 직전 차트로 진행")
+                METRICS.site(spec.key, polls=polls, stale_chart=True)
+                return result
+            time.sleep(CACHE_RECHECK_SEC)
+        METRICS.site(spec.key, polls=polls)
+        if chart_ts is not None:
+            # 새 차트를 처음 본 확인 시각 = 게시 지연의 상한. 옛 차트 → 새 차트 전환을 봤으면 폴링 간격 안으로 정확,
+            # 첫 확인부터 새 차트였으면 실제 지연은 이보다 짧음 → 어느 쪽이든 다음 예상을 이 값 쪽으로 당김
+            delay = polled_at - boundary
+            self.observe_delay(spec.key, delay)
+            METRICS.site(spec.key, publish_delay_sec=delay)
+            if stale:
+                print(f"[{spec.key}] 새 차트 게시 확인 (경계 +{delay:.0f}s, {polls}회 확인)")
+        return result
+
+    def cycle(self) -> int | None:
+        target = self.next_target()
+        now = datetime.fromtimestamp(target, KST)
+        print(f"[daemon] 목표 {now:%Y-%m-%d %H:%M:%S %Z}")
+        METRICS.reset()
+        try:
+            return self._cycle(target, now)
+        finally:
+            METRICS.set(lazy_modules=loaded_lazy_modules())
+            print_run_summary(METRICS.write())
+
+    def _cycle(self, target: float, now: datetime) -> int | None:
+        with METRICS.stage("prewarm"):
+            self.prewarm()
+        archive: dict[str, list[ChartRow]] | None = {} if ARCHIVE_ENABLED else None
+        plans = {}
+        for spec in COLLECT_SPECS:
+            boundary = update_boundary(spec, target)
+            plans[spec.key] = (boundary, boundary + self.publish_delay(spec))
+        give_up_at = max([target] + [expected for _, expected in plans.values()]) + DAEMON_PUBLISH_GRACE_SEC
+        jobs, budgets = {}, {}
+        for spec in COLLECT_SPECS:
+            boundary, expected = plans[spec.key]
+            # 예상 게시 시각 DAEMON_LEAD_SEC 전부터 확인 (경계 전이면 옛 차트를 받고 CACHE_RECHECK_SEC 간격으로 다시 확인)
+            start_at = expected - DAEMON_LEAD_SEC
+            jobs[spec.key] = (lambda spec=spec, b=boundary, s=start_at: self._watch(spec, archive, b, s, give_up_at))
+            budgets[spec.key] = give_up_at - time.time() + SITE_BUDGETS.get(spec.key, RUN_DEADLINE_SEC)
+        before = self.pool.stats()
+        with METRICS.stage("collect"):
+            results = collect_concurrently(jobs, deadline_sec=max(budgets.values()), budgets=budgets)
+            # 조회수는 차트가 다 모인 뒤(게시 직전)에 받아야 본문 시각과 가장 가까움
+            results.update(collect_concurrently({"youtube": fetch_campaign_views}))
+        # 풀은 계속 살아 있으므로 이번 실행 몫만
+        METRICS.set(browser={k: round(v - before[k], 4) for k, v in self.pool.stats().items()})
+        if LOW_MEMORY:
+            # 저메모리: 다음 예열까지 Chromium을 띄워 두지 않음 (예열이 다시 띄움)
+            self.pool.close()
+            self.pool = BrowserPool()
+        # 머리줄은 실제로 받은 차트 중 가장 이른 기준 시각 (전부 새 차트면 이번 정각)
+        chart_times = [CHART_TIMES[k] for k in jobs if k in CHART_TIMES and results.get(k) is not None]
+        label = datetime.fromtimestamp(min([target] + chart_times), KST)
+        return publish_run(now, results, archive, release_at=target, label=label)
+
+    def close(self):
+        self.pool.close()
+
+
+def run_daemon():
+    from apscheduler.schedulers.blocking import BlockingScheduler
+    from apscheduler.triggers.cron import CronTrigger
+    daemon = ChartDaemon()
+    sched = BlockingScheduler(timezone="Asia/Seoul")
+    wake = (DAEMON_POST_OFFSET_SEC - DAEMON_LEAD_SEC - DAEMON_WARM_SEC) % 3600
+    sched.add_job(lambda: schedule_outbox_retry(sched, daemon.cycle()),
+                  CronTrigger(minute=wake // 60, second=wake % 60, timezone="Asia/Seoul"),
+                  misfire_grace_time=60, coalesce=True, max_instances=1)
+    print(f"Daemon started. (매시 {wake // 60:02d}:{wake % 60:02d}에 예열·수집 → "
+          f"새 차트가 모이면 게시, 정각{DAEMON_POST_OFFSET_SEC:+d}s 이전에는 게시 안 함)")
+    try:
+        sched.start()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        daemon.close()
+
+
+# ===================== 변동 감지 폴링 =====================
+# 컴백 당일처럼 순위가 자주 움직일 때: 가벼운 소스(FLO/VIBE API, HTTP로 받히는 멜론)만 몇 분 간격으로 다시 받아
+# 직전 관측과 비교 → 의미 있는 변동(차트 진입/이탈, TOP N 경계 통과, POLL_MIN_DELTA 이상 이동)일 때만 알림/게시.
+# - 캐시가 신선해도 ETag/Last-Modified로 재검증 (304면 파싱 없음), 브라우저 폴백은 쓰지 않음
+# - 사이트별 간격은 변동이 없으면 POLL_BACKOFF배씩 늘려 POLL_MAX_SEC까지, 변동이 있거나 차트 갱신 시각이 되면 POLL_MIN_SEC로
+# - POLL_ACTION=alert(기본): 콘솔 + POLL_ALERTS 파일(+ POLL_WEBHOOK에 {"text"} POST) / tweet: 캠페인 계정으로 게시
+POLL_SITES = [k.strip() for k in os.environ.get("POLL_SITES", "flo,vibe,melon_top100").split(",") if k.strip()]
+POLL_MIN_SEC = int(os.environ.get("POLL_MIN_SEC", "120"))
+POLL_MAX_SEC = int(os.environ.get("POLL_MAX_SEC", "900"))
+POLL_BACKOFF = 1.5
+POLL_WORKERS = 2
+POLL_MIN_DELTA = int(os.environ.get("POLL_MIN_DELTA", "3"))
+POLL_MILESTONES = sorted(int(x) for x in os.environ.get("POLL_MILESTONES", "1,3,5,10,20,50,100").split(",") if x.strip())
+POLL_ACTION = os.environ.get("POLL_ACTION", "alert").strip()
+POLL_ALERTS = pathlib.Path(os.environ.get("POLL_ALERTS", "alerts.jsonl"))
+POLL_WEBHOOK = os.environ.get("POLL_WEBHOOK", "").strip()
+POLL_POST_GAP_SEC = int(os.environ.get("POLL_POST_GAP_SEC", "900"))  # 캠페인별 게시 최소 간격 (정시 게시 포함)
+
+
+class RankMove(NamedTuple):
+    site: str
+    song: str
+    prev: int | None
+    curr: int | None
+    reason: str
+
+
+def rank_move_reason(prev: int | None, curr: int | None) -> str | None:
+    """직전 → 이번 순위가 알릴 만한 변동이면 사유, 아니면 None (None 순위 = 차트 밖)"""
+    if prev == curr:
+        return None
+    if prev is None:
+        return "차트 진입"
+    if curr is None:
+        return "차트 이탈"
+    for m in POLL_MILESTONES:
+        if min(prev, curr) <= m < max(prev, curr):
+            return f"TOP{m} {'진입' if curr < prev else '이탈'}"
+    if abs(prev - curr) >= POLL_MIN_DELTA:
+        return delta_text(prev, curr).strip()
+    return None
+
+
+class ChartPoller:
+    """사이트별 적응형 간격으로 가벼운 차트만 다시 받아 대상 곡 순위 변동을 감지"""
+
+    def __init__(self, sites: list[str] = POLL_SITES, campaigns: list[Campaign] | None = None):
+        self.campaigns = campaigns or CAMPAIGNS
+        self.specs = [CHART_SPECS_BY_KEY[k] for k in sites]
+        self.matcher = Matcher(list({t.key: t for c in self.campaigns for t in c.targets}.values()))
+        # 닫힌 풀: 정적 HTML에 행이 없어도 Chromium을 띄우지 않고 그 회차만 실패 처리
+        self.no_browser = BrowserPool()
+        self.no_browser.close()
+        now = time.time()
+        self.interval = {s.key: float(POLL_MIN_SEC) for s in self.specs}
+        self.next_at = {s.key: now for s in self.specs}
+        self.last: dict[str, dict] = {}  # 사이트별 마지막 관측 {song: (rank, change)}
+        self.counts: dict[str, dict[str, int]] = {}
+        self.counted_since = now
+
+    def _count(self, site: str, **values: int):
+        d = self.counts.setdefault(site, {})
+        for k, v in values.items():
+            d[k] = d.get(k, 0) + v
+
+    def _schedule(self, spec, changed: bool, failed: bool):
+        key = spec.key
+        if changed:
+            self.interval[key] = float(POLL_MIN_SEC)
+        else:
+            self.interval[key] = min(self.interval[key] * (2 if failed else POLL_BACKOFF), POLL_MAX_SEC)
+        now = time.time()
+        # 다음 차트 게시 예상 시각이 먼저 오면 그때 깨어나 다시 촘촘하게
+        publish_at = chart_boundary(spec, now) + spec.update_every_min * 60 + spec.publish_lag_sec
+        nxt = now + self.interval[key] * random.uniform(0.9, 1.1)
+        if publish_at < nxt:
+            nxt, self.interval[key] = publish_at, float(POLL_MIN_SEC)
+        self.next_at[key] = nxt
+
+    def poll(self, spec) -> list[RankMove]:
+        if isinstance(spec, ChartSpec) and _preferred_path(spec.key) == "browser":
+            self._count(spec.key, skipped=1)
+            self.next_at[spec.key] = time.time() + POLL_MAX_SEC
+            return []
+        if not HEALTH.allow(spec.key):
+            self._count(spec.key, skipped=1)
+            self._schedule(spec, changed=False, failed=True)
+            return []
+        SITE_DEADLINES[spec.key] = time.monotonic() + SITE_BUDGETS.get(spec.key, RUN_DEADLINE_SEC)
+        result = scrape_chart(spec, self.matcher, self.no_browser)
+        HEALTH.record(spec.key, result is not None)
+        self._count(spec.key, polls=1, errors=int(result is None))
+        if result is None:
+            self._schedule(spec, changed=False, failed=True)
+            return []
+        prev = self.last.get(spec.key)
+        self.last[spec.key] = result
+        moves = []
+        if prev is not None:  # 첫 관측은 기준만 잡음
+            for song, (rank, _) in result.items():
+                before = prev.get(song, (None, None))[0]
+                reason = rank_move_reason(before, rank)
+                if reason:
+                    moves.append(RankMove(spec.key, song, before, rank, reason))
+        self._count(spec.key, changes=len(moves))
+        self._schedule(spec, changed=bool(moves), failed=False)
+        return moves
+
+    def tick(self) -> list[RankMove]:
+        """지금 차례가 된 사이트만 받아 변동 목록 반환"""
+        now = time.time()
+        due = [s for s in self.specs if self.next_at[s.key] <= now]
+        if not due:
+            return []
+        with ThreadPoolExecutor(max_workers=min(POLL_WORKERS, len(due)), thread_name_prefix="poll") as ex:
+            moves = [m for ms in ex.map(self.poll, due) for m in ms]
+        HEALTH.save()
+        return moves
+
+    def report(self):
+        """지난 집계 구간의 사이트별 요청/304/변동 수 (한 시간마다)"""
+        if time.time() - self.counted_since < 3600:
+            return
+        parts = [f"{k} {v.get('polls', 0)}회(변동 {v.get('changes', 0)}, 오류 {v.get('errors', 0)}, "
+                 f"건너뜀 {v.get('skipped', 0)}, 간격 {self.interval[k]:.0f}s)" for k, v in self.counts.items()]
+        print("[poll] 지난 1시간: " + " / ".join(parts))
+        self.counts, self.counted_since = {}, time.time()
+
+    def sleep_sec(self) -> float:
+        return max(min(self.next_at.values()) - time.time(), 1.0)
+
+    def results(self) -> dict:
+        return dict(self.last)
+
+
+def alert_moves(moves: list[RankMove]):
+    labels = {spec.key: spec.label for spec in CHART_SPECS}
+    lines = [f"{labels[m.site]} {m.song}: {m.prev or '-'} → {m.curr or '-'} ({m.reason})" for m in moves]
+    text = "\n".join(lines)
+    print("[alert]\n  " + "\n  ".join(lines))
+    try:
+        with POLL_ALERTS.open("a", encoding="utf-8") as f:
+            for m in moves:
+                f.write(json.dumps({"ts": int(time.time()), **m._asdict()}, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"[alert] {POLL_ALERTS} write error:", e)
+    if POLL_WEBHOOK:
+        try:
+            http_session().post(POLL_WEBHOOK, json={"text": text}, timeout=10)
+        except requests.RequestException as e:
+            print("[alert] webhook error:", e)
+
+
+def post_moves(poller: ChartPoller, moves: list[RankMove]) -> int | None:
+    """변동이 걸린 캠페인마다 폴링한 차트만으로 본문을 만들어 게시 (정시 게시와 같은 이력/발송함 사용)"""
+    now = datetime.now(KST)
+    results = poller.results()
+    dues = []
+    for c in poller.campaigns:
+        songs = {t.key for t in c.targets}
+        charts = tuple(k for k in c.charts if k in results)
+        if not any(m.song in songs and m.site in charts for m in moves):
+            continue
+        history = c.open_history()
+        try:
+            last = history.last_posted_ts()
+        finally:
+            history.close()
+        if last and now.timestamp() - last < POLL_POST_GAP_SEC:
+            print(f"[{c.name}] 직전 게시 {int(now.timestamp() - last)}s 전 → 이번 변동은 게시 생략")
+            continue
+        METRICS.reset()
+        try:
+            views = fetch_youtube_stats([v.id for v in c.videos])
+            dues.append(publish_campaign(replace(c, charts=charts), now, {**results, "youtube": views}, kind="poll"))
+        finally:
+            print_run_summary(METRICS.write())
+    return _earliest(dues)
+
+
+def run_poll():
+    """변동 감지 폴링 루프 (Ctrl+C로 종료). 캐시는 매번 재검증, 서킷/지연 상태는 폴링 전용 파일"""
+    global HEALTH
+    CHART_CACHE.revalidate = True
+    HEALTH = SiteHealth(POLL_SITE_HEALTH)
+    poller = ChartPoller()
+    print(f"Polling started. ({', '.join(s.key for s in poller.specs)}, {POLL_MIN_SEC}~{POLL_MAX_SEC}s, "
+          f"action={POLL_ACTION})")
+    outbox_due = None
+    try:
+        while True:
+            moves = poller.tick()
+            if moves:
+                alert_moves(moves)
+                if POLL_ACTION == "tweet":
+                    outbox_due = post_moves(poller, moves)
+            if outbox_due is not None and outbox_due <= time.time():
+                outbox_due = flush_outbox()
+            poller.report()
+            wait = poller.sleep_sec()
+            if outbox_due is not None:
+                wait = min(wait, max(outbox_due - time.time(), 1.0))
+            time.sleep(wait)
+    except KeyboardInterrupt:
+        pass
+
+
+IMPORT_SEC = time.perf_counter() - _IMPORT_T0  # 이 모듈 로드에 걸린 시간 (인터프리터 기동 제외)
+
+
 def lambda_handler(event=None, context=None):
     run_once()
     return {"statusCode": 200, "body": "Tweet posted"}
 
 if __name__ == "__main__":
-    import sys
     if "--once" in sys.argv:
         run_once()
+    elif "--flush-outbox" in sys.argv:
+        flush_outbox()
+    elif "--daemon" in sys.argv:
+        run_daemon()
+    elif "--poll" in sys.argv:
+        run_poll()
     else:
         main()
  